@@ -0,0 +1,55 @@
+"""
+追記用の配列バッファ
+
+容量を倍々で確保し、追加のたびに全体をコピーしないようにする（追加は償却 O(追加件数)）。
+呼び出し側はバッファと使用中の件数を持ち、使用中の部分のビューを参照する。
+あわせて、行ごとのレコードを追記するファイル（IVF の割り当て・PQ の番号・重複検出のハッシュ）の
+読み書きをまとめる。ファイル内の位置が行番号で、書きかけの末尾は読み込み時に切り詰める。
+"""
+import os
+import numpy as np
+
+MIN_CAPACITY = 1024
+
+
+def append_rows(buffer: np.ndarray, used: int, rows: np.ndarray, axis: int = 0,
+                min_capacity: int = MIN_CAPACITY) -> np.ndarray:
+    """buffer の axis 方向の先頭 used 件の後ろに rows を書き込み、（確保し直した場合は新しい）バッファを返す"""
+    needed = used + rows.shape[axis]
+    if needed > buffer.shape[axis] or not buffer.flags.writeable:
+        shape = list(buffer.shape)
+        shape[axis] = max(needed, 2 * buffer.shape[axis], min_capacity)
+        grown = np.empty(shape, dtype=buffer.dtype)
+        kept = (slice(None),) * axis + (slice(0, used),)
+        grown[kept] = buffer[kept]
+        buffer = grown
+    buffer[(slice(None),) * axis + (slice(used, needed),)] = rows
+    return buffer
+
+
+def write_records(path: str, records: np.ndarray):
+    """レコードの配列でファイルを書き直す（一時ファイルに書いてから置き換える）"""
+    tmp_path = path + ".tmp"
+    np.ascontiguousarray(records).tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def append_records(path: str, records: np.ndarray):
+    """追加分のレコードだけをファイル末尾に追記する（行番号 = ファイル内の位置）"""
+    with open(path, 'ab') as f:
+        f.write(np.ascontiguousarray(records).tobytes())
+
+
+def read_records(path: str, dtype: np.dtype, n_rows: int) -> np.ndarray:
+    """追記ファイルの先頭から最大 n_rows 件のレコードを読む（ファイルがなければ0件）。
+    足りない行（追記前に終了していた分）は呼び出し側で計算し、append_records で補う"""
+    dtype = np.dtype(dtype)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    size = os.path.getsize(path)
+    valid = min(size // dtype.itemsize, n_rows)
+    records = np.fromfile(path, dtype=dtype, count=valid)
+    if size != valid * dtype.itemsize:
+        # コミットされなかった・書きかけの追記分を切り詰める（以降の追記位置がずれないように）
+        os.truncate(path, valid * dtype.itemsize)
+    return records
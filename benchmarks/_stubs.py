@@ -0,0 +1,58 @@
+"""
+ベンチマーク共通の、モデルを使わないエンコーダーと合成ベクトル
+  - NoModelEncoder  : 埋め込みを直接書き込んだストアを開くためのエンコーダー（encode は使わない）
+  - StubEncoder     : テキストのハッシュで決まる疑似埋め込み（同じテキストは常に同じベクトル）
+  - clustered_vectors : トピック中心 + ノイズの合成ベクトル
+"""
+import hashlib
+import numpy as np
+
+DIMENSION = 768
+
+
+class NoModelEncoder:
+    # 読み込み・検索の計測だけなのでモデルはロードしない
+    dimension = DIMENSION
+
+    def model_identity(self, load=True):
+        # モデルの記録・照合は行わない
+        return None
+
+
+class StubEncoder:
+    """テキストのハッシュで決まる疑似埋め込み（同じテキストは常に同じベクトル。モデルは使わない）"""
+    dimension = DIMENSION
+    TABLE_ROWS = 4096
+
+    def __init__(self, seed=0):
+        self.table = np.random.default_rng(seed).standard_normal((self.TABLE_ROWS, self.dimension)).astype(np.float32)
+
+    def encode(self, texts, batch_size=None, use_cache=True, **kwargs):
+        hashes = np.array([int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+                           for text in texts], dtype=np.uint64)
+        first = (hashes % self.TABLE_ROWS).astype(np.intp)
+        second = ((hashes >> np.uint64(32)) % self.TABLE_ROWS).astype(np.intp)
+        return self.table[first] + 0.5 * self.table[second]
+
+    def encode_single(self, text):
+        return self.encode([text])[0].tolist()
+
+    def model_identity(self, load=True):
+        # モデルの記録・照合は行わない
+        return None
+
+    # EnglishQuizSystem から見たモデルの読み込み状態（読み込むものはない）
+    is_ready = True
+
+    def start_loading(self):
+        pass
+
+    def load(self):
+        pass
+
+
+def clustered_vectors(n, dimension, n_topics, rng):
+    # 実データの埋め込みに近づけるため、トピック中心 + ノイズで生成
+    centers = rng.standard_normal((n_topics, dimension)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n)
+    return centers[labels] + 0.8 * rng.standard_normal((n, dimension)).astype(np.float32)
@@ -0,0 +1,77 @@
+"""
+ANN（IVF）インデックスの再現率とレイテンシ計測
+全件検索（exact）の上位k件を正解として recall@k を n_probe ごとに計測する
+モデルは使わず、クラスタ構造を持つ合成ベクトルで計測する
+
+使い方:
+    python benchmarks/bench_ann.py --n 200000 --queries 200 --n-probe 1 4 8 16 32
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import NoModelEncoder, clustered_vectors  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ANNインデックスの recall@k とレイテンシ')
+    parser.add_argument('--n', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    from segment_storage import SegmentStorage
+    from simple_vector_store import SimpleVectorStore
+
+    workdir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(0)
+        path = os.path.join(workdir, 'store')
+        SegmentStorage(path, NoModelEncoder.dimension).write_all(
+            [{"id": f"doc_{i}", "text": "", "metadata": {}} for i in range(args.n)],
+            clustered_vectors(args.n, NoModelEncoder.dimension, args.topics, rng))
+        # 読み込み時には作らせず、構築時間を下で計測する
+        store = SimpleVectorStore(storage_path=path, encoder=NoModelEncoder(),
+                                  ann_index=True, ann_min_documents=args.n + 1)
+
+        start = time.perf_counter()
+        store.build_ann_index()
+        build_seconds = time.perf_counter() - start
+
+        queries = clustered_vectors(args.queries, NoModelEncoder.dimension, args.topics, rng)
+
+        def timed_search(**kwargs):
+            ids, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                results = store.search_by_vectors(query, args.k, **kwargs)[0]
+                latencies.append(time.perf_counter() - start)
+                ids.append({r["id"] for r in results})
+            return ids, np.array(latencies) * 1000
+
+        exact_ids, exact_ms = timed_search(exact=True)
+
+        print(f"documents : {args.n}, lists: {store.ann_index.n_lists}, build: {build_seconds:.1f} s")
+        print(f"{'mode':<12} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'exact':<12} {1.0:>10.3f} {np.percentile(exact_ms, 50):>8.2f} {np.percentile(exact_ms, 99):>8.2f}")
+        for n_probe in args.n_probe:
+            ann_ids, ann_ms = timed_search(n_probe=n_probe)
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(ann_ids, exact_ids)])
+            print(f"{'n_probe=' + str(n_probe):<12} {recall:>10.3f} "
+                  f"{np.percentile(ann_ms, 50):>8.2f} {np.percentile(ann_ms, 99):>8.2f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
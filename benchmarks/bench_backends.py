@@ -0,0 +1,113 @@
+"""
+埋め込みバックエンド（torch / torch-int8 / onnx）の比較
+  - 精度: 回答と正解のコサイン類似度が float32（torch）基準から許容誤差内に収まるか
+  - 速度: 1件ずつのレイテンシ（p50）とバッチエンコードのスループット
+
+許容誤差を超えたバックエンドがあれば終了コード1で終わる（CI などでの精度確認用）
+
+使い方:
+    python benchmarks/bench_backends.py --backends torch torch-int8 onnx --n 500
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+JP_SENTENCES = [
+    "人工知能は私たちの生活と仕事のあり方を変えています。",
+    "機械学習アルゴリズムは大規模なデータセットのパターンを識別できます。",
+    "自然言語処理により、コンピュータが人間の言語を理解できます。",
+    "クラウドコンピューティングはデータ処理とストレージのためのスケーラブルなリソースを提供します。",
+    "サイバーセキュリティは機密情報を不正アクセスから保護するために不可欠です。",
+    "データ分析は企業がトレンドと洞察に基づいて情報に基づいた意思決定を行うのを支援します。",
+    "量子コンピューティングは古典的なコンピュータよりも速く複雑な問題を解決する可能性があります。",
+    "ソフトウェア開発はアプリケーションの設計、コーディング、テスト、保守を含みます。",
+]
+
+# float32 基準とのコサイン類似度スコアの最大差の許容値
+DEFAULT_TOLERANCES = {'torch-int8': 0.03, 'onnx': 1e-3}
+
+
+def synthetic_pairs(n, seed=0):
+    """(回答, 正解) の組。回答は正解の一部を削る・別の文と混ぜるなどして類似度をばらつかせる"""
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n):
+        reference = rng.choice(JP_SENTENCES)
+        other = rng.choice(JP_SENTENCES)
+        cut = rng.randint(len(reference) // 3, len(reference))
+        answer = reference[:cut] + other[rng.randint(0, len(other) // 2):]
+        pairs.append((answer, reference))
+    return pairs
+
+
+def cosine_rows(a, b):
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    return np.einsum('ij,ij->i', a, b) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', nargs='+', default=['torch', 'torch-int8', 'onnx'])
+    parser.add_argument('--n', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--latency-samples', type=int, default=50)
+    args = parser.parse_args()
+
+    from simple_embeddings import SimpleEmbeddings
+
+    pairs = synthetic_pairs(args.n)
+    answers = [answer for answer, _ in pairs]
+    references = [reference for _, reference in pairs]
+
+    baseline_scores = None
+    failed = []
+    print(f"{'backend':>11} {'p50 ms':>8} {'texts/sec':>10} {'max |Δscore|':>13} {'mean |Δscore|':>14}")
+
+    for backend in ['torch'] + [b for b in args.backends if b != 'torch']:
+        # キャッシュなし・非共有で、バックエンドごとに独立して計測する
+        encoder = SimpleEmbeddings(shared=False, cache_size=0, backend=backend)
+        encoder.load()
+        encoder.encode(answers[:8])  # ウォームアップ
+
+        latencies = []
+        for text in answers[:args.latency_samples]:
+            start = time.perf_counter()
+            encoder.encode([text])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        answer_vectors = encoder.encode(answers, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        reference_vectors = encoder.encode(references, batch_size=args.batch_size)
+
+        scores = cosine_rows(answer_vectors, reference_vectors)
+        if baseline_scores is None:
+            baseline_scores = scores
+        diff = np.abs(scores - baseline_scores)
+
+        tolerance = DEFAULT_TOLERANCES.get(backend)
+        status = ''
+        if tolerance is not None:
+            ok = diff.max() <= tolerance
+            status = f"  {'OK' if ok else 'NG'} (許容 {tolerance})"
+            if not ok:
+                failed.append(backend)
+
+        print(f"{backend:>11} {np.median(latencies):>8.2f} {args.n / elapsed:>10.1f} "
+              f"{diff.max():>13.5f} {diff.mean():>14.5f}{status}")
+
+    if failed:
+        print(f"❌ 許容誤差を超えたバックエンド: {', '.join(failed)}")
+        sys.exit(1)
+    print("✅ すべてのバックエンドが許容誤差内です")
+
+
+if __name__ == "__main__":
+    main()
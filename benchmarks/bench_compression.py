@@ -0,0 +1,131 @@
+"""
+検索用行列の圧縮形式（float32 / float16 / pq）ごとの再現率・メモリ・レイテンシ計測
+float32 の全件検索の上位k件を正解として recall@k を計測する
+モデルは使わず、クラスタ構造を持つ合成ベクトルで計測する
+（埋め込み本体はディスク上の memmap で、再ランク時に候補の行だけ読まれる）
+最後に、読み込んだストアへ何回か追加して（複数セグメント・コンパクション後）も、
+埋め込みがメモリにコピーされず検索用の行列だけがメモリに置かれることを確認する
+
+使い方:
+    python benchmarks/bench_compression.py --n 200000 --queries 200 --rerank-factor 1 4 10
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import NoModelEncoder, StubEncoder, clustered_vectors  # noqa: E402
+
+
+def search_memory_bytes(store):
+    """検索のためにメモリへ置く行列のバイト数"""
+    if store.compression == "pq" and store.pq is not None:
+        return store.pq.nbytes
+    return store._get_normalized_embeddings().nbytes
+
+
+def resident_bytes(parts):
+    """セグメントごとの配列のうち、ファイル（memmap）ではなくメモリに置かれている部分のバイト数"""
+    return sum(part.nbytes for part in parts if not isinstance(part, np.memmap))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='検索用行列の圧縮形式ごとの recall@k・メモリ・レイテンシ')
+    parser.add_argument('--n', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--subvectors', type=int, default=None, help='PQ の分割数（既定: 次元数/8）')
+    parser.add_argument('--rerank-factor', type=int, nargs='+', default=[1, 4, 10])
+    parser.add_argument('--add-batches', type=int, default=4, help='読み込んだストアへ追加する回数')
+    parser.add_argument('--add-size', type=int, default=None, help='1回に追加する件数（既定: n の1%%）')
+    args = parser.parse_args()
+
+    from segment_storage import SegmentStorage
+    from simple_vector_store import SimpleVectorStore
+
+    workdir = tempfile.mkdtemp()
+    try:
+        rng = np.random.default_rng(0)
+        dimension = NoModelEncoder.dimension
+        path = os.path.join(workdir, 'store')
+        documents = [{"id": f"doc_{i}", "text": "", "metadata": {}} for i in range(args.n)]
+        SegmentStorage(path, dimension).write_all(
+            documents, clustered_vectors(args.n, dimension, args.topics, rng))
+        del documents
+        queries = clustered_vectors(args.queries, dimension, args.topics, rng)
+
+        def open_store(compression, rerank_factor=10):
+            return SimpleVectorStore(storage_path=path, encoder=NoModelEncoder(), compression=compression,
+                                     pq_subvectors=args.subvectors, rerank_factor=rerank_factor)
+
+        def timed_search(store):
+            ids, latencies = [], []
+            for query in queries:
+                start = time.perf_counter()
+                results = store.search_by_vectors(query, args.k)[0]
+                latencies.append(time.perf_counter() - start)
+                ids.append({r["id"] for r in results})
+            return ids, np.array(latencies) * 1000
+
+        exact_store = open_store(None)
+        exact_ids, exact_ms = timed_search(exact_store)
+        exact_bytes = search_memory_bytes(exact_store)
+        del exact_store
+
+        print(f"documents : {args.n}, dimension: {dimension}")
+        print(f"{'mode':<16} {'recall@' + str(args.k):>10} {'MB':>8} {'bytes/doc':>10} {'p50 ms':>8} {'p99 ms':>8}")
+
+        def report(label, memory_bytes, ids, ms):
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(ids, exact_ids)])
+            print(f"{label:<16} {recall:>10.3f} {memory_bytes / 1e6:>8.1f} {memory_bytes / args.n:>10.0f} "
+                  f"{np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}")
+
+        report('float32', exact_bytes, exact_ids, exact_ms)
+
+        for compression in ('float16', 'pq'):
+            start = time.perf_counter()
+            store = open_store(compression)
+            open_seconds = time.perf_counter() - start
+            memory_bytes = search_memory_bytes(store)
+            for rerank_factor in args.rerank_factor:
+                store.rerank_factor = rerank_factor
+                ids, ms = timed_search(store)
+                report(f"{compression} x{rerank_factor}", memory_bytes, ids, ms)
+            print(f"{'':<16} (読み込み・学習 {open_seconds:.1f} s)")
+            del store
+
+        # 読み込んだストアへの追加（セグメントが増え、コンパクションも起きる）
+        add_size = args.add_size or max(1000, args.n // 100)
+        print(f"\n読み込んだストアに {add_size}件 x {args.add_batches}回 追加した後")
+        print(f"{'mode':<16} {'segments':>8} {'検索用 MB':>10} {'埋め込み(RAM) MB':>16} {'和訳(RAM) MB':>14}")
+        for compression in (None, 'float16', 'pq'):
+            copy_path = os.path.join(workdir, f'store_{compression}')
+            shutil.copytree(path, copy_path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                store = SimpleVectorStore(storage_path=copy_path, encoder=StubEncoder(), compression=compression,
+                                          pq_subvectors=args.subvectors, dedup=False)
+                for batch in range(args.add_batches):
+                    store.add_documents([{"id": f"add_{batch}_{i}", "metadata": {},
+                                          "text": f"EN: Added sentence {batch}-{i}.\nJP: 追加した文 {i}"}
+                                         for i in range(add_size)])
+            print(f"{compression or 'float32':<16} {len(store.storage.segments):>8} "
+                  f"{search_memory_bytes(store) / 1e6:>10.1f} {resident_bytes(store.embeddings.parts) / 1e6:>16.1f} "
+                  f"{resident_bytes(array for part in store.reference_embeddings.parts for array in part) / 1e6:>14.1f}")
+            del store
+            shutil.rmtree(copy_path)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+重なりのある教材を取り込んだ時の、重複除去（dedup.py）の効果
+共通の対訳・長文のプールから一部ずつを選んだ「教材」（冊ごとに別の出典）を何冊か取り込み、dedup の有無で
+エンコードした件数・ストアの件数・取り込み時間を比べる。長文の一部は取り出し方の違い
+（空白・大文字小文字）や1語の書き換えを加えて収録する。別の教材の重複は登録したまま埋め込みを使い回すので、
+ストアの件数は変わらずエンコード件数だけが減る。最後に1冊目をもう一度取り込み、追加された件数（0件のはず）を出す。
+あわせて指紋（ハッシュ・SimHash）の計算速度と、内容の異なる長文を重複と誤判定した件数を出す
+（合成の長文は少ない語彙の組み合わせなので、実際の教材より誤判定が出やすい）。
+エンコード件数には対訳の和訳（正解の埋め込み）の分も含む。
+
+使い方:
+    python benchmarks/bench_dedup.py --books 5 --pairs 5000 --chunks 2000 --overlap 0.5
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import StubEncoder  # noqa: E402
+from run_benchmarks import synthetic_corpus  # noqa: E402
+
+REPLACEMENT_WORDS = ['new', 'large', 'modern', 'secure', 'simple']
+
+
+class CountingEncoder(StubEncoder):
+    """エンコードしたテキストの件数を数える疑似エンコーダー"""
+
+    def __init__(self, seed=0):
+        super().__init__(seed)
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=None, use_cache=True, **kwargs):
+        self.encoded += len(texts)
+        return super().encode(texts, batch_size=batch_size, use_cache=use_cache, **kwargs)
+
+
+def long_chunks(n, seed=0, sentences=6):
+    """対訳の英文をつなげた、ほぼ重複の判定対象になる長さ（数百文字）の本文を n 件"""
+    english = [doc["text"].split('\n')[0][len('EN: '):] for doc in synthetic_corpus(n * sentences, seed)]
+    return ['. '.join(english[i * sentences:(i + 1) * sentences]) + '.' for i in range(n)]
+
+
+def vary(text, rng):
+    """取り出し方の違い（空白・大文字小文字）または1語の書き換え"""
+    if rng.random() < 0.5:
+        return '  '.join(text.split(' ')).upper()
+    words = text.split(' ')
+    words[rng.randrange(len(words))] = rng.choice(REPLACEMENT_WORDS)
+    return ' '.join(words)
+
+
+def make_books(books, pairs, chunks, overlap, variation, seed=0):
+    """各冊は共通のプールから overlap の割合、残りはその冊だけの内容"""
+    rng = random.Random(seed)
+    pool_pairs = [doc["text"] for doc in synthetic_corpus(pairs, seed)]
+    pool_chunks = long_chunks(chunks, seed + 1)
+    result = []
+    for b in range(books):
+        own_pairs = [doc["text"] for doc in synthetic_corpus(pairs, seed + 100 + b)]
+        own_chunks = long_chunks(chunks, seed + 200 + b)
+        shared = int(pairs * overlap)
+        texts = rng.sample(pool_pairs, shared) + own_pairs[:pairs - shared]
+        shared = int(chunks * overlap)
+        for text in rng.sample(pool_chunks, shared):
+            texts.append(vary(text, rng) if rng.random() < variation else text)
+        texts += own_chunks[:chunks - shared]
+        result.append([{"id": f"book{b}_{i}", "text": text, "metadata": {"source": f"book{b}.pdf"}}
+                       for i, text in enumerate(texts)])
+    return result
+
+
+def run_ingest(books, dedup, commit_size):
+    from simple_vector_store import SimpleVectorStore
+
+    workdir = tempfile.mkdtemp()
+    try:
+        encoder = CountingEncoder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            store = SimpleVectorStore(storage_path=os.path.join(workdir, 'store'), encoder=encoder, dedup=dedup)
+            start = time.perf_counter()
+            for documents in books:
+                for i in range(0, len(documents), commit_size):
+                    store.add_documents(documents[i:i + commit_size])
+            elapsed = time.perf_counter() - start
+            rows, encoded = len(store.documents), encoder.encoded
+            size = sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(workdir) for name in names)
+            # 同じ教材（同じ出典）をもう一度取り込む
+            reimported = sum(store.add_documents(books[0][i:i + commit_size])
+                             for i in range(0, len(books[0]), commit_size))
+        return {'encoded': encoded, 'rows': rows, 'seconds': elapsed,
+                'store_mb': size / 1e6, 'reimported': reimported}
+    finally:
+        shutil.rmtree(workdir)
+
+
+def fingerprint_stats(texts):
+    from dedup import DedupIndex
+
+    index = DedupIndex()
+    start = time.perf_counter()
+    fingerprints = [index.fingerprint(text) for text in texts]
+    elapsed = time.perf_counter() - start
+
+    # 内容の異なる本文どうしで、重複と判定された件数（誤判定）
+    false_positives = 0
+    for row, fingerprint in enumerate(fingerprints):
+        if index.find(fingerprint):
+            false_positives += 1
+        index.add(row, fingerprint)
+    return len(texts) / elapsed, false_positives
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重なりのある教材での重複除去の効果')
+    parser.add_argument('--books', type=int, default=5)
+    parser.add_argument('--pairs', type=int, default=5000, help='1冊あたりの対訳の件数')
+    parser.add_argument('--chunks', type=int, default=2000, help='1冊あたりの長文の件数')
+    parser.add_argument('--overlap', type=float, default=0.5, help='共通のプールから選ぶ割合')
+    parser.add_argument('--variation', type=float, default=0.3, help='共通の長文に違いを加える割合')
+    parser.add_argument('--commit-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    books = make_books(args.books, args.pairs, args.chunks, args.overlap, args.variation)
+    total = sum(len(documents) for documents in books)
+    print(f"{args.books}冊, 計{total}件（共通の割合 {args.overlap:.0%}）")
+    print(f"{'dedup':>6} {'エンコード件数':>14} {'ストアの件数':>12} {'ストア MB':>10} {'秒':>8} {'再取り込み':>10}")
+    for dedup in (False, True):
+        result = run_ingest(books, dedup, args.commit_size)
+        print(f"{'on' if dedup else 'off':>6} {result['encoded']:>14} {result['rows']:>12} "
+              f"{result['store_mb']:>10.1f} {result['seconds']:>8.2f} {result['reimported']:>10}")
+
+    distinct = long_chunks(args.chunks * args.books, seed=1000)
+    per_second, false_positives = fingerprint_stats(distinct)
+    print(f"\n指紋の計算: {per_second:.0f}件/秒（長文）")
+    print(f"内容の異なる長文 {len(distinct)}件での誤判定: {false_positives}件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+ドキュメント保持形式ごとのピークメモリ（最大RSS）計測
+  - legacy  : ドキュメントごとの dict + Python の float リストの埋め込み（旧 JSON 形式の読み込み）
+  - dicts   : ドキュメントごとの dict のリスト + float32 の埋め込み行列
+  - columnar: SimpleVectorStore の読み込み（DocumentTable + float32 の埋め込み行列）
+形式ごとに新しいプロセスで計測する。モデルは使わず、ランダムな埋め込みで計測する
+
+使い方:
+    python benchmarks/bench_documents.py --n 100000
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import resource
+import subprocess
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import DIMENSION, NoModelEncoder  # noqa: E402
+
+SOURCES = 20
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はキロバイト単位
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def synthetic_documents(n):
+    per_source = max(1, n // SOURCES)
+    for i in range(n):
+        yield {
+            "id": f"doc_{i}",
+            "text": f"EN: Sample sentence number {i} for the memory benchmark.\nJP: メモリ計測用のサンプル文 {i} です。",
+            "metadata": {"source": f"textbook_{i // per_source}.pdf", "chunk_index": i % per_source,
+                         "total_chunks": per_source}
+        }
+
+
+def build_store(path, n):
+    from segment_storage import SegmentStorage
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((n, DIMENSION), dtype=np.float32)
+    SegmentStorage(path, DIMENSION).write_all(list(synthetic_documents(n)), embeddings)
+
+
+def run_child(mode, path):
+    from segment_storage import SegmentStorage
+    from simple_vector_store import SimpleVectorStore
+
+    baseline = peak_rss_mb()
+    if mode == 'columnar':
+        store = SimpleVectorStore(storage_path=path, encoder=NoModelEncoder())
+        count = len(store.documents)
+        # memmap の埋め込みも常駐させて他の形式と条件をそろえる
+        float(np.asarray(store.embeddings[:count]).sum())
+    else:
+        documents, embeddings, _ = SegmentStorage(path, DIMENSION).load()
+        documents = list(documents)
+        embeddings = np.array(embeddings)
+        if mode == 'legacy':
+            for document, vector in zip(documents, embeddings):
+                document["embedding"] = vector.tolist()
+            del embeddings
+        count = len(documents)
+
+    print(json.dumps({
+        'mode': mode,
+        'documents': count,
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ドキュメント保持形式ごとのピークメモリを比較')
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--modes', nargs='+', default=['legacy', 'dicts', 'columnar'])
+    parser.add_argument('--child', choices=['legacy', 'dicts', 'columnar'])
+    parser.add_argument('--path', default=None)
+    parser.add_argument('--build', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.build:
+        build_store(args.path, args.n)
+        return
+    if args.child:
+        run_child(args.child, args.path)
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'store')
+        # 最大RSSは子プロセスに引き継がれるので、ストアの作成も別プロセスで行う
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--build', '--n', str(args.n), '--path', path],
+                       check=True)
+
+        print(f"documents: {args.n}")
+        print(f"{'mode':<10} {'peak RSS(MB)':>13} {'増分(MB)':>10} {'bytes/doc':>10}")
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, '--path', path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            growth = result['peak_rss_mb'] - result['baseline_rss_mb']
+            print(f"{mode:<10} {result['peak_rss_mb']:>13.1f} {growth:>10.1f} "
+                  f"{growth * 1024 * 1024 / args.n:>10.0f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+SimpleEmbeddings.encode のスループット計測
+1件ずつのエンコード（従来の挙動）とバッチエンコードを比較する
+
+使い方:
+    python benchmarks/bench_encode.py --n 2000 --batch-sizes 1 16 32 64
+    python benchmarks/bench_encode.py --n 2000 --long-fraction 0.05   # PDFチャンク並みの長文を混ぜる
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = (
+    "data model learning network system cloud security software computer "
+    "language analysis process service storage device user code image "
+    "information technology digital application development performance"
+).split()
+
+
+def synthetic_sentences(n, seed=0, long_fraction=0.0):
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(n):
+        # 50〜200文字程度の英文（クイズ文の長さ分布に近づける）、一部は数千文字のチャンク
+        count = rng.randint(300, 1000) if rng.random() < long_fraction else rng.randint(6, 30)
+        words = [rng.choice(WORDS) for _ in range(count)]
+        sentences.append(' '.join(words).capitalize() + '.')
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description='バッチエンコードの速度比較')
+    parser.add_argument('--n', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 32, 64])
+    parser.add_argument('--long-fraction', type=float, default=0.0)
+    parser.add_argument('--max-batch-tokens', type=int, default=None)
+    args = parser.parse_args()
+
+    from simple_embeddings import SimpleEmbeddings
+
+    encoder = SimpleEmbeddings(cache_size=0)
+    texts = synthetic_sentences(args.n, long_fraction=args.long_fraction)
+    encoder.encode(texts[:8])  # ウォームアップ
+
+    print(f"{'batch_size':>10} {'seconds':>10} {'texts/sec':>10}")
+    for batch_size in args.batch_sizes:
+        # トークン数の統計は最後の1回分（テキスト全体を1周）を表示する
+        encoder.token_stats.clear()
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=batch_size, max_batch_tokens=args.max_batch_tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>10} {elapsed:>10.2f} {args.n / elapsed:>10.1f}")
+
+    stats = encoder.token_stats.summary()
+    print(f"\nトークン数/テキスト: 平均 {stats['mean']:.1f}  p50 {stats['p50']}  p90 {stats['p90']}  "
+          f"p99 {stats['p99']}  最大 {stats['max']}")
+    print(f"分割したテキスト: {stats['split_texts']}件 (ウィンドウ {stats['windows']}個)  "
+          f"パディング効率: {stats['padding_efficiency']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
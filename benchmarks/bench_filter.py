@@ -0,0 +1,97 @@
+"""
+メタデータで絞り込んだ検索・出題のレイテンシ計測
+全件検索と、小さな出典（--small 件）・大きな出典に絞った検索・出題を比較する
+（絞り込みの計算量が全件数ではなく該当件数に比例することを確認する）
+モデルは使わず、ランダムな埋め込みで計測する
+
+使い方:
+    python benchmarks/bench_filter.py --n 200000 --small 1000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import NoModelEncoder  # noqa: E402
+
+
+def synthetic_documents(n, n_small, n_sources):
+    for i in range(n):
+        if i < n_small:
+            source, chunk = "small.pdf", i
+        else:
+            source, chunk = f"book_{i % n_sources}.pdf", (i - n_small) // n_sources
+        yield {
+            "id": f"doc_{i}",
+            "text": f"EN: Sample sentence number {i} for the filter benchmark.\nJP: 絞り込み計測用のサンプル文 {i} です。",
+            "metadata": {"source": source, "chunk_index": chunk}
+        }
+
+
+def percentiles_ms(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='メタデータの絞り込み検索・出題のレイテンシ')
+    parser.add_argument('--n', type=int, default=200000)
+    parser.add_argument('--small', type=int, default=1000, help='小さな出典の件数')
+    parser.add_argument('--sources', type=int, default=20, help='残りを分ける出典の数')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    from segment_storage import SegmentStorage
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    workdir = tempfile.mkdtemp()
+    try:
+        dimension = NoModelEncoder.dimension
+        path = os.path.join(workdir, 'store')
+        rng = np.random.default_rng(0)
+        SegmentStorage(path, dimension).write_all(
+            list(synthetic_documents(args.n, args.small, args.sources)),
+            rng.standard_normal((args.n, dimension), dtype=np.float32))
+
+        store = SimpleVectorStore(storage_path=path, encoder=NoModelEncoder())
+        quiz = EnglishQuizSystem(vector_store=store, warm_up=False)
+        query = rng.standard_normal((1, dimension)).astype(np.float32)
+        random.seed(0)
+
+        cases = [
+            ('全件', None),
+            (f'小さな出典 ({args.small}件)', {"source": "small.pdf"}),
+            (f'大きな出典 ({store.count_documents({"source": "book_0.pdf"})}件)', {"source": "book_0.pdf"}),
+            ('小さな出典 + 章', {"source": "small.pdf", "chunk_index": {"$lt": 100}}),
+        ]
+
+        # 転置インデックス・正規化済み行列の構築（初回のみ）を計測から除く
+        for _, where in cases:
+            store.search_by_vectors(query, args.k, where=where)
+
+        print(f"documents: {args.n}")
+        print(f"{'条件':<24} {'検索 p50':>9} {'p99':>7} {'出題 p50':>9} {'p99':>7}")
+        for label, where in cases:
+            search = percentiles_ms(lambda: store.search_by_vectors(query, args.k, where=where), args.repeat)
+            sample = percentiles_ms(lambda: quiz.get_random_english_question(where=where), args.repeat)
+            print(f"{label:<24} {search[0]:>9.2f} {search[1]:>7.2f} {sample[0]:>9.3f} {sample[1]:>7.3f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+一括採点のスループット計測（プロセス数ごとの件数/秒）
+ストア内の対訳から回答を合成し、1プロセス（score_batch）と GradingPool を比較する
+
+使い方:
+    python benchmarks/bench_grading.py --store quiz_vector_store --n 5000 --workers 1 2 4 8
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_items(store, n, seed=0):
+    rng = random.Random(seed)
+    pairs = store.question_index.pairs
+    if not pairs:
+        raise SystemExit("ストアに対訳（EN:/JP:）ドキュメントがありません。先に create_sample_data.py を実行してください")
+
+    items = []
+    for i in range(n):
+        english, japanese, row = rng.choice(pairs)
+        # 正解の一部を削った・並べ替えた回答（採点コストを実際の回答に近づける）
+        cut = rng.randint(len(japanese) // 2, len(japanese))
+        items.append({
+            'id': i,
+            'english': english,
+            'japanese': japanese,
+            'doc_id': store.documents[row]['id'],
+            'answer': japanese[:cut] + japanese[cut:][::-1]
+        })
+    return items
+
+
+def measure(scorer, items, batch_size):
+    start = time.perf_counter()
+    count = sum(1 for _ in scorer.score_batch(items, batch_size=batch_size))
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default="quiz_vector_store")
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--torch-threads", type=int, default=1)
+    args = parser.parse_args()
+
+    import torch
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+    from grading_pool import GradingPool
+
+    store = SimpleVectorStore(args.store)
+    items = synthetic_items(store, args.n)
+    print(f"回答数: {len(items)}  CPUコア数: {os.cpu_count()}")
+
+    baseline = None
+    for workers in args.workers:
+        if workers == 1:
+            torch.set_num_threads(args.torch_threads)
+            quiz = EnglishQuizSystem(vector_store=store, warm_up=False)
+            quiz.warm_up(background=False)
+            rate = measure(quiz, items, args.batch_size)
+        else:
+            with GradingPool(workers=workers, storage_path=args.store, torch_threads=args.torch_threads) as pool:
+                # ワーカーの起動（モデル読み込み）は計測から除く
+                list(pool.score_batch(items[:workers * args.batch_size], batch_size=args.batch_size))
+                rate = measure(pool, items, args.batch_size)
+
+        baseline = baseline or rate
+        print(f"workers={workers:2d}: {rate:8.1f}件/秒  (x{rate / baseline:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+ストリーミング取り込み（ingest.py）のメモリと速度
+大きさの違う合成コーパス（対訳と英文の段落が混ざったテキスト）を、読み込み・対訳の検出・
+commit_size 件ごとの登録まで流し、プロセスの最大メモリ（RSS）と処理速度を計測する。
+入力が大きくなっても最大メモリが増えないことを確認する（登録先はドキュメントを捨てるだけの
+スタブなので、ストア自体が持つ本文・埋め込みの分は含まない）
+
+使い方:
+    python benchmarks/bench_ingest.py --sizes-mb 10 100 1000 --commit-size 5000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class _DiscardStore:
+    """受け取ったドキュメントを数えて捨てる登録先"""
+
+    def __init__(self):
+        self.documents = 0
+        self.commits = 0
+
+    def add_documents(self, documents, batch_size=None):
+        self.documents += len(documents)
+        self.commits += 1
+        return len(documents)
+
+
+def write_corpus(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    target = size_mb * 1_000_000
+    written = 0
+    i = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            if rng.random() < 0.8:
+                block = f"EN: Sentence number {i} describes how the system processes data.\nJP: 文{i}はシステムがデータを処理する方法を説明します。\n\n"
+            else:
+                block = (f"Paragraph {i} explains the design of a distributed database in plain English words. "
+                         f"It continues with a second sentence about replication and consistency models.\n\n")
+            f.write(block)
+            written += len(block.encode('utf-8'))
+            i += 1
+
+
+def run_child(path, commit_size):
+    from ingest import IngestProgress, ingest_file
+
+    store = _DiscardStore()
+    start = time.perf_counter()
+    progress = IngestProgress(interval=0, stream=open(os.devnull, 'w'))
+    ingest_file(store, path, commit_size=commit_size, progress=progress)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'documents': store.documents,
+        'commits': store.commits,
+        'seconds': elapsed,
+        'mb_per_sec': progress.bytes_read / 1e6 / elapsed,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ストリーミング取り込みの最大メモリと速度')
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--commit-size', type=int, default=5000)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.commit_size)
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        print(f"{'入力 MB':>8} {'件数':>10} {'登録回数':>8} {'MB/秒':>8} {'最大RSS MB':>11}")
+        for size_mb in args.sizes_mb:
+            path = os.path.join(workdir, f"corpus_{size_mb}.txt")
+            write_corpus(path, size_mb)
+            # 最大RSSはプロセスごとに測る
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path,
+                                  '--commit-size', str(args.commit_size)],
+                                 capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            os.remove(path)
+            print(f"{size_mb:>8} {result['documents']:>10} {result['commits']:>8} "
+                  f"{result['mb_per_sec']:>8.1f} {result['max_rss_mb']:>11.1f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+プロセスあたりの常駐メモリ（RSS）計測
+モデル共有あり / なしで EnglishQuizSystem を複数生成し、RSSを比較する
+
+使い方:
+    python benchmarks/bench_memory.py --sessions 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def current_rss_mb():
+    # Linux では /proc から現在のRSSを取得、それ以外は最大RSSで代用
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はキロバイト単位
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def run_child(mode, sessions):
+    from simple_embeddings import SimpleEmbeddings
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    storage_path = os.path.join(tempfile.mkdtemp(), 'bench_store.json')
+    baseline = current_rss_mb()
+    systems = []
+
+    if mode == 'shared':
+        store = SimpleVectorStore(storage_path=storage_path)
+        for _ in range(sessions):
+            systems.append(EnglishQuizSystem(vector_store=store, warm_up=False))
+    else:
+        # 共有導入前の挙動: セッションごとにストアとモデルを個別にロード
+        for _ in range(sessions):
+            store = SimpleVectorStore(storage_path=storage_path, encoder=SimpleEmbeddings(shared=False))
+            systems.append(EnglishQuizSystem(vector_store=store, warm_up=False))
+
+    # モデルは遅延読み込みなので、計測前に全セッション分を読み込んでおく
+    for system in systems:
+        system.warm_up(background=False)
+
+    print(json.dumps({
+        'mode': mode,
+        'sessions': sessions,
+        'baseline_rss_mb': round(baseline, 1),
+        'rss_mb': round(current_rss_mb(), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='モデル共有によるメモリ削減を計測')
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--child', choices=['shared', 'unshared'])
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.sessions)
+        return
+
+    print(f"{'mode':<10} {'sessions':>8} {'RSS(MB)':>10} {'MB/session':>12}")
+    for mode in ('unshared', 'shared'):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--sessions', str(args.sessions)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        per_session = (result['rss_mb'] - result['baseline_rss_mb']) / args.sessions
+        print(f"{mode:<10} {args.sessions:>8} {result['rss_mb']:>10.1f} {per_session:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
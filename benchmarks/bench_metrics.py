@@ -0,0 +1,90 @@
+"""
+計測（metrics）のオーバーヘッドと、採点の段階ごとの所要時間
+  - 呼び出し1回あたりのコスト: NullMetrics（無効時）と InMemoryMetrics（有効時）の timer / increment / observe
+  - --store を指定した場合: 同じ回答を無効・有効で採点した1件あたりの時間と、段階ごとの内訳
+
+使い方:
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --store quiz_vector_store --n 2000
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def per_call_ns(function, repeat=200000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def call_costs(sink):
+    def timer():
+        with sink.timer('bench_seconds', stage='vector'):
+            pass
+
+    return (per_call_ns(timer),
+            per_call_ns(lambda: sink.increment('bench_total', result='hit')),
+            per_call_ns(lambda: sink.observe('bench_size', 32)))
+
+
+def score_ms(quiz, items, with_steps):
+    start = time.perf_counter()
+    for _ in quiz.score_batch(items, with_steps=with_steps):
+        pass
+    return (time.perf_counter() - start) / len(items) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='計測のオーバーヘッドと段階ごとの所要時間')
+    parser.add_argument('--store', help='採点で計測するベクトルストア（省略時は呼び出しコストだけ）')
+    parser.add_argument('--n', type=int, default=2000)
+    parser.add_argument('--steps', action='store_true', help='採点過程の説明（差分表示）も作る')
+    args = parser.parse_args()
+
+    from metrics import InMemoryMetrics, NullMetrics, set_metrics
+
+    print(f"{'シンク':<16} {'timer ns':>9} {'increment ns':>13} {'observe ns':>11}")
+    for sink in (NullMetrics(), InMemoryMetrics()):
+        timer, increment, observe = call_costs(sink)
+        print(f"{type(sink).__name__:<16} {timer:>9.0f} {increment:>13.0f} {observe:>11.0f}")
+
+    if not args.store:
+        return
+
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+    from bench_grading import synthetic_items
+
+    store = SimpleVectorStore(args.store)
+    items = synthetic_items(store, args.n)
+    quiz = EnglishQuizSystem(vector_store=store, warm_up=False)
+    quiz.warm_up(background=False)
+    # 初回の解析・エンコード（キャッシュに入る）を計測から除く
+    score_ms(quiz, items, args.steps)
+
+    set_metrics(NullMetrics())
+    disabled = score_ms(quiz, items, args.steps)
+    sink = InMemoryMetrics()
+    set_metrics(sink)
+    enabled = score_ms(quiz, items, args.steps)
+    set_metrics(NullMetrics())
+
+    print(f"\n採点 {len(items)}件: 無効 {disabled:.3f}ms/件, 有効 {enabled:.3f}ms/件 "
+          f"({(enabled / disabled - 1) * 100:+.1f}%)")
+    print(f"{'段階':<28} {'回数':>7} {'合計 ms':>9} {'平均 ms':>8}")
+    histograms = sink.snapshot()['histograms']
+    for name in ('quiz_batch_stage_seconds', 'quiz_stage_seconds', 'embedding_forward_seconds'):
+        for series in histograms.get(name, []):
+            label = f"{name.replace('_seconds', '')}:{series['labels'].get('stage', '')}"
+            print(f"{label:<28} {series['count']:>7} {series['sum'] * 1000:>9.1f} {series['mean'] * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
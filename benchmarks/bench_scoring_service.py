@@ -0,0 +1,109 @@
+"""
+同時に採点する受講者を模した負荷での、採点のレイテンシ（p50/p99）とスループット
+  - inline : 受講者ごとのスレッドで score_translation を呼ぶ（従来の Streamlit と同じ。1件ずつ順伝播）
+  - service: ScoringService で要求をまとめて採点する（max_batch_size・max_wait_ms ごと）
+各クライアントは「回答を送る → 結果を待つ → 平均 --think-ms ミリ秒（指数分布）考える」を繰り返す
+
+使い方:
+    python benchmarks/bench_scoring_service.py --store quiz_vector_store --clients 32 --requests 20 \
+        --batch-sizes 1 8 32 --max-wait-ms 5
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_grading import synthetic_items  # noqa: E402
+
+
+async def simulate(score, items, clients, requests, think_ms, seed=0):
+    """clients 件の同時クライアントで score(client, item) を呼び、(レイテンシ一覧, 経過秒) を返す"""
+    latencies = []
+
+    async def client(k):
+        rng = random.Random(seed + k)
+        for _ in range(requests):
+            if think_ms > 0:
+                await asyncio.sleep(rng.expovariate(1000 / think_ms))
+            start = time.perf_counter()
+            await score(k, rng.choice(items))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(k) for k in range(clients)])
+    return latencies, time.perf_counter() - start
+
+
+def report(label, latencies, elapsed, extra=''):
+    print(f"{label:<24} {np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 99):>9.1f} "
+          f"{len(latencies) / elapsed:>10.1f}  {extra}")
+
+
+async def run_inline(store, items, args):
+    from english_quiz_system import EnglishQuizSystem
+
+    # Streamlit と同じく、セッション（クライアント）ごとに EnglishQuizSystem を持ち、ストアとモデルは共有する
+    quizzes = [EnglishQuizSystem(vector_store=store, warm_up=False) for _ in range(args.clients)]
+    executor = ThreadPoolExecutor(max_workers=args.clients)
+    loop = asyncio.get_running_loop()
+
+    async def score(k, item):
+        return await loop.run_in_executor(executor, quizzes[k].score_translation, item['answer'], item)
+
+    try:
+        latencies, elapsed = await simulate(score, items, args.clients, args.requests, args.think_ms)
+    finally:
+        executor.shutdown()
+    report('inline', latencies, elapsed)
+
+
+async def run_service(quiz, items, args, max_batch_size):
+    from scoring_service import ScoringService
+
+    async with ScoringService(quiz, max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms) as service:
+        latencies, elapsed = await simulate(lambda k, item: service.score(item), items,
+                                            args.clients, args.requests, args.think_ms)
+        stats = service.stats()
+    report(f'service (batch {max_batch_size})', latencies, elapsed,
+           f"平均バッチ {stats['mean_batch_size']:.1f}件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同時採点の負荷でのレイテンシとスループット')
+    parser.add_argument('--store', default='quiz_vector_store')
+    parser.add_argument('--clients', type=int, default=32, help='同時に採点するクライアント数')
+    parser.add_argument('--requests', type=int, default=20, help='クライアントごとの採点回数')
+    parser.add_argument('--think-ms', type=float, default=200.0, help='採点の間隔（平均ミリ秒）')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--no-inline', action='store_true', help='inline の計測を省く')
+    args = parser.parse_args()
+
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    store = SimpleVectorStore(args.store)
+    items = synthetic_items(store, 1000)
+    quiz = EnglishQuizSystem(vector_store=store, warm_up=False)
+    quiz.warm_up(background=False)
+    # モデル・形態素解析の初回実行を計測から除く
+    list(quiz.score_batch(items[:8], with_steps=True))
+
+    print(f"clients={args.clients} requests={args.requests} think={args.think_ms}ms max_wait={args.max_wait_ms}ms")
+    print(f"{'方式':<24} {'p50 ms':>9} {'p99 ms':>9} {'件/秒':>10}")
+    if not args.no_inline:
+        asyncio.run(run_inline(store, items, args))
+    for max_batch_size in args.batch_sizes:
+        asyncio.run(run_service(quiz, items, args, max_batch_size))
+
+
+if __name__ == "__main__":
+    main()
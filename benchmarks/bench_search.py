@@ -0,0 +1,73 @@
+"""
+SimpleVectorStore の検索レイテンシ計測
+モデルは使わず、ランダムな埋め込みを入れたストアに対して search_by_vectors を計測する
+
+使い方:
+    python benchmarks/bench_search.py --n 100000 --queries 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import NoModelEncoder  # noqa: E402
+
+
+def build_store(n, dimension, seed=0):
+    from segment_storage import SegmentStorage
+    from simple_vector_store import SimpleVectorStore
+
+    path = os.path.join(tempfile.mkdtemp(), 'store')
+    rng = np.random.default_rng(seed)
+    SegmentStorage(path, dimension).write_all(
+        [{"id": f"doc_{i}", "text": f"document {i}", "metadata": {}} for i in range(n)],
+        rng.standard_normal((n, dimension)).astype(np.float32))
+    return SimpleVectorStore(storage_path=path, encoder=NoModelEncoder())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベクトル検索のレイテンシ計測')
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    store = build_store(args.n, NoModelEncoder.dimension)
+    try:
+        rng = np.random.default_rng(1)
+        queries = rng.standard_normal((args.queries, NoModelEncoder.dimension)).astype(np.float32)
+
+        # 正規化済み行列の構築（初回のみ）
+        start = time.perf_counter()
+        store.search_by_vectors(queries[:1], args.k)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search_by_vectors(query, args.k)
+            latencies.append(time.perf_counter() - start)
+        latencies_ms = np.array(latencies) * 1000
+
+        start = time.perf_counter()
+        store.search_by_vectors(queries, args.k)
+        batch_ms = (time.perf_counter() - start) * 1000
+
+        print(f"documents          : {args.n}")
+        print(f"normalize (first)  : {build_seconds * 1000:8.1f} ms")
+        print(f"single query p50   : {np.percentile(latencies_ms, 50):8.2f} ms")
+        print(f"single query p99   : {np.percentile(latencies_ms, 99):8.2f} ms")
+        print(f"batch of {args.queries:<5}    : {batch_ms:8.1f} ms ({batch_ms / args.queries:.2f} ms/query)")
+    finally:
+        shutil.rmtree(os.path.dirname(store.storage_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+文の抽出（ingest.extract_english_sentences / extract_japanese_sentences）の速度
+  - 1文字ずつ数える従来の実装（reference_*）と結果が一致することを確認し、ドキュメントの長さごとに比べる
+  - 対訳形式でないドキュメントだけのストアで、出題（get_random_english_question）1回の時間
+    （英文は取り込み時に抽出済み。読み込んだストアでは各ドキュメントの初回だけ抽出する）
+
+使い方:
+    python benchmarks/bench_sentence_extraction.py --docs 2000 --chunk-chars 500 1000 4000
+"""
+import io
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import StubEncoder  # noqa: E402
+from run_benchmarks import synthetic_corpus  # noqa: E402
+
+
+def reference_english_sentences(text, min_length=50, max_length=200):
+    sentences = []
+    for sentence in re.split(r'[.!?]\s+', text):
+        sentence = sentence.strip()
+        if min_length <= len(sentence) <= max_length:
+            if sum(1 for c in sentence if ord(c) < 128) / len(sentence) > 0.7:
+                sentences.append(sentence)
+    return sentences
+
+
+def reference_japanese_sentences(text):
+    sentences = []
+    for sentence in re.split(r'[。！？\n]', text):
+        sentence = sentence.strip()
+        if len(sentence) >= 10:
+            japanese = sum(1 for c in sentence if '\u3040' <= c <= '\u309F' or '\u30A0' <= c <= '\u30FF'
+                           or '\u4E00' <= c <= '\u9FFF')
+            if japanese / len(sentence) > 0.3:
+                sentences.append(sentence)
+    return sentences
+
+
+def text_documents(n, chunk_chars, seed=0):
+    """英文と和文が混ざった、対訳形式でない本文を n 件（それぞれ約 chunk_chars 文字）"""
+    pairs = [doc["text"].split('\n') for doc in synthetic_corpus(n * chunk_chars // 60 + 1, seed)]
+    documents, chunk, size = [], [], 0
+    for english, japanese in pairs:
+        sentence = f"{english[len('EN: '):]} It is explained in detail in this chapter. {japanese[len('JP: '):]}"
+        chunk.append(sentence)
+        size += len(sentence)
+        if size >= chunk_chars:
+            documents.append(' '.join(chunk))
+            chunk, size = [], 0
+            if len(documents) == n:
+                break
+    return documents
+
+
+def per_document_us(function, documents):
+    start = time.perf_counter()
+    for text in documents:
+        function(text)
+    return (time.perf_counter() - start) / len(documents) * 1e6
+
+
+def question_latency(documents, questions):
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'store')
+        with contextlib.redirect_stdout(io.StringIO()):
+            store = SimpleVectorStore(storage_path=path, encoder=StubEncoder())
+            store.add_documents([{"id": f"text_{i}", "text": text, "metadata": {}}
+                                 for i, text in enumerate(documents)])
+            # 読み込み直したストア（英文は初めて出題した時に抽出）
+            reloaded = SimpleVectorStore(storage_path=path, encoder=StubEncoder())
+        result = {}
+        for name, vector_store in (('ingested', store), ('reloaded', reloaded)):
+            quiz = EnglishQuizSystem(vector_store=vector_store, warm_up=False)
+            latencies = []
+            for _ in range(questions):
+                start = time.perf_counter()
+                quiz.get_random_english_question()
+                latencies.append((time.perf_counter() - start) * 1e6)
+            result[name] = (float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)))
+        return result
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文の抽出と出題の速度')
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--chunk-chars', type=int, nargs='+', default=[500, 1000, 4000])
+    parser.add_argument('--questions', type=int, default=5000)
+    args = parser.parse_args()
+
+    from ingest import extract_english_sentences, extract_japanese_sentences
+
+    failed = False
+    print(f"{'文字数':>8} {'英文 従来 µs':>12} {'英文 µs':>9} {'和文 従来 µs':>12} {'和文 µs':>9}")
+    for chunk_chars in args.chunk_chars:
+        documents = text_documents(args.docs, chunk_chars)
+        for text in documents:
+            if (extract_english_sentences(text) != reference_english_sentences(text)
+                    or extract_japanese_sentences(text) != reference_japanese_sentences(text)):
+                print(f"  結果が一致しません: {text[:60]!r}")
+                failed = True
+                break
+        print(f"{chunk_chars:>8} {per_document_us(reference_english_sentences, documents):>12.1f} "
+              f"{per_document_us(extract_english_sentences, documents):>9.1f} "
+              f"{per_document_us(reference_japanese_sentences, documents):>12.1f} "
+              f"{per_document_us(extract_japanese_sentences, documents):>9.1f}")
+
+    documents = text_documents(args.docs, args.chunk_chars[-1])
+    print(f"\n出題1回（{len(documents)}件・各{args.chunk_chars[-1]}文字、{args.questions}回）")
+    for name, (p50, p99) in question_latency(documents, args.questions).items():
+        print(f"  {name:>8}: p50 {p50:.1f}µs, p99 {p99:.1f}µs")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+起動から最初の問題を出すまでの時間と、モデルの準備完了までの時間を計測する
+（毎回新しいプロセスで計測し、import 済みモジュールの影響を除く）
+
+使い方:
+    python benchmarks/bench_startup.py --store quiz_vector_store
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run_child(storage_path):
+    import time
+    start = time.perf_counter()
+
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+    imported = time.perf_counter()
+    torch_imported = 'torch' in sys.modules
+
+    quiz = EnglishQuizSystem(vector_store=SimpleVectorStore(storage_path))
+    question = quiz.get_random_english_question()
+    first_question = time.perf_counter()
+
+    quiz.warm_up(background=False)
+    ready = time.perf_counter()
+
+    print(json.dumps({
+        'import_seconds': round(imported - start, 3),
+        'torch_imported_at_import': torch_imported,
+        'first_question_seconds': round(first_question - start, 3),
+        'has_question': question is not None,
+        'model_ready_seconds': round(ready - start, 3),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default='quiz_vector_store')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.store)
+        return
+
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--store', args.store],
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    print(f"import:          {result['import_seconds']:.3f}秒 (torch 読み込み済み: {result['torch_imported_at_import']})")
+    print(f"最初の問題まで:  {result['first_question_seconds']:.3f}秒 (出題: {result['has_question']})")
+    print(f"モデル準備完了:  {result['model_ready_seconds']:.3f}秒")
+
+
+if __name__ == "__main__":
+    main()
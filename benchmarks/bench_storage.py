@@ -0,0 +1,88 @@
+"""
+ベクトルストアの保存形式比較（ディスクサイズ・起動時の読み込み時間）
+旧形式（インデント付きJSON）と新形式（memmap + 軽量JSON）を比較する
+モデルは使わず、ランダムな埋め込みで計測する
+
+使い方:
+    python benchmarks/bench_storage.py --n 10000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import NoModelEncoder  # noqa: E402
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def write_legacy_json(path, n, dimension, seed=0):
+    rng = np.random.default_rng(seed)
+    documents = []
+    for i in range(n):
+        documents.append({
+            "id": f"doc_{i}",
+            "text": f"EN: Sample sentence number {i} for the storage benchmark.\nJP: ストレージ計測用のサンプル文 {i} です。",
+            "metadata": {"source": "benchmark", "chunk_index": i, "total_chunks": n},
+            "embedding": rng.standard_normal(dimension).astype(np.float32).tolist()
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='保存形式のサイズと読み込み時間を比較')
+    parser.add_argument('--n', type=int, default=10000)
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    args = parser.parse_args()
+
+    from simple_vector_store import SimpleVectorStore
+
+    workdir = tempfile.mkdtemp()
+    try:
+        legacy_path = os.path.join(workdir, 'quiz_vector_store.json')
+        write_legacy_json(legacy_path, args.n, NoModelEncoder.dimension)
+        # 移行後は .migrated に名前が変わるので、先に測っておく
+        legacy_size = directory_size(legacy_path)
+
+        # 旧形式: JSON 全体のパース時間
+        start = time.perf_counter()
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            json.load(f)
+        legacy_seconds = time.perf_counter() - start
+
+        # 初回の移行
+        start = time.perf_counter()
+        SimpleVectorStore(storage_path=legacy_path, encoder=NoModelEncoder(), embedding_dtype=args.dtype)
+        migrate_seconds = time.perf_counter() - start
+
+        # 新形式: 移行後の起動時間
+        start = time.perf_counter()
+        store = SimpleVectorStore(storage_path=legacy_path, encoder=NoModelEncoder())
+        new_seconds = time.perf_counter() - start
+
+        new_size = directory_size(store.storage_path)
+
+        print(f"documents        : {args.n}")
+        print(f"legacy JSON      : {legacy_size / 1e6:8.1f} MB, load {legacy_seconds:6.2f} s")
+        print(f"binary ({args.dtype}) : {new_size / 1e6:8.1f} MB, load {new_seconds:6.2f} s")
+        print(f"migration        : {migrate_seconds:6.2f} s (one-time)")
+        print(f"size ratio       : {legacy_size / new_size:6.1f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
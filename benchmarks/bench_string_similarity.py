@@ -0,0 +1,138 @@
+"""
+文字列類似度（difflib.SequenceMatcher と string_similarity）の計測
+  - 速度: SequenceMatcher（ratio + get_opcodes）と compare、ratio、batch_ratios、batch_lcs_ratios を文字数ごとに比較し、
+    正解を共有する一括採点に近い組でも batch_ratios を比較する
+  - 一致: ratio・compare・batch_ratios が SequenceMatcher.ratio と同じ値か、差分区間から両方の文字列を
+    復元できるか、LCS の類似度が SequenceMatcher 以上か（いずれかが崩れれば終了コード1）
+サンプルデータの和訳と、それを切り貼りした回答で計測する
+
+使い方:
+    python benchmarks/bench_string_similarity.py --pairs 2000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from difflib import SequenceMatcher
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_tokenize import sample_references, synthetic_answers  # noqa: E402
+
+def reconstruct(opcodes, a, b):
+    """差分区間から a と b を組み立て直す（区間が連続していなければ None）"""
+    rebuilt_a, rebuilt_b = [], []
+    position_a = position_b = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if (i1, j1) != (position_a, position_b) or (tag == 'equal' and a[i1:i2] != b[j1:j2]):
+            return None
+        rebuilt_a.append(a[i1:i2])
+        rebuilt_b.append(b[j1:j2])
+        position_a, position_b = i2, j2
+    return ''.join(rebuilt_a), ''.join(rebuilt_b)
+
+
+def timed_ms(function, pairs):
+    start = time.perf_counter()
+    function(pairs)
+    return (time.perf_counter() - start) / len(pairs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字列類似度の速度と SequenceMatcher との比較')
+    parser.add_argument('--pairs', type=int, default=2000)
+    parser.add_argument('--lengths', default='20,50,100,200,500', help='速度を測る文字数（カンマ区切り）')
+    args = parser.parse_args()
+
+    import string_similarity
+    from english_quiz_system import _normalize_text
+
+    references = [_normalize_text(text) for text in sample_references()]
+    rng = random.Random(0)
+
+    def pairs_of_length(length, n):
+        # 和訳をつなげて指定の長さにそろえた（正解, 回答）の組
+        corpus = ''.join(references)
+        pairs = []
+        for _ in range(n):
+            start = rng.randint(0, len(corpus) - length)
+            reference = corpus[start:start + length]
+            cut = rng.randint(0, length)
+            other = rng.randint(0, len(corpus) - length)
+            pairs.append((reference[:cut] + corpus[other:other + length - cut], reference))
+        return pairs
+
+    print(f"{'文字数':>6} {'SequenceMatcher':>16} {'compare':>9} {'ratio':>9} {'batch':>9} {'batch_lcs':>10}  (μs/組)")
+    for length in [int(value) for value in args.lengths.split(',')]:
+        pairs = pairs_of_length(length, max(50, args.pairs // max(1, length // 50)))
+
+        def legacy(pairs):
+            for a, b in pairs:
+                matcher = SequenceMatcher(None, a, b)
+                matcher.ratio()
+                matcher.get_opcodes()
+
+        def new_compare(pairs):
+            for a, b in pairs:
+                string_similarity.compare(a, b)
+
+        def new_ratio(pairs):
+            for a, b in pairs:
+                string_similarity.ratio(a, b)
+
+        def batch(pairs):
+            string_similarity.batch_ratios([a for a, _ in pairs], [b for _, b in pairs])
+
+        def batch_lcs(pairs):
+            string_similarity.batch_lcs_ratios([a for a, _ in pairs], [b for _, b in pairs])
+
+        timings = [timed_ms(function, pairs) * 1000 for function in (legacy, new_compare, new_ratio, batch, batch_lcs)]
+        print(f"{length:>6} {timings[0]:>16.1f} {timings[1]:>9.1f} {timings[2]:>9.1f} {timings[3]:>9.1f} "
+              f"{timings[4]:>10.1f}")
+
+    # 一致の確認は実際の採点に近い回答で行う
+    answers = synthetic_answers(references, args.pairs, repeat_ratio=0.0)
+    pairs = [(_normalize_text(answer), rng.choice(references)) for answer in answers]
+    pairs += [(reference, reference) for reference in references] + [('', references[0]), ('', '')]
+
+    def legacy_ratios(pairs):
+        for a, b in pairs:
+            SequenceMatcher(None, a, b).ratio()
+
+    def batch(pairs):
+        string_similarity.batch_ratios([a for a, _ in pairs], [b for _, b in pairs])
+
+    print(f"\n一括採点に近い組（{len(pairs)}組, 正解{len(references)}件）: "
+          f"SequenceMatcher {timed_ms(legacy_ratios, pairs) * 1000:.1f} μs/組, "
+          f"batch_ratios {timed_ms(batch, pairs) * 1000:.1f} μs/組")
+
+    failures = []
+    batch = string_similarity.batch_ratios([a for a, _ in pairs], [b for _, b in pairs])
+    lcs = string_similarity.batch_lcs_ratios([a for a, _ in pairs], [b for _, b in pairs])
+    for k, (a, b) in enumerate(pairs):
+        expected = SequenceMatcher(None, a, b).ratio()
+        comparison = string_similarity.compare(a, b)
+        if reconstruct(comparison.opcodes, a, b) != (a, b):
+            failures.append(('差分区間', a, b))
+        elif comparison.ratio != expected or string_similarity.ratio(a, b) != expected or batch[k] != expected:
+            failures.append(('SequenceMatcher との不一致', a, b))
+        elif lcs[k] + 1e-9 < expected or abs(lcs[k] - string_similarity.lcs_ratio(a, b)) > 1e-9:
+            failures.append(('LCS の類似度', a, b))
+
+    gaps = lcs - batch
+    print(f"LCS の類似度と SequenceMatcher の差（差分表示と採点の一致の違い）: "
+          f"同じ {np.mean(gaps < 1e-9):.0%}, 平均 {gaps.mean():.3f}, 最大 {gaps.max():.3f}")
+
+    if failures:
+        kind, a, b = failures[0]
+        print(f"❌ {len(failures)}組で問題があります（{kind}: {a!r} / {b!r}）")
+        sys.exit(1)
+    print(f"✅ {len(pairs)}組すべて、類似度が SequenceMatcher と一致し、差分区間が正しいことを確認しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+和訳の内容語抽出（形態素解析）の計測
+  - 初期化: Janome の import・Tokenizer の生成・最初の解析までの時間（新しいプロセスで計測）
+  - 解析: 従来の実装（毎回の集合生成と品詞の部分一致）と content_words の比較、LRU の効果
+  - 一致: 従来の実装と内容語が完全に一致するか（不一致があれば終了コード1）
+サンプルデータの和訳と、それを切り貼りした回答で計測する
+
+使い方:
+    python benchmarks/bench_tokenize.py --answers 2000 --repeat-ratio 0.5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import contextlib
+import io
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def legacy_tokenize(tokenizer, text):
+    # 変更前の EnglishQuizSystem.tokenize_japanese と同じ処理
+    excluded_pos = {'助詞', '助動詞', '記号', '接続詞', '接頭詞', '非自立'}
+    excluded_words = {
+        'です', 'ます', 'である', 'だ', 'た', 'れる', 'られる',
+        'せる', 'させる', 'ない', 'ぬ', 'う', 'よう'
+    }
+    words = []
+    for token in tokenizer.tokenize(text):
+        surface = token.surface
+        pos = token.part_of_speech.split(',')[0]
+        if not any(ex in pos for ex in excluded_pos) and surface not in excluded_words and len(surface) > 1:
+            words.append(surface)
+    return words
+
+
+class _Collector:
+    def __init__(self):
+        self.documents = []
+
+    def add_documents(self, documents):
+        self.documents.extend(documents)
+        return len(documents)
+
+
+def sample_references():
+    from create_sample_data import create_sample_data
+    from translation_pairs import parse_translation_pair
+    collector = _Collector()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_sample_data(collector)
+    return [parse_translation_pair(doc["text"])[1] for doc in collector.documents]
+
+
+def synthetic_answers(references, n, repeat_ratio, seed=0):
+    """正解を切り貼りした回答。repeat_ratio の割合で既出の回答を再提出する"""
+    rng = random.Random(seed)
+    answers = []
+    for _ in range(n):
+        if answers and rng.random() < repeat_ratio:
+            answers.append(rng.choice(answers))
+            continue
+        reference, other = rng.choice(references), rng.choice(references)
+        cut = rng.randint(len(reference) // 3, len(reference))
+        answers.append(reference[:cut] + other[rng.randint(0, len(other) // 2):])
+    return answers
+
+
+def run_init_child(mmap):
+    start = time.perf_counter()
+    from janome.tokenizer import Tokenizer
+    imported = time.perf_counter()
+    tokenizer = Tokenizer(mmap=mmap)
+    created = time.perf_counter()
+    list(tokenizer.tokenize("人工知能は私たちの生活と仕事のあり方を変えています。"))
+    first = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'init_ms': (created - imported) * 1000,
+        'first_tokenize_ms': (first - created) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='内容語抽出の初期化・解析時間と従来実装との一致')
+    parser.add_argument('--answers', type=int, default=2000)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5, help='再提出（同じ回答）の割合')
+    parser.add_argument('--init-child', choices=['mmap', 'nommap'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.init_child:
+        run_init_child(args.init_child == 'mmap')
+        return
+
+    print(f"{'初期化':<10} {'import ms':>10} {'Tokenizer() ms':>15} {'初回解析 ms':>12}")
+    for mode in ('mmap', 'nommap'):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--init-child', mode],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<10} {result['import_ms']:>10.1f} {result['init_ms']:>15.1f} {result['first_tokenize_ms']:>12.1f}")
+
+    from content_words import ContentWordCache, extract_content_words, get_shared_tokenizer
+
+    tokenizer = get_shared_tokenizer()
+    references = sample_references()
+    answers = synthetic_answers(references, args.answers, args.repeat_ratio)
+    texts = references + answers
+
+    mismatches = [text for text in texts if legacy_tokenize(tokenizer, text) != extract_content_words(text, tokenizer)]
+
+    def timed(function):
+        start = time.perf_counter()
+        for text in answers:
+            function(text)
+        return (time.perf_counter() - start) / len(answers) * 1000
+
+    cache = ContentWordCache()
+
+    def cached(text):
+        words = cache.get(text)
+        if words is None:
+            words = tuple(extract_content_words(text, tokenizer))
+            cache.put(text, words)
+        return words
+
+    print(f"\n回答 {len(answers)}件（再提出 {args.repeat_ratio:.0%}）")
+    print(f"{'方式':<16} {'ms/回答':>9}")
+    print(f"{'従来':<16} {timed(lambda text: legacy_tokenize(tokenizer, text)):>9.3f}")
+    print(f"{'content_words':<16} {timed(lambda text: extract_content_words(text, tokenizer)):>9.3f}")
+    print(f"{'+ LRU':<16} {timed(cached):>9.3f}  (hit {cache.info()['hits']}/{len(answers)})")
+
+    if mismatches:
+        print(f"❌ 従来の実装と内容語が一致しないテキスト: {len(mismatches)}件 (例: {mismatches[0]})")
+        sys.exit(1)
+    print(f"✅ {len(texts)}件すべて従来の実装と一致しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+再現可能なベンチマーク一式（取り込み・起動・検索・出題・採点）
+
+合成した英日対訳コーパス（既定 1千・1万・10万件）ごとに次を計測し、JSON に保存する。
+  - ingest      : add_documents のスループット（件/秒）
+  - cold start  : 新しいプロセスでストアを開く時間（load_documents）と、最初の検索・出題の時間
+  - search      : search のレイテンシ（p50/p99）
+  - question    : get_random_english_question のレイテンシ（p50/p99）
+  - scoring     : score_translation のレイテンシ（p50/p99）
+エンコーダーはテキストのハッシュから決まる疑似埋め込み（StubEncoder）なので、モデルなしで
+ストアと採点（形態素解析・文字列類似度など）のコストだけを測れる。コーパス・クエリ・回答は
+--seed から決まるので、コミット間で同じ条件の結果を比較できる。
+
+使い方:
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 100000 1000000 -o results.json   # 100万件はディスク約6GB
+    python benchmarks/run_benchmarks.py --sizes 10000 -o new.json --compare results.json      # 前回の結果と比較
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import io
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _stubs import StubEncoder  # noqa: E402
+
+# 結果ファイルの形式（項目を変えたら上げる）
+RESULT_VERSION = 1
+
+EN_SUBJECTS = ["The system", "Our team", "This model", "The new library", "A small company", "The database",
+               "Every student", "The cloud service", "The research group", "This algorithm"]
+EN_VERBS = ["improves", "analyzes", "protects", "stores", "processes", "predicts", "connects", "optimizes"]
+EN_OBJECTS = ["large datasets", "user privacy", "network traffic", "customer feedback", "medical images",
+              "financial records", "sensor data", "source code", "search results", "training data"]
+EN_TAILS = ["every day.", "in real time.", "with high accuracy.", "at a low cost.", "for many users.",
+            "without human help.", "across several regions.", "more efficiently than before."]
+
+JP_SUBJECTS = ["そのシステムは", "私たちのチームは", "このモデルは", "新しいライブラリは", "小さな会社は", "データベースは",
+               "すべての学生は", "クラウドサービスは", "研究グループは", "このアルゴリズムは"]
+JP_OBJECTS = ["大規模なデータセットを", "利用者のプライバシーを", "ネットワークの通信を", "顧客の意見を", "医療画像を",
+              "財務記録を", "センサーのデータを", "ソースコードを", "検索結果を", "訓練データを"]
+JP_VERBS = ["改善します。", "分析します。", "保護します。", "保存します。", "処理します。", "予測します。",
+            "接続します。", "最適化します。"]
+JP_TAILS = ["毎日", "リアルタイムで", "高い精度で", "低いコストで", "多くの利用者のために",
+            "人の手を借りずに", "複数の地域で", "以前よりも効率的に"]
+
+
+def synthetic_corpus(n, seed=0, n_sources=20):
+    """EN:/JP: 形式の対訳ドキュメントを n 件（seed が同じなら同じ内容）"""
+    rng = random.Random(seed)
+    for i in range(n):
+        s, v, o, t = (rng.randrange(len(EN_SUBJECTS)), rng.randrange(len(EN_VERBS)),
+                      rng.randrange(len(EN_OBJECTS)), rng.randrange(len(EN_TAILS)))
+        english = f"{EN_SUBJECTS[s]} {EN_VERBS[v]} {EN_OBJECTS[o]} {EN_TAILS[t]}"
+        japanese = f"{JP_SUBJECTS[s]}{JP_TAILS[t]}{JP_OBJECTS[o]}{JP_VERBS[v]}"
+        yield {
+            "id": f"doc_{i}",
+            "text": f"EN: {english} (No. {i})\nJP: {japanese}（{i}番）",
+            "metadata": {"source": f"book_{i % n_sources}.pdf", "chunk_index": i // n_sources}
+        }
+
+
+def percentiles(latencies_ms):
+    return {
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(np.mean(latencies_ms))
+    }
+
+
+def timed_ms(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def open_store(path):
+    from simple_vector_store import SimpleVectorStore
+    with contextlib.redirect_stdout(io.StringIO()):
+        return SimpleVectorStore(storage_path=path, encoder=StubEncoder())
+
+
+def run_ingest(path, n, batch_size, seed):
+    store = open_store(path)
+    batch = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for doc in synthetic_corpus(n, seed):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                store.add_documents(batch)
+                batch = []
+        if batch:
+            store.add_documents(batch)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'docs_per_sec': n / elapsed}
+
+
+def run_cold_start_child(path):
+    """新しいプロセスで、import を除いたストアの読み込みと最初の検索・出題の時間を出力する"""
+    from english_quiz_system import EnglishQuizSystem
+    start = time.perf_counter()
+    store = open_store(path)
+    opened = time.perf_counter()
+    store.search("The system improves large datasets every day.", 5)
+    searched = time.perf_counter()
+    EnglishQuizSystem(vector_store=store, warm_up=False).get_random_english_question()
+    questioned = time.perf_counter()
+    print(json.dumps({
+        'load_ms': (opened - start) * 1000,
+        'first_search_ms': (searched - opened) * 1000,
+        'first_question_ms': (questioned - searched) * 1000
+    }))
+
+
+def run_cold_start(path):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--cold-start-child', path],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run_queries(path, args):
+    from english_quiz_system import EnglishQuizSystem
+
+    store = open_store(path)
+    quiz = EnglishQuizSystem(vector_store=store, warm_up=False)
+    rng = random.Random(args.seed + 1)
+    queries = [doc['text'].split('\n')[0][4:] for doc in synthetic_corpus(args.queries, args.seed + 2)]
+
+    # 正規化済み行列の構築・Janome の辞書読み込みなど初回だけの処理を計測から除く
+    store.search(queries[0], args.k)
+    question = quiz.get_random_english_question()
+    quiz.score_translation(question['japanese'], current_question=question)
+
+    search = [timed_ms(lambda: store.search(query, args.k)) for query in queries]
+    sampling = [timed_ms(quiz.get_random_english_question) for _ in range(args.queries)]
+
+    scoring = []
+    for _ in range(args.answers):
+        question = quiz.get_random_english_question()
+        reference = question['japanese']
+        # 正解の一部を削って並べ替えた回答（bench_grading と同じ作り方）
+        cut = rng.randint(len(reference) // 2, len(reference))
+        answer = reference[:cut] + reference[cut:][::-1]
+        scoring.append(timed_ms(lambda: quiz.score_translation(answer, current_question=question)))
+
+    return {
+        'search': percentiles(search),
+        'question': percentiles(sampling),
+        'scoring': percentiles(scoring)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result, prefix=''):
+    """{'search': {'p50_ms': 1.0}} -> {'search.p50_ms': 1.0}"""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {entry['documents']: flatten(entry) for entry in baseline['results']}
+    print(f"\n前回の結果との比較（{baseline_path}, commit {baseline['meta'].get('commit')}）")
+    print(f"{'件数':>9} {'項目':<28} {'前回':>11} {'今回':>11} {'変化':>8}")
+    for entry in results:
+        old = previous.get(entry['documents'])
+        if old is None:
+            continue
+        for key, value in flatten(entry).items():
+            if key == 'documents' or key not in old or not old[key]:
+                continue
+            print(f"{entry['documents']:>9} {key:<28} {old[key]:>11.3f} {value:>11.3f} {value / old[key] - 1:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='取り込み・起動・検索・出題・採点のベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='ドキュメント数')
+    parser.add_argument('--ingest-batch', type=int, default=10000, help='add_documents 1回あたりの件数')
+    parser.add_argument('--queries', type=int, default=200, help='検索・出題の計測回数')
+    parser.add_argument('--answers', type=int, default=200, help='採点の計測回数')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help='ストアを作る場所（既定: 一時ディレクトリ）')
+    parser.add_argument('-o', '--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='比較する前回の結果（JSON）')
+    parser.add_argument('--cold-start-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_child:
+        run_cold_start_child(args.cold_start_child)
+        return
+
+    workdir = tempfile.mkdtemp(dir=args.workdir)
+    results = []
+    try:
+        print(f"{'件数':>9} {'取り込み 件/秒':>14} {'読み込み ms':>11} {'検索 p50/p99 ms':>17} "
+              f"{'出題 p50/p99 ms':>17} {'採点 p50/p99 ms':>17}")
+        for n in args.sizes:
+            path = os.path.join(workdir, f"store_{n}")
+            entry = {'documents': n, 'ingest': run_ingest(path, n, args.ingest_batch, args.seed)}
+            entry['cold_start'] = run_cold_start(path)
+            entry.update(run_queries(path, args))
+            results.append(entry)
+            shutil.rmtree(path)
+
+            print(f"{n:>9} {entry['ingest']['docs_per_sec']:>14.0f} {entry['cold_start']['load_ms']:>11.1f} "
+                  f"{entry['search']['p50_ms']:>8.2f}/{entry['search']['p99_ms']:<8.2f} "
+                  f"{entry['question']['p50_ms']:>8.3f}/{entry['question']['p99_ms']:<8.3f} "
+                  f"{entry['scoring']['p50_ms']:>8.2f}/{entry['scoring']['p99_ms']:<8.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'version': RESULT_VERSION,
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('cold_start_child', 'compare')}
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+和訳の内容語の抽出（Janome による形態素解析）
+
+助詞・助動詞・記号などを除いた内容語を取り出す。
+  - Janome の Tokenizer は辞書の読み込みに時間がかかるので、プロセス内で1つを共有する
+  - 品詞による除外は品詞文字列ごとに一度だけ判定し、以降は辞書引きで済ませる
+  - 回答の解析結果は ContentWordCache（上限付きLRU）に保持する
+"""
+import threading
+from typing import Dict, List
+
+from lru_cache import LRUCache
+
+EXCLUDED_POS = frozenset({
+    '助詞',
+    '助動詞',
+    '記号',
+    '接続詞',
+    '接頭詞',
+    '非自立'
+})
+
+EXCLUDED_WORDS = frozenset({
+    'です', 'ます', 'である', 'だ', 'た', 'れる', 'られる',
+    'せる', 'させる', 'ない', 'ぬ', 'う', 'よう'
+})
+
+DEFAULT_CACHE_SIZE = 4096
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+# 品詞文字列（例: "名詞,一般,*,*"）-> 除外するか
+_excluded_by_pos: Dict[str, bool] = {}
+
+
+def get_shared_tokenizer():
+    """プロセス内で一度だけ Janome の Tokenizer を作り、以降は同じインスタンスを返す"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from janome.tokenizer import Tokenizer
+                # 辞書はメモリマップで読み込む（採点ワーカーのプロセス間でもページを共有できる）
+                _tokenizer = Tokenizer(mmap=True)
+    return _tokenizer
+
+
+def is_tokenizer_loaded() -> bool:
+    return _tokenizer is not None
+
+
+def _is_excluded_pos(part_of_speech: str) -> bool:
+    excluded = _excluded_by_pos.get(part_of_speech)
+    if excluded is None:
+        # 従来と同じく、最初の品詞に除外品詞の文字列を含むかで判定する（品詞の種類は少ないので初回だけ）
+        first = part_of_speech.split(',', 1)[0]
+        excluded = _excluded_by_pos[part_of_speech] = any(ex in first for ex in EXCLUDED_POS)
+    return excluded
+
+
+def extract_content_words(text: str, tokenizer=None) -> List[str]:
+    """1文字の語・除外語・除外品詞を除いた表層形の一覧"""
+    tokenizer = tokenizer or get_shared_tokenizer()
+    words = []
+    # tokenize はトークンを1つずつ返すイテレーター（全体のリストは作らない）
+    for token in tokenizer.tokenize(text):
+        surface = token.surface
+        if len(surface) > 1 and surface not in EXCLUDED_WORDS and not _is_excluded_pos(token.part_of_speech):
+            words.append(surface)
+    return words
+
+
+class ContentWordCache(LRUCache):
+    """テキストをキーにした内容語（タプル）の上限付きLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        super().__init__(max_size)
+
+
+# 回答の解析結果はプロセス内の全セッションで共有する
+shared_word_cache = ContentWordCache()
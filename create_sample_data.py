@@ -3,7 +3,7 @@
 """
 from simple_vector_store import SimpleVectorStore
 
-def create_sample_data():
+def create_sample_data(vector_store=None):
     print("=" * 60)
     print("Creating sample data for English Quiz System...")
     print("=" * 60)
@@ -111,7 +111,8 @@ def create_sample_data():
          "データマイニングは大規模なデータセットから価値あるパターンと知識を抽出します。"),
     ]
 
-    vector_store = SimpleVectorStore()
+    if vector_store is None:
+        vector_store = SimpleVectorStore()
 
     documents = []
     for i, (english, japanese) in enumerate(sample_sentences):
@@ -127,10 +128,12 @@ def create_sample_data():
         }
         documents.append(doc)
 
-    vector_store.add_documents(documents)
+    added = vector_store.add_documents(documents)
 
     print("\n" + "=" * 60)
-    print(f"SUCCESS: Created {len(documents)} sample sentences!")
+    print(f"SUCCESS: Created {added} sample sentences!")
+    if added < len(documents):
+        print(f"({len(documents) - added} sentences were already in the store)")
     print("=" * 60)
     print("\nYou can now start the quiz system:")
     print("  - Run: start_quiz.bat")
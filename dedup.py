@@ -0,0 +1,169 @@
+"""
+取り込み時の重複ドキュメントの検出
+
+  - 完全一致: 正規化した本文（NFKC・小文字化・空白の統一）の blake2b ハッシュ（128ビット）
+  - ほぼ重複: 文字3-gram（出現回数で重み付け）の SimHash（64ビット）のハミング距離が max_distance 以下
+    64ビットを16ビットずつ4つの帯に分け、どれかの帯が一致する候補だけを比較する
+    （距離が3以下なら、鳩の巣原理でどれかの帯は必ず一致する）
+短い文は1語の違いでも別の問題なので、ほぼ重複の判定は min_chars 文字以上のドキュメントだけに行う。
+完全一致は出典（scope）ごとに区別する。同じ出典の同じ本文は 'exact'（登録不要）、別の出典に同じ本文が
+あれば 'shared'、ほぼ重複は出典によらず 'near' として、行番号とともに返す（扱いは呼び出し側が決める）。
+ハッシュは1件25バイトのレコードとしてファイルに追記し、次回の起動時は本文を解析し直さずに読み込む。
+"""
+import hashlib
+import unicodedata
+import numpy as np
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from array_buffer import append_records, read_records
+
+DEFAULT_MAX_DISTANCE = 3
+NEAR_DUPLICATE_MIN_CHARS = 200
+SHINGLE_SIZE = 3
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+# 行ごとのレコード（ファイル内の位置 = 行番号）。SimHash を計算しない短い文は near=0
+RECORD_DTYPE = np.dtype([('content', 'V16'), ('simhash', '<u8'), ('near', 'u1')])
+
+Fingerprint = Tuple[bytes, Optional[int]]
+
+_BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def content_hash(normalized: str) -> bytes:
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    # splitmix64 の最終段（3-gram の値を64ビット全体に散らす）
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def simhash(normalized: str) -> int:
+    """文字3-gram を出現回数で重み付けした64ビット SimHash"""
+    codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < SHINGLE_SIZE:
+        codes = np.concatenate([codes, np.zeros(SHINGLE_SIZE - len(codes), dtype=np.uint64)])
+    # Unicode のコードポイントは21ビットなので、3文字を1つの64ビット整数に詰められる
+    shingles = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    unique, counts = np.unique(shingles, return_counts=True)
+    hashes = _mix64(unique)
+    ones = counts @ ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    bits = ones * 2 > counts.sum()
+    return int(np.packbits(bits, bitorder='little').view('<u8')[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class DedupIndex:
+    """本文のハッシュと SimHash から、登録済みの重複ドキュメントを探す"""
+
+    def __init__(self, max_distance: Optional[int] = DEFAULT_MAX_DISTANCE,
+                 min_chars: int = NEAR_DUPLICATE_MIN_CHARS):
+        if max_distance is not None and not 0 <= max_distance < BANDS:
+            raise ValueError(f"max_distance は0〜{BANDS - 1}にしてください（帯の数で検出できる上限）")
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        # 本文のハッシュ -> 最初に登録した行。別の出典で登録した同じ本文は _other_scopes に持つ
+        self._by_content: Dict[bytes, int] = {}
+        self._other_scopes: Dict[Tuple[bytes, Hashable], int] = {}
+        self._scopes: List[Hashable] = []
+        self._simhashes: Dict[int, int] = {}
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def fingerprint(self, text: str) -> Fingerprint:
+        normalized = normalize_text(text)
+        near = self.max_distance is not None and len(normalized) >= self.min_chars
+        return content_hash(normalized), simhash(normalized) if near else None
+
+    def find(self, fingerprint: Fingerprint, scope: Hashable = None) -> Optional[Tuple[str, int]]:
+        """('exact' / 'shared' / 'near', 行番号)。重複がなければ None"""
+        content, fingerprint_simhash = fingerprint
+        row = self._by_content.get(content)
+        if row is not None:
+            if self._scopes[row] == scope:
+                return 'exact', row
+            other = self._other_scopes.get((content, scope))
+            if other is not None:
+                return 'exact', other
+            return 'shared', row
+        if fingerprint_simhash is None or self.max_distance is None:
+            return None
+
+        checked = set()
+        for band, buckets in enumerate(self._bands):
+            for row in buckets.get(_band_key(fingerprint_simhash, band), ()):
+                if row in checked:
+                    continue
+                checked.add(row)
+                if hamming_distance(self._simhashes[row], fingerprint_simhash) <= self.max_distance:
+                    return 'near', row
+        return None
+
+    def add(self, row: int, fingerprint: Fingerprint, scope: Hashable = None):
+        content, fingerprint_simhash = fingerprint
+        if len(self._scopes) <= row:
+            self._scopes.extend([None] * (row + 1 - len(self._scopes)))
+        self._scopes[row] = scope
+        first = self._by_content.setdefault(content, row)
+        if self._scopes[first] != scope:
+            self._other_scopes.setdefault((content, scope), row)
+        if fingerprint_simhash is not None:
+            self._simhashes[row] = fingerprint_simhash
+            for band, buckets in enumerate(self._bands):
+                buckets.setdefault(_band_key(fingerprint_simhash, band), []).append(row)
+        self.rows = max(self.rows, row + 1)
+
+    def add_texts(self, start_row: int, texts: Iterable[str], scopes: Iterable[Hashable]) -> List[Fingerprint]:
+        fingerprints = []
+        for row, (text, scope) in enumerate(zip(texts, scopes), start=start_row):
+            fingerprint = self.fingerprint(text)
+            self.add(row, fingerprint, scope)
+            fingerprints.append(fingerprint)
+        return fingerprints
+
+    @staticmethod
+    def append(path: str, fingerprints: Sequence[Fingerprint]):
+        """追加分のレコードだけをファイル末尾に追記する"""
+        records = np.zeros(len(fingerprints), dtype=RECORD_DTYPE)
+        for i, (content, fingerprint_simhash) in enumerate(fingerprints):
+            records[i]['content'] = content
+            if fingerprint_simhash is not None:
+                records[i]['simhash'] = fingerprint_simhash
+                records[i]['near'] = 1
+        append_records(path, records)
+
+    @classmethod
+    def load(cls, path: str, texts: Sequence[str], scopes: Sequence[Hashable],
+             max_distance: Optional[int] = DEFAULT_MAX_DISTANCE,
+             min_chars: int = NEAR_DUPLICATE_MIN_CHARS) -> "DedupIndex":
+        """保存済みのレコードを読み込み、足りない行（以前の版で作ったストアなど）は本文から計算して追記する。
+        scopes は行ごとの出典（ファイルには保存せず、ドキュメントのメタデータから渡す）"""
+        index = cls(max_distance, min_chars)
+        records = read_records(path, RECORD_DTYPE, len(texts))
+        for row, record in enumerate(records):
+            near = bool(record['near']) and max_distance is not None
+            index.add(row, (bytes(record['content']), int(record['simhash']) if near else None), scopes[row])
+        valid = len(records)
+        if valid < len(texts):
+            rows = range(valid, len(texts))
+            cls.append(path, index.add_texts(valid, (texts[row] for row in rows), (scopes[row] for row in rows)))
+        return index
+
+
+def _band_key(value: int, band: int) -> int:
+    return (value >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
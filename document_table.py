@@ -0,0 +1,301 @@
+"""
+列指向のドキュメント表（SimpleVectorStore.documents）
+
+ドキュメントごとの dict を持たず、列ごとにまとめて保持する:
+  - id・本文      : UTF-8 の連結バイト列 + 開始位置の配列（1件あたりのオブジェクトなし）
+  - メタデータ    : キーごとに値を一度だけ保持し、各行は値の番号（int32）だけを持つ
+埋め込みは SimpleVectorStore 側の float32 行列にある。
+行の参照は DocumentView（dict と同じ読み取り操作ができる軽量ビュー）で返し、
+値は参照された時に初めて取り出す。
+
+メタデータの絞り込み（rows_where）は、キーごとの転置インデックス（値 -> 行番号の一覧）で行う。
+転置インデックスはそのキーで初めて絞り込んだ時に作り、以降は追加のたびに更新する。
+条件の書き方:
+    {"source": "a.pdf"}                          一致
+    {"source": {"$in": ["a.pdf", "b.pdf"]}}      いずれかに一致
+    {"chunk_index": {"$gte": 10, "$lt": 20}}     範囲（$gt / $gte / $lt / $lte / $ne）
+    複数のキーはすべて満たす行（AND）
+"""
+import json
+import operator
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+MISSING = -1
+_COMPARISONS = {
+    '$eq': operator.eq, '$ne': operator.ne,
+    '$gt': operator.gt, '$gte': operator.ge,
+    '$lt': operator.lt, '$lte': operator.le,
+}
+
+
+class StringColumn:
+    """文字列の列を UTF-8 の連結バイト列と開始位置の配列で保持する"""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self._data[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def append(self, value: str):
+        self._data += value.encode('utf-8')
+        self._offsets.append(len(self._data))
+
+    def nbytes(self) -> int:
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
+
+
+def _value_key(value):
+    # 1 / 1.0 / True が同じ値にまとめられないよう型も含める（dict・list は JSON 文字列で比較）
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return type(value).__name__, value
+    return 'json', json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class MetadataColumns:
+    """メタデータをキーごとの辞書符号化（値の一覧 + 行ごとの値番号）で保持する"""
+
+    def __init__(self):
+        self.rows = 0
+        self.codes: Dict[str, array] = {}
+        self.values: Dict[str, List] = {}
+        self._lookup: Dict[str, Dict] = {}
+        # キー -> 値の番号ごとの行番号の一覧（絞り込みに使ったキーだけ）
+        self._postings: Dict[str, List[array]] = {}
+        # キー -> 値がすべて数値の場合の値の配列（範囲条件をまとめて比較する）
+        self._numeric: Dict[str, np.ndarray] = {}
+
+    def append(self, metadata: Dict):
+        for key, value in metadata.items():
+            if key not in self.codes:
+                # 途中で現れたキーは、それまでの行を「値なし」で埋める
+                self.codes[key] = array('i', [MISSING]) * self.rows
+                self.values[key] = []
+                self._lookup[key] = {}
+            lookup = self._lookup[key]
+            value_key = _value_key(value)
+            code = lookup.get(value_key)
+            if code is None:
+                code = lookup[value_key] = len(self.values[key])
+                self.values[key].append(value)
+            self.codes[key].append(code)
+
+            postings = self._postings.get(key)
+            if postings is not None:
+                if code == len(postings):
+                    postings.append(array('q'))
+                postings[code].append(self.rows)
+
+        self.rows += 1
+        for key, codes in self.codes.items():
+            if len(codes) < self.rows:
+                codes.append(MISSING)
+
+    def get(self, row: int) -> Dict:
+        metadata = {}
+        for key, codes in self.codes.items():
+            code = codes[row]
+            if code != MISSING:
+                metadata[key] = self.values[key][code]
+        return metadata
+
+    def code_of(self, key: str, value) -> int:
+        """値の番号（その値を持つ行がなければ MISSING）"""
+        lookup = self._lookup.get(key)
+        if lookup is None:
+            return MISSING
+        return lookup.get(_value_key(value), MISSING)
+
+    def matching_codes(self, key: str, condition) -> List[int]:
+        """条件を満たす値の番号の一覧（範囲条件は行ではなく値の種類数に比例）"""
+        if key not in self.codes:
+            return []
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+
+        unknown = set(condition) - set(_COMPARISONS) - {'$in'}
+        if unknown:
+            raise ValueError(f"未対応の条件です: {', '.join(sorted(unknown))}")
+
+        if len(condition) == 1 and next(iter(condition)) in ('$eq', '$in'):
+            # 一致条件だけなら値から番号を直接引く
+            values = condition['$in'] if '$in' in condition else [condition['$eq']]
+            return sorted({self.code_of(key, value) for value in values} - {MISSING})
+
+        numeric = self._numeric_values(key)
+        if numeric is not None and all(_is_number(operand) for op, operand in condition.items() if op != '$in'):
+            mask = np.ones(len(numeric), dtype=bool)
+            for op, operand in condition.items():
+                if op == '$in':
+                    mask &= np.isin(numeric, [value for value in operand if _is_number(value)])
+                else:
+                    mask &= _COMPARISONS[op](numeric, operand)
+            return np.flatnonzero(mask).tolist()
+
+        def satisfies(value):
+            try:
+                if '$in' in condition and value not in condition['$in']:
+                    return False
+                return all(_COMPARISONS[op](value, operand)
+                           for op, operand in condition.items() if op != '$in')
+            except TypeError:
+                # 比較できない型の値（数値の範囲条件に文字列など）は条件を満たさない
+                return False
+
+        return [code for code, value in enumerate(self.values[key]) if satisfies(value)]
+
+    def rows_with(self, key: str, codes: List[int]) -> np.ndarray:
+        """いずれかの値の番号を持つ行番号（昇順）"""
+        if not codes:
+            return np.zeros(0, dtype=np.int64)
+        postings = self._postings.get(key)
+        if postings is None:
+            postings = self._postings[key] = self._build_postings(key)
+        if len(codes) == 1:
+            return np.frombuffer(postings[codes[0]], dtype=np.int64).copy()
+        return np.sort(np.concatenate([np.frombuffer(postings[code], dtype=np.int64) for code in codes]))
+
+    def _numeric_values(self, key: str):
+        values = self.values[key]
+        cached = self._numeric.get(key)
+        if cached is not None and len(cached) == len(values):
+            return cached
+        if not all(_is_number(value) for value in values):
+            return None
+        self._numeric[key] = np.array(values, dtype=np.float64)
+        return self._numeric[key]
+
+    def _build_postings(self, key: str) -> List[array]:
+        codes = np.frombuffer(self.codes[key], dtype=np.int32) if len(self.codes[key]) else np.zeros(0, np.int32)
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.searchsorted(codes[order], np.arange(len(self.values[key]) + 1))
+        postings = []
+        for code in range(len(self.values[key])):
+            rows = array('q')
+            rows.frombytes(order[boundaries[code]:boundaries[code + 1]].astype(np.int64).tobytes())
+            postings.append(rows)
+        return postings
+
+
+class DocumentView(Mapping):
+    """1件のドキュメントの読み取り専用ビュー（doc["text"]・doc.get("metadata") など dict と同様に使える）"""
+    __slots__ = ('_table', '_row')
+    KEYS = ('id', 'text', 'metadata')
+
+    def __init__(self, table: "DocumentTable", row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self._table.ids[self._row]
+        if key == 'text':
+            return self._table.texts[self._row]
+        if key == 'metadata':
+            return self._table.metadata.get(self._row)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class SearchResult(DocumentView):
+    """検索結果のビュー（ドキュメントの項目に distance を加えたもの）"""
+    __slots__ = ('distance',)
+    KEYS = ('id', 'text', 'metadata', 'distance')
+
+    def __init__(self, table: "DocumentTable", row: int, distance: float):
+        super().__init__(table, row)
+        self.distance = distance
+
+    def __getitem__(self, key):
+        if key == 'distance':
+            return self.distance
+        return super().__getitem__(key)
+
+
+class DocumentTable:
+    def __init__(self):
+        self.ids = StringColumn()
+        self.texts = StringColumn()
+        self.metadata = MetadataColumns()
+
+    @classmethod
+    def from_records(cls, documents: Iterable[Dict]) -> "DocumentTable":
+        table = cls()
+        table.extend(documents)
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [DocumentView(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("ドキュメントの行番号が範囲外です")
+        return DocumentView(self, row)
+
+    def __iter__(self) -> Iterator[DocumentView]:
+        for row in range(len(self)):
+            yield DocumentView(self, row)
+
+    def append(self, document: Dict):
+        self.ids.append(document["id"])
+        self.texts.append(document["text"])
+        self.metadata.append(document.get("metadata") or {})
+
+    def extend(self, documents: Iterable[Dict]):
+        for document in documents:
+            self.append(document)
+
+    def rows_where(self, where: Dict) -> np.ndarray:
+        """メタデータの条件（モジュールの説明を参照）をすべて満たす行番号（昇順）"""
+        rows = None
+        for key, condition in where.items():
+            matched = self.metadata.rows_with(key, self.metadata.matching_codes(key, condition))
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            if len(rows) == 0:
+                break
+        if rows is None:
+            return np.arange(len(self), dtype=np.int64)
+        return rows
+
+    def to_records(self) -> List[Dict]:
+        """保存用に dict のリストへ変換する（全体の書き直し時のみ）"""
+        return [view.to_dict() for view in self]
+
+    def nbytes(self) -> int:
+        return (self.ids.nbytes() + self.texts.nbytes() +
+                sum(codes.itemsize * len(codes) for codes in self.metadata.codes.values()))
@@ -6,125 +6,149 @@ import sys
 import os
 import re
 import random
-from difflib import SequenceMatcher
+import threading
 import numpy as np
 from collections import Counter
-from janome.tokenizer import Tokenizer
 
 from simple_vector_store import SimpleVectorStore
-from simple_embeddings import SimpleEmbeddings
+from ingest import extract_english_sentences, extract_japanese_sentences
+from content_words import extract_content_words, get_shared_tokenizer, is_tokenizer_loaded, shared_word_cache
+from metrics import get_metrics
+import string_similarity
 
+SCORE_WEIGHTS = {
+    'vector': 0.40,
+    'word': 0.40,
+    'string': 0.20
+}
 
-class EnglishQuizSystem:
-    def __init__(self):
-        self.vector_store = SimpleVectorStore()
-        self.embeddings = SimpleEmbeddings()
-        self.tokenizer = Tokenizer()
-        self.current_question = None
-        self.score_history = []
 
-    def extract_english_sentences(self, text, min_length=50, max_length=200):
-        sentences = re.split(r'[.!?]\s+', text)
-
-        english_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
+def _normalize_text(text):
+    # 文字列類似度の比較用: 小文字化し、句読点と空白を除く
+    return re.sub(r'[、。！？\s]+', '', text.lower().strip())
 
-            if len(sentence) < min_length or len(sentence) > max_length:
-                continue
 
-            ascii_chars = sum(1 for c in sentence if ord(c) < 128)
-            if ascii_chars / len(sentence) > 0.7:
-                english_sentences.append(sentence)
+def _cosine_similarity(vec1, vec2):
+    vec1 = np.array(vec1, dtype=np.float64)
+    vec2 = np.array(vec2, dtype=np.float64)
 
-        return english_sentences
+    dot_product = np.dot(vec1, vec2)
+    norm1 = np.linalg.norm(vec1)
+    norm2 = np.linalg.norm(vec2)
 
-    def get_random_english_question(self):
-        all_docs = self.vector_store.get_all_documents()
+    if norm1 == 0 or norm2 == 0:
+        return 0
 
-        if not all_docs:
-            return None
-
-        random.shuffle(all_docs)
-
-        for doc in all_docs:
-            doc_text = doc['text']
-
-            if 'EN:' in doc_text and 'JP:' in doc_text:
-                lines = doc_text.split('\n')
-                english_line = None
-                japanese_line = None
-
-                for line in lines:
-                    if line.startswith('EN:'):
-                        english_line = line.replace('EN:', '').strip()
-                    elif line.startswith('JP:'):
-                        japanese_line = line.replace('JP:', '').strip()
-
-                if english_line and japanese_line:
-                    self.current_question = {
-                        'english': english_line,
-                        'japanese': japanese_line,
-                        'source': doc.get('metadata', {}).get('source', 'Unknown'),
-                        'doc_id': doc['id']
-                    }
-                    return self.current_question
-            else:
-                sentences = self.extract_english_sentences(doc_text)
-                if sentences:
-                    selected_sentence = random.choice(sentences)
-                    self.current_question = {
-                        'english': selected_sentence,
-                        'source': doc.get('metadata', {}).get('source', 'Unknown'),
-                        'doc_id': doc['id']
-                    }
-                    return self.current_question
-
-        return None
-
-    def calculate_similarity(self, text1, text2):
-        text1 = text1.lower().strip()
-        text2 = text2.lower().strip()
+    return dot_product / (norm1 * norm2)
 
-        text1 = re.sub(r'[、。！？\s]+', '', text1)
-        text2 = re.sub(r'[、。！？\s]+', '', text2)
 
-        return SequenceMatcher(None, text1, text2).ratio()
+class EnglishQuizSystem:
+    def __init__(self, vector_store=None, warm_up=True):
+        # ストアとモデルは共有可能、採点履歴・出題状態はインスタンス（セッション）ごと
+        self.vector_store = vector_store if vector_store is not None else SimpleVectorStore()
+        self.embeddings = self.vector_store.encoder
+        # 回答の形態素解析結果（プロセス内で共有する上限付きLRU）
+        self.word_cache = shared_word_cache
+        self.current_question = None
+        self.score_history = []
 
-    def tokenize_japanese(self, text):
-        excluded_pos = {
-            '助詞',
-            '助動詞',
-            '記号',
-            '接続詞',
-            '接頭詞',
-            '非自立'
-        }
+        if warm_up:
+            # 出題はストアだけでできるので、採点用のモデルと形態素解析器は裏で読み込んでおく
+            self.warm_up(background=True)
 
-        excluded_words = {
-            'です', 'ます', 'である', 'だ', 'た', 'れる', 'られる',
-            'せる', 'させる', 'ない', 'ぬ', 'う', 'よう'
-        }
+    @property
+    def tokenizer(self):
+        # 形態素解析器はプロセス内で共有（セッションごとに辞書を読み込まない）
+        return get_shared_tokenizer()
 
-        words = []
-        tokens = self.tokenizer.tokenize(text)
+    @property
+    def is_ready(self):
+        """採点に必要なモデルと形態素解析器が読み込み済みか（False でも採点は可能、読み込みを待つ）"""
+        return self.embeddings.is_ready and is_tokenizer_loaded()
 
-        for token in tokens:
-            surface = token.surface
-            pos = token.part_of_speech.split(',')[0]
+    def warm_up(self, background=True):
+        if background:
+            self.embeddings.start_loading()
+            threading.Thread(target=self._load_tokenizer, name="tokenizer-warm-up", daemon=True).start()
+        else:
+            self.embeddings.load()
+            self._load_tokenizer()
 
-            is_excluded_pos = any(ex in pos for ex in excluded_pos)
-            is_excluded_word = surface in excluded_words
-            is_too_short = len(surface) <= 1
+    def _load_tokenizer(self):
+        return self.tokenizer
 
-            if not is_excluded_pos and not is_excluded_word and not is_too_short:
-                words.append(surface)
+    def extract_english_sentences(self, text, min_length=50, max_length=200):
+        return extract_english_sentences(text, min_length, max_length)
+
+    def get_random_english_question(self, where=None):
+        """ランダムに出題する。where でメタデータの条件（例: {"source": "textbook.pdf"}）を指定すると、その範囲から出題"""
+        index = self.vector_store.question_index
+        # 絞り込みは転置インデックスで行うので、該当する件数に比例した時間で済む
+        rows = self.vector_store.documents.rows_where(where) if where else None
+
+        while True:
+            # 解析済みインデックスから定数時間でランダムに選ぶ
+            choice = index.sample(rows=rows)
+            if choice is None:
+                return None
+
+            row, pair = choice
+            doc = self.vector_store.documents[row]
+
+            if pair:
+                english_line, japanese_line = pair
+                self.current_question = {
+                    'english': english_line,
+                    'japanese': japanese_line,
+                    'source': doc.get('metadata', {}).get('source', 'Unknown'),
+                    'doc_id': doc['id']
+                }
+                return self.current_question
+
+            # 抽出済みの英文を使う（同じドキュメントを出題のたびに分割し直さない）
+            sentences = index.english_sentences(row, doc['text'], self.extract_english_sentences)
+            if sentences:
+                selected_sentence = random.choice(sentences)
+                self.current_question = {
+                    'english': selected_sentence,
+                    'source': doc.get('metadata', {}).get('source', 'Unknown'),
+                    'doc_id': doc['id']
+                }
+                return self.current_question
+
+            # 英文のないドキュメントは以降の候補から外す
+            index.discard_text_row(row)
 
-        return words
+    def calculate_similarity(self, text1, text2):
+        return string_similarity.ratio(_normalize_text(text1), _normalize_text(text2))
 
-    def calculate_word_overlap(self, text1, text2):
+    def tokenize_japanese(self, text):
+        # 同じ回答（再提出・一括採点の重複など）は解析し直さない
+        words = self.word_cache.get(text)
+        get_metrics().increment('quiz_word_cache_requests_total', result='miss' if words is None else 'hit')
+        if words is None:
+            words = tuple(extract_content_words(text, self.tokenizer))
+            self.word_cache.put(text, words)
+        return list(words)
+
+    def reference_words(self, reference_translation, doc_id=None):
+        """正解の内容語。出題した対訳なら問題ごとに一度だけ解析してインデックスに保持する"""
+        if doc_id:
+            row = self.vector_store.get_row(doc_id)
+            if row is not None:
+                words = self.vector_store.question_index.reference_words(
+                    row, reference_translation, self._tokenize_uncached)
+                if words is not None:
+                    return list(words)
+        return self.tokenize_japanese(reference_translation)
+
+    def _tokenize_uncached(self, text):
+        return extract_content_words(text, self.tokenizer)
+
+    def calculate_word_overlap(self, text1, text2, words2=None):
         words1 = self.tokenize_japanese(text1)
-        words2 = self.tokenize_japanese(text2)
+        if words2 is None:
+            words2 = self.tokenize_japanese(text2)
 
         counter1 = Counter(words1)
         counter2 = Counter(words2)
@@ -137,23 +161,22 @@ class EnglishQuizSystem:
 
         return (overlap / total_count) if total_count > 0 else 0, words1, words2, common
 
-    def calculate_vector_similarity(self, text1, text2):
+    def calculate_vector_similarity(self, text1, text2, reference_embedding=None):
+        # 正解側は取り込み時に計算済みの埋め込みがあればそれを使う（なければキャッシュ付きでエンコード）
         vec1 = self.embeddings.encode_single(text1)
-        vec2 = self.embeddings.encode_single(text2)
-
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-
-        if norm1 == 0 or norm2 == 0:
-            return 0
+        if reference_embedding is not None:
+            vec2 = reference_embedding
+        else:
+            vec2 = self.embeddings.encode_single(text2)
 
-        return dot_product / (norm1 * norm2)
+        return _cosine_similarity(vec1, vec2)
 
     def score_translation(self, user_translation, current_question=None, debug=False):
+        with get_metrics().timer('quiz_score_seconds', mode='single'):
+            return self._score_single(user_translation, current_question)
+
+    def _score_single(self, user_translation, current_question):
+        metrics = get_metrics()
         scoring_details = {
             'steps': [],
             'normalized_user': '',
@@ -173,64 +196,168 @@ class EnglishQuizSystem:
         reference_translation = None
         best_score = 0
 
-        scoring_details['steps'].append('📝 ステップ1: 正解の和訳を取得')
-
         if current_question and 'japanese' in current_question:
             reference_translation = current_question['japanese']
-            scoring_details['steps'].append(f'✅ 正解: {reference_translation}')
-
-            scoring_details['steps'].append('\n🔤 ステップ2: 形態素解析（単語分割・助詞除外）')
-
-            word_overlap, user_words, ref_words, common_words = self.calculate_word_overlap(
-                user_translation, reference_translation
-            )
 
-            scoring_details['user_words'] = user_words
-            scoring_details['ref_words'] = ref_words
-            scoring_details['common_words'] = list(common_words.elements())
-            scoring_details['word_overlap'] = word_overlap
+            with metrics.timer('quiz_stage_seconds', stage='reference'):
+                reference_embedding = None
+                if current_question.get('doc_id'):
+                    reference_embedding = self.vector_store.get_reference_embedding(current_question['doc_id'],
+                                                                                    reference_translation)
+                ref_words = self.reference_words(reference_translation, current_question.get('doc_id'))
 
-            scoring_details['steps'].append('※ 助詞（は、が、を、に等）は除外して評価')
-            scoring_details['steps'].append(f'あなたの内容語数: {len(user_words)}個')
-            scoring_details['steps'].append(f'正解の内容語数: {len(ref_words)}個')
-            scoring_details['steps'].append(f'一致した単語数: {len(scoring_details["common_words"])}個')
-            scoring_details['steps'].append(f'単語一致率: {word_overlap:.4f} ({word_overlap*100:.2f}%)')
+            with metrics.timer('quiz_stage_seconds', stage='vector'):
+                vector_sim = self.calculate_vector_similarity(user_translation, reference_translation,
+                                                              reference_embedding)
 
-            if scoring_details['common_words']:
-                words_preview = '、'.join(scoring_details['common_words'][:15])
-                if len(scoring_details['common_words']) > 15:
-                    words_preview += f'... (他{len(scoring_details["common_words"])-15}個)'
-                scoring_details['steps'].append(f'一致した単語: {words_preview}')
+            scoring_details.update(self._score_components(user_translation, reference_translation, vector_sim,
+                                                          ref_words=ref_words))
+            with metrics.timer('quiz_stage_seconds', stage='steps'):
+                scoring_details['steps'] = self._reference_steps(scoring_details, reference_translation)
+            best_score = scoring_details['raw_similarity']
 
-            scoring_details['steps'].append('\n🧮 ステップ3: ベクトル類似度計算（RAG方式）')
-
-            vector_sim = self.calculate_vector_similarity(user_translation, reference_translation)
-            scoring_details['vector_similarity'] = vector_sim
+        else:
+            scoring_details['steps'].append('📝 ステップ1: 正解の和訳を取得')
+            scoring_details['steps'].append('⚠️ 正解データが見つかりません（検索中...）')
+            english_text = current_question.get('english', '') if current_question else ''
+            with metrics.timer('quiz_stage_seconds', stage='lookup'):
+                best_score, reference_translation = self._score_by_lookup(user_translation, english_text)
 
-            scoring_details['steps'].append(f'ベクトル類似度（コサイン類似度）: {vector_sim:.4f} ({vector_sim*100:.2f}%)')
-            scoring_details['steps'].append('※ 文章全体の意味的な近さを測定')
+        with metrics.timer('quiz_stage_seconds', stage='grade'):
+            result = self._make_result(best_score, current_question, reference_translation, scoring_details)
+        self.score_history.append(result)
 
-            scoring_details['steps'].append('\n📊 ステップ4: 文字列類似度計算')
+        return result
 
-            user_normalized = re.sub(r'[、。！？\s]+', '', user_translation.lower().strip())
-            ref_normalized = re.sub(r'[、。！？\s]+', '', reference_translation.lower().strip())
+    def score_batch(self, items, with_steps=False, batch_size=64, record_history=False):
+        """
+        複数の回答をまとめて採点し、入力順に結果を yield する
+        items: {'answer': 和訳, 'english': 英文, 'japanese': 正解(任意), 'doc_id': (任意)} の iterable
+        埋め込みは batch_size 件ずつまとめて計算し、採点過程の文章（steps）は with_steps=True の時だけ作る
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= batch_size:
+                yield from self._score_chunk(chunk, with_steps, record_history)
+                chunk = []
+        if chunk:
+            yield from self._score_chunk(chunk, with_steps, record_history)
+
+    def _score_chunk(self, items, with_steps, record_history):
+        metrics = get_metrics()
+        metrics.observe('quiz_batch_size', len(items))
+        answers = [item.get('answer', '') for item in items]
+
+        # 正解がある回答だけベクトル類似度を計算する（回答・正解それぞれ1回のバッチエンコード）
+        targets = [i for i, item in enumerate(items) if answers[i].strip() and item.get('japanese')]
+        vector_sims = {}
+        if targets:
+            with metrics.timer('quiz_batch_stage_seconds', stage='vector'):
+                answer_vectors = self.embeddings.encode([answers[i] for i in targets])
+                reference_vectors = np.zeros_like(answer_vectors)
+                missing = []
+                for j, i in enumerate(targets):
+                    # 回答ごとの正解（japanese）が取り込み時の和訳と違う場合はエンコードし直す
+                    stored = None
+                    if items[i].get('doc_id'):
+                        stored = self.vector_store.get_reference_embedding(items[i]['doc_id'], items[i]['japanese'])
+                    if stored is not None:
+                        reference_vectors[j] = stored
+                    else:
+                        missing.append(j)
+                if missing:
+                    reference_vectors[missing] = self.embeddings.encode([items[targets[j]]['japanese'] for j in missing])
+
+                for j, i in enumerate(targets):
+                    vector_sims[i] = _cosine_similarity(answer_vectors[j], reference_vectors[j])
+
+        # 差分表示が不要なら、文字列類似度もチャンク単位でまとめて計算する
+        string_sims = {}
+        if targets and not with_steps:
+            with metrics.timer('quiz_batch_stage_seconds', stage='string'):
+                ratios = string_similarity.batch_ratios([_normalize_text(answers[i]) for i in targets],
+                                                        [_normalize_text(items[i]['japanese']) for i in targets])
+            string_sims = dict(zip(targets, ratios.tolist()))
+
+        for i, item in enumerate(items):
+            answer = answers[i]
+            if not answer.strip():
+                yield {
+                    'score': 0,
+                    'feedback': '回答が入力されていません。',
+                    'grade': 'F',
+                    'english': item.get('english', ''),
+                    'reference_translation': None,
+                    'scoring_details': {'steps': [], 'raw_similarity': 0.0}
+                }
+                continue
 
-            scoring_details['normalized_user'] = user_normalized
-            scoring_details['normalized_reference'] = ref_normalized
+            scoring_details = {'steps': [], 'raw_similarity': 0.0}
+            if i in vector_sims:
+                reference_translation = item['japanese']
+                # 正解の内容語は問題ごと（なければLRU）に一度だけ解析したものを使い回す
+                with metrics.timer('quiz_stage_seconds', stage='reference'):
+                    ref_words = self.reference_words(reference_translation, item.get('doc_id'))
+                scoring_details.update(self._score_components(answer, reference_translation, vector_sims[i],
+                                                              with_diff=with_steps, ref_words=ref_words,
+                                                              string_sim=string_sims.get(i)))
+                if with_steps:
+                    with metrics.timer('quiz_stage_seconds', stage='steps'):
+                        scoring_details['steps'] = self._reference_steps(scoring_details, reference_translation)
+                best_score = scoring_details['raw_similarity']
+            else:
+                if with_steps:
+                    scoring_details['steps'].append('📝 ステップ1: 正解の和訳を取得')
+                    scoring_details['steps'].append('⚠️ 正解データが見つかりません（検索中...）')
+                with metrics.timer('quiz_stage_seconds', stage='lookup'):
+                    best_score, reference_translation = self._score_by_lookup(answer, item.get('english', ''))
+
+            with metrics.timer('quiz_stage_seconds', stage='grade'):
+                result = self._make_result(best_score, item, reference_translation, scoring_details,
+                                           with_steps=with_steps)
+            if record_history:
+                self.score_history.append(result)
+            yield result
+
+    def _score_components(self, user_translation, reference_translation, vector_sim, with_diff=True,
+                          ref_words=None, string_sim=None):
+        metrics = get_metrics()
+        with metrics.timer('quiz_stage_seconds', stage='word_overlap'):
+            word_overlap, user_words, ref_words, common_words = self.calculate_word_overlap(
+                user_translation, reference_translation, ref_words
+            )
 
-            matcher = SequenceMatcher(None, user_normalized, ref_normalized)
-            string_sim = matcher.ratio()
-            scoring_details['string_similarity'] = string_sim
+        with metrics.timer('quiz_stage_seconds', stage='string'):
+            user_normalized = _normalize_text(user_translation)
+            ref_normalized = _normalize_text(reference_translation)
+
+            if with_diff:
+                # 類似度と差分区間を1回の計算で求める
+                comparison = string_similarity.compare(user_normalized, ref_normalized)
+                string_sim = comparison.ratio
+            elif string_sim is None:
+                string_sim = string_similarity.ratio(user_normalized, ref_normalized)
+
+        components = {
+            'user_words': user_words,
+            'ref_words': ref_words,
+            'common_words': list(common_words.elements()),
+            'word_overlap': word_overlap,
+            'vector_similarity': vector_sim,
+            'normalized_user': user_normalized,
+            'normalized_reference': ref_normalized,
+            'string_similarity': string_sim
+        }
 
-            total_len = len(ref_normalized)
+        if with_diff:
+            # 差分表示用の区間（一括採点では必要な時だけ計算する）
             matched_len = 0
-            common_parts = []
             diff_parts = []
 
-            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            for tag, i1, i2, j1, j2 in comparison.opcodes:
                 if tag == 'equal':
                     part = user_normalized[i1:i2]
-                    common_parts.append(part)
                     matched_len += len(part)
                     diff_parts.append(('match', part, part))
                 elif tag == 'replace':
@@ -240,117 +367,107 @@ class EnglishQuizSystem:
                 elif tag == 'insert':
                     diff_parts.append(('insert', '', ref_normalized[j1:j2]))
 
-            scoring_details['diff_parts'] = diff_parts
-            scoring_details['matched_length'] = matched_len
-            scoring_details['total_length'] = total_len
-
-            scoring_details['steps'].append(f'文字列類似度: {string_sim:.4f} ({string_sim*100:.2f}%)')
-
-            scoring_details['steps'].append('\n🎯 ステップ5: 総合スコア計算')
-
-            weight_vector = 0.40
-            weight_word = 0.40
-            weight_string = 0.20
-
-            best_score = (
-                vector_sim * weight_vector +
-                word_overlap * weight_word +
-                string_sim * weight_string
-            )
-
-            scoring_details['raw_similarity'] = best_score
-            scoring_details['weights'] = {
-                'vector': weight_vector,
-                'word': weight_word,
-                'string': weight_string
-            }
-
-            scoring_details['steps'].append(f'計算式: (ベクトル類似度 × {weight_vector}) + (単語一致率 × {weight_word}) + (文字列類似度 × {weight_string})')
-            scoring_details['steps'].append(f'= ({vector_sim:.3f} × {weight_vector}) + ({word_overlap:.3f} × {weight_word}) + ({string_sim:.3f} × {weight_string})')
-            scoring_details['steps'].append(f'= {vector_sim*weight_vector:.3f} + {word_overlap*weight_word:.3f} + {string_sim*weight_string:.3f}')
-            scoring_details['steps'].append(f'= {best_score:.4f}')
-
-        else:
-            scoring_details['steps'].append('⚠️ 正解データが見つかりません（検索中...）')
-            english_text = current_question.get('english', '') if current_question else ''
-            all_docs = self.vector_store.get_all_documents()
-
-            for doc in all_docs:
-                doc_text = doc['text']
-
-                if 'EN:' in doc_text and 'JP:' in doc_text:
-                    lines = doc_text.split('\n')
-                    english_line = None
-                    japanese_line = None
-
-                    for line in lines:
-                        if line.startswith('EN:'):
-                            english_line = line.replace('EN:', '').strip()
-                        elif line.startswith('JP:'):
-                            japanese_line = line.replace('JP:', '').strip()
+            components['diff_parts'] = diff_parts
+            components['matched_length'] = matched_len
+            components['total_length'] = len(ref_normalized)
+
+        components['raw_similarity'] = (
+            vector_sim * SCORE_WEIGHTS['vector'] +
+            word_overlap * SCORE_WEIGHTS['word'] +
+            string_sim * SCORE_WEIGHTS['string']
+        )
+        components['weights'] = dict(SCORE_WEIGHTS)
+
+        return components
+
+    def _reference_steps(self, details, reference_translation):
+        word_overlap = details['word_overlap']
+        vector_sim = details['vector_similarity']
+        string_sim = details['string_similarity']
+        common_words = details['common_words']
+        weight_vector = details['weights']['vector']
+        weight_word = details['weights']['word']
+        weight_string = details['weights']['string']
+
+        steps = ['📝 ステップ1: 正解の和訳を取得', f'✅ 正解: {reference_translation}']
+
+        steps.append('\n🔤 ステップ2: 形態素解析（単語分割・助詞除外）')
+        steps.append('※ 助詞（は、が、を、に等）は除外して評価')
+        steps.append(f'あなたの内容語数: {len(details["user_words"])}個')
+        steps.append(f'正解の内容語数: {len(details["ref_words"])}個')
+        steps.append(f'一致した単語数: {len(common_words)}個')
+        steps.append(f'単語一致率: {word_overlap:.4f} ({word_overlap*100:.2f}%)')
+
+        if common_words:
+            words_preview = '、'.join(common_words[:15])
+            if len(common_words) > 15:
+                words_preview += f'... (他{len(common_words)-15}個)'
+            steps.append(f'一致した単語: {words_preview}')
+
+        steps.append('\n🧮 ステップ3: ベクトル類似度計算（RAG方式）')
+        steps.append(f'ベクトル類似度（コサイン類似度）: {vector_sim:.4f} ({vector_sim*100:.2f}%)')
+        steps.append('※ 文章全体の意味的な近さを測定')
+
+        steps.append('\n📊 ステップ4: 文字列類似度計算')
+        steps.append(f'文字列類似度: {string_sim:.4f} ({string_sim*100:.2f}%)')
+
+        steps.append('\n🎯 ステップ5: 総合スコア計算')
+        steps.append(f'計算式: (ベクトル類似度 × {weight_vector}) + (単語一致率 × {weight_word}) + (文字列類似度 × {weight_string})')
+        steps.append(f'= ({vector_sim:.3f} × {weight_vector}) + ({word_overlap:.3f} × {weight_word}) + ({string_sim:.3f} × {weight_string})')
+        steps.append(f'= {vector_sim*weight_vector:.3f} + {word_overlap*weight_word:.3f} + {string_sim*weight_string:.3f}')
+        steps.append(f'= {details["raw_similarity"]:.4f}')
+
+        return steps
+
+    def _score_by_lookup(self, user_translation, english_text):
+        best_score = 0
+        reference_translation = None
 
-                    if english_line and japanese_line:
-                        en_normalized = english_line.strip().lower()
-                        query_normalized = english_text.strip().lower()
+        # 英文 -> 和訳 のハッシュマップで一致する対訳だけを調べる
+        scanned = 0
+        for english_line, japanese_line, _ in self.vector_store.question_index.lookup(english_text):
+            scanned += 1
+            similarity = self.calculate_similarity(user_translation, japanese_line)
 
-                        if en_normalized == query_normalized:
-                            similarity = self.calculate_similarity(user_translation, japanese_line)
+            if similarity > best_score:
+                best_score = similarity
+                reference_translation = japanese_line
 
-                            if similarity > best_score:
-                                best_score = similarity
-                                reference_translation = japanese_line
+        get_metrics().observe('quiz_lookup_pairs_scanned', scanned)
+        return best_score, reference_translation
 
+    def _make_result(self, best_score, question, reference_translation, scoring_details, with_steps=True):
         score = int(best_score * 100)
-        scoring_details['steps'].append(f'\n🎯 最終スコア: {score}点')
+        if with_steps:
+            scoring_details['steps'].append(f'\n🎯 最終スコア: {score}点')
 
-        if score >= 90:
-            grade = 'S'
-            feedback = '素晴らしい！ほぼ完璧な翻訳です。'
-        elif score >= 80:
-            grade = 'A'
-            feedback = '非常に良い翻訳です！'
-        elif score >= 70:
-            grade = 'B'
-            feedback = '良い翻訳です。いくつか改善点があります。'
-        elif score >= 60:
-            grade = 'C'
-            feedback = 'まずまずです。もう少し正確に翻訳しましょう。'
-        elif score >= 40:
-            grade = 'D'
-            feedback = '意味は伝わっていますが、改善が必要です。'
-        else:
-            grade = 'F'
-            feedback = '翻訳の精度が低いです。再度チャレンジしましょう。'
+        grade, feedback = self._grade(score)
 
-        result = {
+        return {
             'score': score,
             'grade': grade,
             'feedback': feedback,
-            'english': current_question.get('english', '') if current_question else '',
+            'english': question.get('english', '') if question else '',
             'reference_translation': reference_translation,
             'scoring_details': scoring_details
         }
 
-        self.score_history.append(result)
-
-        return result
+    def _grade(self, score):
+        if score >= 90:
+            return 'S', '素晴らしい！ほぼ完璧な翻訳です。'
+        elif score >= 80:
+            return 'A', '非常に良い翻訳です！'
+        elif score >= 70:
+            return 'B', '良い翻訳です。いくつか改善点があります。'
+        elif score >= 60:
+            return 'C', 'まずまずです。もう少し正確に翻訳しましょう。'
+        elif score >= 40:
+            return 'D', '意味は伝わっていますが、改善が必要です。'
+        else:
+            return 'F', '翻訳の精度が低いです。再度チャレンジしましょう。'
 
     def extract_japanese_sentences(self, text):
-        sentences = re.split(r'[。！？\n]', text)
-
-        japanese_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-
-            if len(sentence) < 10:
-                continue
-
-            japanese_chars = sum(1 for c in sentence if '\u3040' <= c <= '\u309F' or '\u30A0' <= c <= '\u30FF' or '\u4E00' <= c <= '\u9FFF')
-
-            if japanese_chars / len(sentence) > 0.3:
-                japanese_sentences.append(sentence)
-
-        return japanese_sentences
+        return extract_japanese_sentences(text)
 
     def get_statistics(self):
         if not self.score_history:
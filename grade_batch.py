@@ -0,0 +1,134 @@
+"""
+JSONL の回答をまとめて採点するコマンド（試験セッションの一括再採点用）
+
+入力（1行1件）:
+    {"id": "...", "english": "英文", "japanese": "正解の和訳(任意)", "doc_id": "(任意)", "answer": "回答"}
+出力（1行1件、入力順）:
+    {"id": "...", "score": 85, "grade": "A", "vector_similarity": 0.91, ...}
+
+使い方:
+    python grade_batch.py answers.jsonl -o results.jsonl
+    cat answers.jsonl | python grade_batch.py - --steps > results.jsonl
+    python grade_batch.py answers.jsonl -o results.jsonl --workers 8 --torch-threads 1
+    python grade_batch.py answers.jsonl -o results.jsonl --metrics metrics.prom   # 段階ごとの所要時間
+"""
+import sys
+import json
+import time
+import argparse
+from collections import deque
+
+from english_quiz_system import EnglishQuizSystem
+from grading_pool import GradingPool
+from metrics import InMemoryMetrics, set_metrics
+from simple_vector_store import SimpleVectorStore
+
+COMPONENT_KEYS = ('vector_similarity', 'word_overlap', 'string_similarity', 'raw_similarity')
+
+
+def read_items(stream):
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ {line_number}行目を読み込めませんでした: {e}", file=sys.stderr)
+
+
+def to_record(item, result, with_steps):
+    details = result['scoring_details']
+    record = {
+        'id': item.get('id'),
+        'score': result['score'],
+        'grade': result['grade'],
+        'feedback': result['feedback'],
+        'english': result['english'],
+        'reference_translation': result['reference_translation']
+    }
+    for key in COMPONENT_KEYS:
+        if key in details:
+            record[key] = float(details[key])
+    if with_steps:
+        record['steps'] = details['steps']
+    return record
+
+
+def grade_stream(scorer, items, output, with_steps=False, batch_size=64, report_every=1000):
+    """
+    items を採点して output に1行ずつ書き出し、(件数, 経過秒) を返す
+    scorer は EnglishQuizSystem または GradingPool（どちらも score_batch を持つ）
+    """
+    # score_batch は入力順に yield するので、採点待ちの行（id）を順に保持しておく
+    pending = deque()
+
+    def track(stream):
+        for item in stream:
+            pending.append(item)
+            yield item
+
+    start = time.perf_counter()
+    count = 0
+    for result in scorer.score_batch(track(items), with_steps=with_steps, batch_size=batch_size):
+        item = pending.popleft()
+        output.write(json.dumps(to_record(item, result, with_steps), ensure_ascii=False) + "\n")
+        count += 1
+
+        if report_every and count % report_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  {count}件 ({count / elapsed:.1f}件/秒)", file=sys.stderr)
+
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONL の和訳回答を一括採点する")
+    parser.add_argument("input", help="入力 JSONL（- で標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="出力 JSONL（既定: 標準出力）")
+    parser.add_argument("--steps", action="store_true", help="採点過程の説明（steps）も出力する")
+    parser.add_argument("--batch-size", type=int, default=64, help="まとめてエンコードする件数")
+    parser.add_argument("--workers", type=int, default=1, help="採点プロセス数（2以上で並列採点）")
+    parser.add_argument("--torch-threads", type=int, default=1, help="ワーカーあたりの torch 演算スレッド数")
+    parser.add_argument("--store", default="quiz_vector_store", help="ベクトルストアの保存先")
+    parser.add_argument("--report-every", type=int, default=1000, help="進捗を表示する間隔（件）")
+    parser.add_argument("--metrics", help="段階ごとの計測値の出力先（.json なら JSON、それ以外は Prometheus のテキスト形式）")
+    args = parser.parse_args()
+
+    sink = None
+    if args.metrics:
+        if args.workers > 1:
+            # 計測値はプロセスごとに集計されるので、ワーカーの値は集められない
+            parser.error("--metrics は --workers 1 の時だけ使えます")
+        sink = InMemoryMetrics()
+        set_metrics(sink)
+
+    if args.workers > 1:
+        scorer = GradingPool(workers=args.workers, storage_path=args.store, torch_threads=args.torch_threads)
+    else:
+        scorer = EnglishQuizSystem(vector_store=SimpleVectorStore(args.store))
+
+    source = sys.stdin if args.input == "-" else open(args.input, 'r', encoding='utf-8')
+    output = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    try:
+        count, elapsed = grade_stream(scorer, read_items(source), output, with_steps=args.steps,
+                                      batch_size=args.batch_size, report_every=args.report_every)
+    finally:
+        if isinstance(scorer, GradingPool):
+            scorer.close()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"✅ {count}件を採点しました ({elapsed:.2f}秒, {rate:.1f}件/秒)", file=sys.stderr)
+
+    if sink is not None:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(sink.to_json() if args.metrics.endswith('.json') else sink.to_prometheus())
+        print(f"📊 計測値を保存しました: {args.metrics}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
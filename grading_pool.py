@@ -0,0 +1,89 @@
+"""
+複数プロセスで採点するパイプライン（大量の回答の一括再採点用）
+
+形態素解析（Janome）・文字列類似度・モデルの順伝播はいずれもCPUを使い切るため、
+回答をチャンクに分けてワーカープロセスに配る。各ワーカーは起動時に一度だけ
+ベクトルストア・モデル・Janome の Tokenizer を読み込み、以降のチャンクで使い回す。
+入力は処理中のチャンク数が上限に達するまで読み進めないので、巨大な入力でもメモリは増えない。
+"""
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_CHUNK_SIZE = 64
+
+# ワーカープロセス内で使い回す採点システム（_init_worker で生成）
+_worker_quiz = None
+
+
+def _init_worker(storage_path: str, torch_threads: int):
+    global _worker_quiz
+    import torch
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    # ワーカー数 × スレッド数がコア数を超えないよう、プロセスごとの演算スレッド数を絞る
+    torch.set_num_threads(torch_threads)
+    _worker_quiz = EnglishQuizSystem(vector_store=SimpleVectorStore(storage_path), warm_up=False)
+    _worker_quiz.warm_up(background=False)
+
+
+def _score_chunk(items: List[Dict], with_steps: bool) -> List[Dict]:
+    return list(_worker_quiz.score_batch(items, with_steps=with_steps, batch_size=len(items)))
+
+
+class GradingPool:
+    """
+    EnglishQuizSystem.score_batch と同じ呼び出し方で、採点を複数プロセスに分散する
+
+    with GradingPool(workers=4) as pool:
+        for result in pool.score_batch(items):
+            ...
+    """
+
+    def __init__(self, workers: Optional[int] = None, storage_path: str = "quiz_vector_store",
+                 torch_threads: int = 1, max_pending: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.storage_path = storage_path
+        self.torch_threads = torch_threads
+        # 同時に処理中・待機中にしておくチャンク数の上限（入力側のバックプレッシャー）
+        self.max_pending = max_pending or self.workers * 2
+        # fork 後の torch（OpenMP）はデッドロックしうるので、どのOSでも spawn で起動する
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(storage_path, torch_threads)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def score_batch(self, items: Iterable[Dict], with_steps: bool = False,
+                    batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+        """items を batch_size 件ずつワーカーに送り、結果を入力順に yield する"""
+        pending = deque()
+        chunk = []
+
+        for item in items:
+            chunk.append(item)
+            if len(chunk) < batch_size:
+                continue
+            pending.append(self._executor.submit(_score_chunk, chunk, with_steps))
+            chunk = []
+            # 上限に達したら、先頭のチャンクが終わるまで入力を読み進めない
+            while len(pending) >= self.max_pending:
+                yield from pending.popleft().result()
+
+        if chunk:
+            pending.append(self._executor.submit(_score_chunk, chunk, with_steps))
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,286 @@
+"""
+テキスト・PDF のストリーミング取り込み
+
+巨大なファイルでも一定のメモリで取り込めるよう、次を順に流しながら処理する。
+  1. 読み込み: ファイルを段落（空行区切り）ごとに読む（PDF はページごとにテキストを取り出す）
+  2. 対訳の検出: 「EN: 英文」の次の行が「JP: 和訳」の2行、または「英文<タブ>和訳」の1行だけを対訳にする。
+     印のない段落は英文と和文の数が同じでも組にせず（対応が確かでないため）、英文を含む段落を
+     chunk_chars 文字ずつのテキストのドキュメントにする（出題時に英文を抽出する）
+  3. 登録: commit_size 件ごとに add_documents（1回のバッチエンコードと1つのセグメントの書き込み）。
+     同じ出典に登録済みのドキュメントはストアが除き、別の出典の同じ本文・ほぼ同じ本文は埋め込みを使い回す（dedup.py）
+読み込みと登録の間に保持するのは commit_size 件までなので、入力の大きさによらずメモリは増えない
+（ストア自体が持つ本文・埋め込みの分は除く）。
+
+使い方:
+    python ingest.py corpus.txt textbook.pdf --store quiz_vector_store --commit-size 5000
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_COMMIT_SIZE = 5000
+DEFAULT_CHUNK_CHARS = 1000
+# 空行のない長いテキストでも段落がこれより大きくならないよう区切る
+MAX_PARAGRAPH_CHARS = 100000
+# 進捗を表示する間隔（秒）
+PROGRESS_INTERVAL = 5.0
+
+_ENGLISH_SENTENCE_END = re.compile(r'[.!?]\s+')
+_JAPANESE_SENTENCE_END = re.compile(r'[。！？\n]')
+# ひらがな・カタカナ・漢字以外（取り除いた残りの長さが日本語の文字数）
+_NON_JAPANESE_CHARS = re.compile('[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+')
+
+
+def extract_english_sentences(text: str, min_length: int = 50, max_length: int = 200) -> List[str]:
+    english_sentences = []
+    for sentence in _ENGLISH_SENTENCE_END.split(text):
+        sentence = sentence.strip()
+
+        if len(sentence) < min_length or len(sentence) > max_length:
+            continue
+
+        # ASCII の文字数（1文字ずつ数えずに、ASCII 以外を落としたバイト数で数える）
+        ascii_chars = len(sentence.encode('ascii', 'ignore'))
+        if ascii_chars / len(sentence) > 0.7:
+            english_sentences.append(sentence)
+
+    return english_sentences
+
+
+def extract_japanese_sentences(text: str) -> List[str]:
+    japanese_sentences = []
+    for sentence in _JAPANESE_SENTENCE_END.split(text):
+        sentence = sentence.strip()
+
+        if len(sentence) < 10:
+            continue
+
+        japanese_chars = len(_NON_JAPANESE_CHARS.sub('', sentence))
+        if japanese_chars / len(sentence) > 0.3:
+            japanese_sentences.append(sentence)
+
+    return japanese_sentences
+
+
+class IngestProgress:
+    """読み込んだバイト数・ドキュメント数と、登録・重複として除いた件数、その速度の表示"""
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.bytes_read = 0
+        self.documents_read = 0
+        self.pairs_read = 0
+        self.added = 0
+        self.skipped = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def add_bytes(self, count: int):
+        self.bytes_read += count
+
+    def committed(self, documents: int, pairs: int, added: int):
+        """documents 件（うち対訳 pairs 件）を登録に渡し、added 件が追加された（残りは重複として除かれた）"""
+        self.documents_read += documents
+        self.pairs_read += pairs
+        self.added += added
+        self.skipped += documents - added
+        if self.interval and time.perf_counter() - self._last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        self._last_report = time.perf_counter()
+        print(f"  {self.summary()}", file=self.stream)
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        # 対訳の件数は読み込んだ分（重複として除かれた対訳も含む）
+        return (f"読み込み {self.documents_read}件（対訳 {self.pairs_read}件）, 登録 {self.added}件, "
+                f"重複 {self.skipped}件, {self.bytes_read / 1e6:.1f}MB, "
+                f"{self.documents_read / elapsed:.1f}件/秒, {self.bytes_read / 1e6 / elapsed:.2f}MB/秒")
+
+
+def _paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    paragraph: List[str] = []
+    size = 0
+    for line in lines:
+        if not line.strip():
+            if paragraph:
+                yield '\n'.join(paragraph)
+                paragraph, size = [], 0
+            continue
+        paragraph.append(line)
+        size += len(line)
+        # 対訳の EN: 行の直後では区切らない
+        if size >= MAX_PARAGRAPH_CHARS and not line.lstrip().startswith('EN:'):
+            yield '\n'.join(paragraph)
+            paragraph, size = [], 0
+    if paragraph:
+        yield '\n'.join(paragraph)
+
+
+def read_text_paragraphs(path: str, progress: Optional[IngestProgress] = None) -> Iterator[str]:
+    """UTF-8 のテキストファイルを1行ずつ読み、段落ごとに返す"""
+    def lines():
+        with open(path, 'rb') as f:
+            for i, raw in enumerate(f):
+                if progress is not None:
+                    progress.add_bytes(len(raw))
+                if i == 0 and raw.startswith(b'\xef\xbb\xbf'):
+                    raw = raw[3:]
+                yield raw.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    return _paragraphs(lines())
+
+
+def read_pdf_paragraphs(path: str, progress: Optional[IngestProgress] = None) -> Iterator[str]:
+    """PDF をページごとに読み、テキストを段落ごとに返す"""
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("PDF の取り込みには pypdf が必要です (pip install pypdf)") from e
+
+    def lines():
+        # ページは参照した時に解析されるので、全ページのテキストを同時には持たない
+        for page in PdfReader(path).pages:
+            text = page.extract_text() or ''
+            if progress is not None:
+                progress.add_bytes(len(text.encode('utf-8')))
+            yield from text.split('\n')
+            # ページの境目は段落の区切りとして扱う
+            yield ''
+
+    return _paragraphs(lines())
+
+
+def read_paragraphs(path: str, progress: Optional[IngestProgress] = None) -> Iterator[str]:
+    if path.lower().endswith('.pdf'):
+        return read_pdf_paragraphs(path, progress)
+    return read_text_paragraphs(path, progress)
+
+
+def _pair_text(english: str, japanese: str) -> str:
+    return f"EN: {english}\nJP: {japanese}"
+
+
+def _tab_pair(line: str) -> Optional[Tuple[str, str]]:
+    """「英文<タブ>和訳」の行なら (英文, 和訳)"""
+    parts = [part.strip() for part in line.split('\t')]
+    if len(parts) != 2 or not parts[0] or not parts[1]:
+        return None
+    english, japanese = parts
+    if len(english.encode('ascii', 'ignore')) / len(english) <= 0.7:
+        return None
+    if len(_NON_JAPANESE_CHARS.sub('', japanese)) / len(japanese) <= 0.3:
+        return None
+    return english, japanese
+
+
+def split_documents(paragraphs: Iterable[str], chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Iterator[Tuple[str, bool]]:
+    """段落から (ドキュメントの本文, 対訳か) を順に返す"""
+    chunk: List[str] = []
+    chunk_size = 0
+
+    for paragraph in paragraphs:
+        lines = paragraph.split('\n')
+        rest = []
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            if line.startswith('EN:') and i + 1 < len(lines) and lines[i + 1].strip().startswith('JP:'):
+                english = line[len('EN:'):].strip()
+                japanese = lines[i + 1].strip()[len('JP:'):].strip()
+                if english and japanese:
+                    yield _pair_text(english, japanese), True
+                    i += 2
+                    continue
+            pair = _tab_pair(lines[i])
+            if pair:
+                yield _pair_text(*pair), True
+                i += 1
+                continue
+            rest.append(lines[i])
+            i += 1
+
+        text = '\n'.join(rest).strip()
+        if not text:
+            continue
+
+        if not extract_english_sentences(text):
+            continue
+
+        # 印のない英文は（和文と数が同じでも組にせず）出題時に文を抽出するテキストとしてまとめる
+        chunk.append(text)
+        chunk_size += len(text)
+        if chunk_size >= chunk_chars:
+            yield '\n\n'.join(chunk), False
+            chunk, chunk_size = [], 0
+
+    if chunk:
+        yield '\n\n'.join(chunk), False
+
+
+def iter_documents(path: str, progress: Optional[IngestProgress] = None,
+                   chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Iterator[Tuple[Dict, bool]]:
+    """ファイルから add_documents 形式のドキュメントを順に返す（(ドキュメント, 対訳か)）"""
+    # 同じ名前の別のファイルと id が重ならないよう、パスのハッシュを付ける
+    prefix = f"{os.path.basename(path)}_{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+    for index, (text, is_pair) in enumerate(split_documents(read_paragraphs(path, progress), chunk_chars)):
+        yield {
+            "id": f"{prefix}_{index}",
+            "text": text,
+            "metadata": {"source": path, "chunk_index": index}
+        }, is_pair
+
+
+def ingest_file(vector_store, path: str, commit_size: int = DEFAULT_COMMIT_SIZE,
+                batch_size: Optional[int] = None, chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                progress: Optional[IngestProgress] = None) -> int:
+    """ファイルを commit_size 件ずつストアに登録し、登録した件数（重複として除いた分は含まない）を返す"""
+    progress = progress or IngestProgress()
+    batch: List[Dict] = []
+    pairs = 0
+    total = 0
+
+    def commit() -> int:
+        added = vector_store.add_documents(batch, batch_size=batch_size)
+        progress.committed(len(batch), pairs, added)
+        return added
+
+    for document, is_pair in iter_documents(path, progress, chunk_chars):
+        batch.append(document)
+        pairs += is_pair
+        if len(batch) >= commit_size:
+            total += commit()
+            batch, pairs = [], 0
+    if batch:
+        total += commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="テキスト・PDF をベクトルストアに取り込む")
+    parser.add_argument("paths", nargs="+", help="取り込むファイル（.txt など UTF-8 のテキスト、または .pdf）")
+    parser.add_argument("--store", default="quiz_vector_store", help="ベクトルストアの保存先")
+    parser.add_argument("--commit-size", type=int, default=DEFAULT_COMMIT_SIZE, help="1回の登録（セグメント）の件数")
+    parser.add_argument("--batch-size", type=int, default=None, help="まとめてエンコードする件数")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS, help="対訳でないテキストのドキュメントの文字数")
+    args = parser.parse_args()
+
+    from simple_vector_store import SimpleVectorStore
+
+    store = SimpleVectorStore(args.store)
+    progress = IngestProgress()
+    for path in args.paths:
+        count = ingest_file(store, path, commit_size=args.commit_size, batch_size=args.batch_size,
+                            chunk_chars=args.chunk_chars, progress=progress)
+        print(f"📄 {path}: {count}件", file=sys.stderr)
+    print(f"✅ 取り込み完了: {progress.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
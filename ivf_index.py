@@ -0,0 +1,163 @@
+"""
+NumPy のみで実装した転置ファイル（IVF）近似最近傍インデックス
+
+正規化済みベクトルを球面k-meansでクラスタに分け、検索時は
+クエリに近い n_probe 個のクラスタの中だけを厳密に比較する
+（n_probe を大きくすると再現率が上がり、レイテンシも増える）
+"""
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+
+from array_buffer import append_rows, append_records, read_records, write_records
+
+ASSIGN_CHUNK_SIZE = 65536
+# クラスタごとの行番号リストの最小容量（クラスタ数が多いので小さめにする）
+LIST_MIN_CAPACITY = 16
+
+
+class IVFIndex:
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, n_iter: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        # 割り当て・クラスタごとの行番号は、容量に余裕を持たせたバッファと使用中の件数で持つ
+        self._assignment_buffer = np.zeros(0, dtype=np.int32)
+        self._rows = 0
+        self._lists: List[np.ndarray] = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def assignments(self) -> np.ndarray:
+        return self._assignment_buffer[:self._rows]
+
+    def train(self, vectors: np.ndarray):
+        """正規化済みベクトルで球面k-meansを学習し、全ベクトルを割り当て直す"""
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("学習データがありません")
+
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.seed)
+
+        # 学習はサンプルで十分（クラスタあたり64件程度）
+        sample_size = min(n, n_lists * 64)
+        sample = np.asarray(vectors[rng.choice(n, sample_size, replace=False)], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # 空のクラスタは適当なサンプルで埋め直す
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self.n_lists = n_lists
+        self.centroids = centroids.astype(np.float32)
+        self._reset_assignments(np.zeros(0, dtype=np.int32))
+        self.add(vectors)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """新しいベクトル（行番号は既存の続き）を最寄りのクラスタに追加し、割り当てを返す"""
+        if not self.is_trained or len(vectors) == 0:
+            return np.zeros(0, dtype=np.int32)
+
+        start_row = self._rows
+        labels = self._assign(vectors)
+        self._assignment_buffer = append_rows(self._assignment_buffer, start_row, labels)
+        self._rows += len(labels)
+        self._extend_lists(labels, start_row)
+        return labels
+
+    def search(self, queries: np.ndarray, matrix: np.ndarray, k: int,
+               n_probe: Optional[int] = None) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """各クエリについて (行番号, 類似度) を類似度の高い順に返す"""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+
+        all_indices, all_scores = [], []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([self._lists[c][:self._list_sizes[c]] for c in probe])
+            if len(candidates) == 0:
+                all_indices.append(np.zeros(0, dtype=np.int64))
+                all_scores.append(np.zeros(0, dtype=np.float32))
+                continue
+
+            scores = matrix[candidates] @ query
+            top = min(k, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            all_indices.append(candidates[best])
+            all_scores.append(scores[best])
+
+        return all_indices, all_scores
+
+    def save(self, path: str, assignments_path: str):
+        """重心（学習結果）とクラスタ割り当てをすべて書き直す"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, n_probe=np.int32(self.n_probe))
+        os.replace(tmp_path, path)
+
+        write_records(assignments_path, self.assignments.astype(np.int32))
+
+    def append_assignments(self, assignments_path: str, labels: np.ndarray):
+        """追加分の割り当てだけをファイル末尾に追記する"""
+        append_records(assignments_path, np.asarray(labels, dtype=np.int32))
+
+    @classmethod
+    def load(cls, path: str, assignments_path: str, n_rows: int) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(n_lists=len(data["centroids"]), n_probe=int(data["n_probe"]))
+            index.centroids = data["centroids"].astype(np.float32)
+
+        assignments = read_records(assignments_path, np.int32, n_rows)
+        index._reset_assignments(assignments)
+        index._extend_lists(assignments, 0)
+        return index
+
+    def _reset_assignments(self, assignments: np.ndarray):
+        self._assignment_buffer = assignments
+        self._rows = len(assignments)
+        self._lists = [np.zeros(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self._list_sizes = np.zeros(self.n_lists, dtype=np.int64)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_SIZE], dtype=np.float32)
+            labels[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+    def _extend_lists(self, labels: np.ndarray, start_row: int):
+        # 追加分をクラスタ順に並べ、影響を受けるリストだけ伸ばす
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+        boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+        for group in np.split(order, boundaries):
+            if len(group) == 0:
+                continue
+            label = labels[group[0]]
+            used = self._list_sizes[label]
+            self._lists[label] = append_rows(self._lists[label], used, group.astype(np.int64) + start_row,
+                                             min_capacity=LIST_MIN_CAPACITY)
+            self._list_sizes[label] = used + len(group)
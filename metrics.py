@@ -0,0 +1,211 @@
+"""
+採点の各段階の計測（段階ごとのレイテンシのヒストグラムとカウンター）
+
+計測値は差し替え可能なシンク（sink）に送る。
+  - NullMetrics    : 何もしない（既定。呼び出しのコストだけで、値は集計しない）
+  - InMemoryMetrics: プロセス内で集計し、Prometheus のテキスト形式または JSON で出力する
+環境変数 QUIZ_METRICS=1 で起動時から InMemoryMetrics を使う（set_metrics で差し替えも可能）
+
+    sink = get_metrics()
+    with sink.timer('quiz_stage_seconds', stage='vector'):
+        ...
+    sink.increment('quiz_word_cache_hits_total')
+    sink.observe('embedding_encode_batch_size', 32)
+
+名前が _seconds で終わるヒストグラムは秒単位のバケット、それ以外は件数用（2のべき乗）のバケットで集計する。
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(float(2 ** k) for k in range(17))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """計測しないシンク"""
+    enabled = False
+
+    def increment(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    def timer(self, name: str, **labels):
+        return _NULL_TIMER
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # 最後の要素は最大のバケットを超えた値（+Inf）
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """q 分位点を含むバケットの上限（バケットの粒度での概算）"""
+        if self.count == 0:
+            return 0.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float('inf')
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {_format_bound(bound): count for bound, count in
+                        zip(self.buckets + (float('inf'),), self.counts)}
+        }
+
+
+class _Timer:
+    __slots__ = ('_sink', '_name', '_labels', '_start')
+
+    def __init__(self, sink, name: str, labels: Dict[str, str]):
+        self._sink = sink
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._sink.observe(self._name, time.perf_counter() - self._start, **self._labels)
+        return False
+
+
+class InMemoryMetrics:
+    """プロセス内でヒストグラムとカウンターを集計するシンク（スレッドセーフ）"""
+    enabled = True
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(LATENCY_BUCKETS if name.endswith('_seconds') else SIZE_BUCKETS)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        return _Timer(self, name, labels)
+
+    def snapshot(self) -> Dict:
+        """{'counters': {名前: [{labels, value}]}, 'histograms': {名前: [{labels, count, sum, p50, ...}]}}"""
+        with self._lock:
+            return {
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in sorted(series.items())]
+                    for name, series in sorted(self._counters.items())
+                },
+                'histograms': {
+                    name: [dict(histogram.summary(), labels=dict(key)) for key, histogram in sorted(series.items())]
+                    for name, series in sorted(self._histograms.items())
+                }
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式（exposition format）"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, le=_format_bound(bound))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else _format_value(bound)
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+_sink = InMemoryMetrics() if os.environ.get('QUIZ_METRICS', '0') not in ('', '0') else NullMetrics()
+
+
+def get_metrics():
+    """現在のシンク"""
+    return _sink
+
+
+def set_metrics(sink):
+    """シンクを差し替え、以前のシンクを返す（例: set_metrics(InMemoryMetrics())）"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
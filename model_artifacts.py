@@ -0,0 +1,211 @@
+"""
+埋め込みモデルのローカル成果物（アーティファクト）ディレクトリ
+
+models/<モデル名>/ に tokenizer と safetensors 形式の重み、artifact.json（モデル名・リビジョン・
+各ファイルの sha256）を保存し、以降はネットワークに一切アクセスせずに読み込む。
+重みは safetensors なのでメモリマップで読み込まれる。
+sha256 を確認したファイルの大きさ・更新時刻は .verified.json に記録し、読み込みのたびに
+（採点ワーカーのプロセスごとにも）重み全体を読み直さないようにする。変わったファイルだけ確認し直す。
+
+使い方（ビルド時・デプロイ前に一度だけ実行しておく）:
+    python model_artifacts.py download --model distilbert-base-multilingual-cased --revision <commit>
+    python model_artifacts.py verify
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+from typing import Dict, Optional
+
+DEFAULT_ARTIFACT_DIR = os.environ.get('QUIZ_MODEL_DIR', 'models')
+ARTIFACT_FILE = "artifact.json"
+# 確認済みのファイルの (大きさ, 更新時刻, sha256)。artifact.json のチェックサムには含めない
+VERIFIED_FILE = ".verified.json"
+# 1 にするとローカルにない場合もダウンロードせずにエラーにする
+OFFLINE = os.environ.get('QUIZ_OFFLINE', '') == '1'
+
+
+class ModelArtifactError(RuntimeError):
+    pass
+
+
+def artifact_path(model_name: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or DEFAULT_ARTIFACT_DIR, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    manifest_path = os.path.join(path, ARTIFACT_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(path: str) -> Dict[str, str]:
+    checksums = {}
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            relative = os.path.relpath(full_path, path).replace(os.sep, '/')
+            if relative not in (ARTIFACT_FILE, VERIFIED_FILE):
+                checksums[relative] = _sha256(full_path)
+    return checksums
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _file_stat(full_path: str):
+    stat = os.stat(full_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_verified(path: str) -> Dict:
+    try:
+        with open(os.path.join(path, VERIFIED_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_verified(path: str, checksums: Dict[str, str]):
+    """sha256 を確認したファイルの大きさ・更新時刻を記録する（書き込めない場所なら記録しない）"""
+    verified = _read_verified(path)
+    for relative, checksum in checksums.items():
+        verified[relative] = _file_stat(os.path.join(path, relative)) + [checksum]
+    try:
+        _write_json(os.path.join(path, VERIFIED_FILE), verified)
+    except OSError:
+        pass
+
+
+def verify_artifact(path: str, use_cache: bool = False) -> Dict:
+    """artifact.json に記録した sha256 と一致するか確認し、マニフェストを返す
+
+    use_cache=True なら、前回確認した時から大きさ・更新時刻が変わっていないファイルは読み直さない
+    （モデルの読み込み時。verify コマンドは常にすべて読み直す）
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ModelArtifactError(f"モデルのアーティファクトがありません: {path}")
+
+    verified = _read_verified(path) if use_cache else {}
+    checked = {}
+    for relative, expected in manifest["files"].items():
+        full_path = os.path.join(path, relative)
+        if not os.path.exists(full_path):
+            raise ModelArtifactError(f"モデルのファイルがありません: {full_path}")
+        if verified.get(relative) == _file_stat(full_path) + [expected]:
+            continue
+        if _sha256(full_path) != expected:
+            raise ModelArtifactError(f"モデルのファイルが破損しています（チェックサム不一致）: {full_path}")
+        checked[relative] = expected
+    if checked:
+        _record_verified(path, checked)
+    return manifest
+
+
+def add_artifact_file(path: str, relative: str) -> Dict:
+    """アーティファクトに後から作ったファイル（ONNX に書き出したモデルなど）のチェックサムを記録する"""
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ModelArtifactError(f"モデルのアーティファクトがありません: {path}")
+    checksum = _sha256(os.path.join(path, relative))
+    manifest["files"][relative] = checksum
+    _write_json(os.path.join(path, ARTIFACT_FILE), manifest)
+    _record_verified(path, {relative: checksum})
+    return manifest
+
+
+def download_artifact(model_name: str, revision: Optional[str] = None, directory: Optional[str] = None) -> Dict:
+    """Hugging Face Hub から指定リビジョンを取得し、アーティファクトとして保存する（ネットワークを使う唯一の経路）"""
+    if OFFLINE:
+        raise ModelArtifactError(f"オフラインモードのためモデルを取得できません: {model_name} "
+                                 f"(先に python model_artifacts.py download を実行してください)")
+
+    import torch
+    from huggingface_hub import HfApi
+    from transformers import AutoTokenizer, AutoModel
+
+    # ブランチ名やタグはコミットIDに解決して固定する
+    resolved = HfApi().model_info(model_name, revision=revision).sha
+    print(f"📥 モデルを取得中: {model_name}@{resolved}")
+
+    path = artifact_path(model_name, directory)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, revision=resolved)
+    model = AutoModel.from_pretrained(model_name, revision=resolved, torch_dtype=torch.float32)
+    tokenizer.save_pretrained(tmp_path)
+    model.save_pretrained(tmp_path, safe_serialization=True)
+
+    manifest = {
+        "model_name": model_name,
+        "revision": resolved,
+        "dimension": model.config.hidden_size,
+        "files": _checksums(tmp_path)
+    }
+    with open(os.path.join(tmp_path, ARTIFACT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    # 取得時に計算したチェックサムを確認済みとして記録（初回の読み込みで重みを読み直さない）
+    _record_verified(tmp_path, manifest["files"])
+
+    # 書き終えたディレクトリを rename して公開する（途中で落ちても不完全な成果物は見えない）
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    print(f"✅ モデルを保存しました: {path}")
+    return manifest
+
+
+def ensure_artifact(model_name: str, revision: Optional[str] = None, directory: Optional[str] = None) -> str:
+    """ローカルのアーティファクトのパスを返す（なければ一度だけ取得）。リビジョン違いはエラー"""
+    path = artifact_path(model_name, directory)
+    manifest = read_manifest(path)
+    if manifest is None:
+        manifest = download_artifact(model_name, revision, directory)
+
+    if revision and manifest["revision"] != revision:
+        raise ModelArtifactError(
+            f"ローカルのモデル ({manifest['revision']}) が指定のリビジョン ({revision}) と異なります: {path} "
+            f"(python model_artifacts.py download --revision {revision} で取得し直してください)"
+        )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="埋め込みモデルのローカル成果物を管理する")
+    parser.add_argument("command", choices=["download", "verify"])
+    parser.add_argument("--model", default=None, help="モデル名（既定: simple_embeddings.DEFAULT_MODEL_NAME）")
+    parser.add_argument("--revision", default=None, help="コミットID・タグ・ブランチ（省略時は main を固定）")
+    parser.add_argument("--dir", default=None, help=f"保存先（既定: {DEFAULT_ARTIFACT_DIR}）")
+    args = parser.parse_args()
+
+    if args.model is None:
+        from simple_embeddings import DEFAULT_MODEL_NAME
+        args.model = DEFAULT_MODEL_NAME
+
+    if args.command == "download":
+        download_artifact(args.model, args.revision, args.dir)
+    else:
+        manifest = verify_artifact(artifact_path(args.model, args.dir))
+        print(f"✅ {manifest['model_name']}@{manifest['revision']} ({len(manifest['files'])}ファイル) は正常です")
+
+
+if __name__ == "__main__":
+    main()
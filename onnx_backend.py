@@ -0,0 +1,74 @@
+"""
+ONNX Runtime による埋め込みモデルの推論（SimpleEmbeddings の backend='onnx' 用）
+
+初回は同じチェックポイントの torch モデルをアーティファクトのディレクトリ（model_artifacts.py）に
+ONNX 形式で書き出し、以降は書き出し済みのファイルを読み込む（torch モデル本体は読み込まない）。
+onnxruntime が必要: pip install onnxruntime
+"""
+import os
+import numpy as np
+from typing import Dict, Optional
+
+ONNX_FILE = "model.onnx"
+ONNX_OPSET = 14
+
+
+def onnx_model_path(artifact_dir: str) -> str:
+    return os.path.join(artifact_dir, ONNX_FILE)
+
+
+def export_onnx(model, path: str):
+    """torch の AutoModel を (input_ids, attention_mask) -> last_hidden_state の ONNX に書き出す"""
+    import torch
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    tmp_path = path + ".tmp"
+
+    print(f"📦 ONNX形式に書き出し中: {path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(model).eval(),
+            (dummy, dummy),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            # バッチサイズと系列長は可変（動的パディングのため）
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=ONNX_OPSET
+        )
+    os.replace(tmp_path, path)
+
+
+class OnnxModel:
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("backend='onnx' には onnxruntime が必要です (pip install onnxruntime)") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def run(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """トークナイザーの出力（return_tensors='np'）から last_hidden_state を返す"""
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0]
@@ -0,0 +1,169 @@
+"""
+NumPy のみで実装した直積量子化（Product Quantization, PQ）
+
+正規化済みベクトルを n_subvectors 個の部分ベクトルに分け、部分空間ごとに k-means（256クラスタ）で
+学習した代表ベクトルの番号（uint8）だけを保持する。768次元・96分割なら 1件 96バイト（float32 の 1/32）。
+検索時はクエリと各代表ベクトルの内積表を先に作り、表を引いて足すだけで近似類似度を求める
+（非対称距離計算, ADC）。近似なので、上位候補は元の埋め込みで計算し直して並べ替える（再ランク）。
+"""
+import os
+import numpy as np
+from typing import List, Optional
+
+from array_buffer import append_rows, append_records, read_records, write_records
+
+ENCODE_CHUNK_SIZE = 65536
+# 学習に使うサンプル数（クラスタあたり32件程度で十分）
+TRAIN_SAMPLES_PER_CENTROID = 32
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # ||x - c||^2 の x に依存しない部分 ||c||^2 - 2x・c だけで比較する（一時配列を増やさないよう in-place）
+    distances = data @ centroids.T
+    distances *= -2
+    distances += (centroids ** 2).sum(axis=1)
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(data: np.ndarray, k: int, n_iter: int, rng) -> np.ndarray:
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _nearest(data, centroids)
+        # 次元ごとの bincount で合計を求める（np.add.at より大幅に速い）
+        sums = np.stack([np.bincount(labels, weights=data[:, d], minlength=k)
+                         for d in range(data.shape[1])], axis=1).astype(np.float32)
+        counts = np.bincount(labels, minlength=k)
+
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # 空のクラスタは適当なサンプルで埋め直す
+        empty = ~filled
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class ProductQuantizer:
+    def __init__(self, n_subvectors: Optional[int] = None, n_centroids: int = 256, n_iter: int = 10, seed: int = 0):
+        if n_centroids > 256:
+            raise ValueError("n_centroids は256以下にしてください（番号を uint8 で保持するため）")
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        # (部分空間数, クラスタ数, 部分次元)
+        self.codebooks = None
+        # 番号は部分空間ごとに連続させて (部分空間数, 件数) で保持する（表引きが連続アクセスになる）。
+        # codes は件数方向に余裕を持たせたバッファの使用中の部分
+        self.codes = self._codes_buffer = np.zeros((n_subvectors or 0, 0), dtype=np.uint8)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.codebooks.nbytes if self.is_trained else 0)
+
+    def train(self, sample: np.ndarray):
+        """正規化済みベクトルのサンプルで部分空間ごとの代表ベクトルを学習する（既存の番号は破棄）"""
+        sample = np.asarray(sample, dtype=np.float32)
+        if len(sample) == 0:
+            raise ValueError("学習データがありません")
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(sample), self.n_centroids * TRAIN_SAMPLES_PER_CENTROID)
+        if sample_size < len(sample):
+            sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+
+        dimension = sample.shape[1]
+        n_subvectors = self.n_subvectors or max(1, dimension // 8)
+        if dimension % n_subvectors:
+            raise ValueError(f"次元数 {dimension} は n_subvectors={n_subvectors} で割り切れません")
+        sub_dimension = dimension // n_subvectors
+        n_centroids = min(self.n_centroids, len(sample))
+
+        codebooks = np.empty((n_subvectors, n_centroids, sub_dimension), dtype=np.float32)
+        for m in range(n_subvectors):
+            part = np.ascontiguousarray(sample[:, m * sub_dimension:(m + 1) * sub_dimension])
+            codebooks[m] = _kmeans(part, n_centroids, self.n_iter, rng)
+
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.codebooks = codebooks
+        self.codes = self._codes_buffer = np.zeros((n_subvectors, 0), dtype=np.uint8)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """各ベクトルを部分空間ごとの代表ベクトルの番号（uint8）に変換する: (件数, 部分空間数)"""
+        sub_dimension = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.n_subvectors), dtype=np.uint8)
+        for start in range(0, len(vectors), ENCODE_CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + ENCODE_CHUNK_SIZE], dtype=np.float32)
+            for m in range(self.n_subvectors):
+                part = chunk[:, m * sub_dimension:(m + 1) * sub_dimension]
+                codes[start:start + len(chunk), m] = _nearest(part, self.codebooks[m])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """番号 (件数, 部分空間数) から近似ベクトルを復元する"""
+        parts = self.codebooks[np.arange(self.n_subvectors), codes]
+        return parts.reshape(len(codes), -1)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """新しいベクトル（行番号は既存の続き）を符号化して追加し、追加分の番号を返す"""
+        if not self.is_trained or len(vectors) == 0:
+            return np.zeros((0, self.n_subvectors or 0), dtype=np.uint8)
+        codes = self.encode(vectors)
+        used = len(self)
+        self._codes_buffer = append_rows(self._codes_buffer, used, codes.T, axis=1)
+        self.codes = self._codes_buffer[:, :used + len(codes)]
+        return codes
+
+    def search(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        """各クエリについて近似類似度（内積）の高い順に上位k件の行番号を返す"""
+        n = len(self)
+        k = min(k, n)
+        if k <= 0:
+            return [np.zeros(0, dtype=np.int64) for _ in range(len(queries))]
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), self.n_subvectors, -1)
+        # クエリの部分ベクトルと全代表ベクトルの内積表: (クエリ数, 部分空間数, クラスタ数)
+        tables = np.einsum('qmd,mkd->qmk', queries, self.codebooks)
+
+        results = []
+        for table in tables:
+            # 部分空間ごとに表を引いて足し込む（256要素の表なのでキャッシュに収まる）
+            scores = np.zeros(n, dtype=np.float32)
+            for m in range(self.n_subvectors):
+                scores += np.take(table[m], self.codes[m])
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            results.append(top[np.argsort(-scores[top], kind='stable')])
+        return results
+
+    def save(self, path: str, codes_path: str):
+        """代表ベクトル（学習結果）と全件の番号を書き直す"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, codebooks=self.codebooks)
+        os.replace(tmp_path, path)
+
+        # ファイルは1件ずつ（行優先）並べる（追記できるように）
+        write_records(codes_path, self.codes.T)
+
+    def append_codes(self, codes_path: str, codes: np.ndarray):
+        """追加分の番号だけをファイル末尾に追記する"""
+        append_records(codes_path, np.asarray(codes, dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str, codes_path: str, n_rows: int) -> "ProductQuantizer":
+        with np.load(path) as data:
+            codebooks = data["codebooks"].astype(np.float32)
+        pq = cls(n_subvectors=codebooks.shape[0], n_centroids=codebooks.shape[1])
+        pq.codebooks = codebooks
+
+        # 1件 = 部分空間数バイトのレコード
+        codes = read_records(codes_path, np.dtype((np.uint8, (pq.n_subvectors,))), n_rows)
+        pq.codes = pq._codes_buffer = np.ascontiguousarray(codes.T)
+        return pq
@@ -0,0 +1,138 @@
+"""
+出題用の事前解析済みインデックス
+
+ドキュメントの読み込み・追加時に一度だけ EN:/JP: を解析しておき、
+出題（ランダム抽出）と正解の和訳の検索を件数によらず定数時間で行う。
+対訳形式でないドキュメントから抽出した英文も行ごとに保持し、出題のたびに分割し直さない
+"""
+import random
+import numpy as np
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
+
+from translation_pairs import parse_translation_pair
+
+
+def normalize_english(text: str) -> str:
+    return text.strip().lower()
+
+
+class QuestionIndex:
+    def __init__(self):
+        # 対訳 (英文, 和訳, 行番号)
+        self.pairs: List[Tuple[str, str, int]] = []
+        # 対訳形式でないドキュメントの行番号（出題時に英文を抽出する）
+        self.text_rows: List[int] = []
+        self._text_positions: Dict[int, int] = {}
+        # 行番号 -> 抽出した英文（追加時、または読み込んだ行は初めて出題した時に抽出）
+        self._sentences: Dict[int, Tuple[str, ...]] = {}
+        # 行番号 -> pairs の位置（絞り込んだ行から出題する時に使う）
+        self._pair_positions: Dict[int, int] = {}
+        # pairs の位置 -> 和訳の内容語（初めて採点した時に解析して保持）
+        self._reference_words: Dict[int, Tuple[str, ...]] = {}
+        # 正規化した英文 -> pairs の位置
+        self._by_english: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return len(self.pairs) + len(self.text_rows)
+
+    def add(self, documents: List[Dict], start_row: int = 0,
+            pairs: Optional[List[Optional[Tuple[str, str]]]] = None,
+            extract_sentences: Optional[Callable[[str], List[str]]] = None):
+        """extract_sentences を渡すと、対訳形式でないドキュメントの英文をここで抽出する
+        （英文のないドキュメントは出題候補にしない）"""
+        # 解析済みの対訳（parse_translation_pair の結果）があれば再利用する
+        if pairs is None:
+            pairs = [parse_translation_pair(doc["text"]) for doc in documents]
+
+        for row, (doc, pair) in enumerate(zip(documents, pairs), start=start_row):
+            if pair:
+                english, japanese = pair
+                self._by_english.setdefault(normalize_english(english), []).append(len(self.pairs))
+                self._pair_positions[row] = len(self.pairs)
+                self.pairs.append((english, japanese, row))
+            # EN:/JP: を含むのに解析できないものは従来どおり出題しない
+            elif not ('EN:' in doc["text"] and 'JP:' in doc["text"]):
+                if extract_sentences is not None:
+                    sentences = tuple(extract_sentences(doc["text"]))
+                    if not sentences:
+                        continue
+                    self._sentences[row] = sentences
+                self._text_positions[row] = len(self.text_rows)
+                self.text_rows.append(row)
+
+    def sample(self, rng=random,
+               rows: Optional[Sequence[int]] = None) -> Optional[Tuple[int, Optional[Tuple[str, str]]]]:
+        """(行番号, (英文, 和訳) または None) をランダムに返す。候補がなければ None
+
+        rows を渡すとその行（メタデータで絞り込んだ行など）の中から選ぶ（行数に比例した時間）
+        """
+        if rows is not None:
+            return self._sample_rows(rng, rows)
+
+        total = len(self)
+        if total == 0:
+            return None
+
+        position = rng.randrange(total)
+        if position < len(self.pairs):
+            english, japanese, row = self.pairs[position]
+            return row, (english, japanese)
+        return self.text_rows[position - len(self.pairs)], None
+
+    def _sample_rows(self, rng, rows: Sequence[int]) -> Optional[Tuple[int, Optional[Tuple[str, str]]]]:
+        candidates = [row for row in np.asarray(rows).tolist()
+                      if row in self._pair_positions or row in self._text_positions]
+        if not candidates:
+            return None
+
+        row = rng.choice(candidates)
+        position = self._pair_positions.get(row)
+        if position is None:
+            return row, None
+        english, japanese, _ = self.pairs[position]
+        return row, (english, japanese)
+
+    def _reference_position(self, row: int, japanese: str) -> Optional[int]:
+        """対訳の行で、和訳が japanese と同じなら pairs の位置（対訳でない・和訳が違う場合は None）"""
+        position = self._pair_positions.get(row)
+        if position is None or self.pairs[position][1] != japanese:
+            return None
+        return position
+
+    def is_reference(self, row: int, japanese: str) -> bool:
+        """japanese がその行の対訳の和訳と同じか（取り込み時に計算した値を使ってよいか）"""
+        return self._reference_position(row, japanese) is not None
+
+    def reference_words(self, row: int, japanese: str,
+                        tokenize: Callable[[str], List[str]]) -> Optional[Tuple[str, ...]]:
+        """対訳の和訳の内容語。問題ごとに一度だけ tokenize で解析する（対訳でない・和訳が違う場合は None）"""
+        position = self._reference_position(row, japanese)
+        if position is None:
+            return None
+        words = self._reference_words.get(position)
+        if words is None:
+            words = self._reference_words[position] = tuple(tokenize(japanese))
+        return words
+
+    def english_sentences(self, row: int, text: str,
+                          extract_sentences: Callable[[str], List[str]]) -> Tuple[str, ...]:
+        """対訳形式でないドキュメントの英文。抽出は行ごとに一度だけ"""
+        sentences = self._sentences.get(row)
+        if sentences is None:
+            sentences = self._sentences[row] = tuple(extract_sentences(text))
+        return sentences
+
+    def discard_text_row(self, row: int):
+        """英文を抽出できなかったドキュメントを出題候補から外す（末尾と入れ替えて O(1)）"""
+        self._sentences.pop(row, None)
+        position = self._text_positions.pop(row, None)
+        if position is None:
+            return
+        last = self.text_rows.pop()
+        if last != row:
+            self.text_rows[position] = last
+            self._text_positions[last] = position
+
+    def lookup(self, english: str) -> List[Tuple[str, str, int]]:
+        """英文（大文字小文字・前後の空白を無視）に一致する対訳の一覧"""
+        return [self.pairs[i] for i in self._by_english.get(normalize_english(english), [])]
@@ -0,0 +1,163 @@
+"""
+採点要求をまとめて処理する非同期サービス（asyncio）
+
+同時に採点する受講者が多いと、回答ごとにモデルの順伝播（1件ずつ）が走る。
+ScoringService は届いた採点要求を短い時間窓（max_wait_ms）または max_batch_size 件まで集め、
+EnglishQuizSystem.score_batch で1回のバッチエンコードにまとめて採点し、各要求の Future に結果を返す。
+採点は専用スレッド1本で順番に行うので、採点中に届いた要求は次のバッチにまとまる。
+
+    async with ScoringService(quiz, max_batch_size=32, max_wait_ms=5) as service:
+        result = await service.score({'answer': ..., 'english': ..., 'japanese': ..., 'doc_id': ...})
+
+Streamlit のような同期コードからは BackgroundScoringService（別スレッドでイベントループを動かす）を使う。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from metrics import get_metrics
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+
+# キューに入れて採点ループを終了させる目印
+_STOP = None
+
+
+class ScoringService:
+    """複数の採点要求を時間窓でまとめ、score_batch で一括採点する"""
+
+    def __init__(self, quiz, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, with_steps: bool = True):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size は1以上にしてください")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms は0以上にしてください")
+        self.quiz = quiz
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.with_steps = with_steps
+        self.requests = 0
+        self.batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+        # モデル・形態素解析はイベントループを止めないよう、このスレッドで実行する
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def start(self):
+        if self._runner is None:
+            self._queue = asyncio.Queue()
+            self._runner = asyncio.create_task(self._run())
+
+    async def close(self):
+        """受け付け済みの要求を採点し終えてから停止する"""
+        if self._runner is not None:
+            await self._queue.put(_STOP)
+            await self._runner
+            self._runner = None
+        self._executor.shutdown(wait=True)
+
+    async def score(self, item: Dict) -> Dict:
+        """1件の回答を採点する（item は score_batch と同じ形式）"""
+        if self._runner is None:
+            raise RuntimeError("ScoringService が開始されていません（start() を呼んでください）")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            request = await self._queue.get()
+            if request is _STOP:
+                break
+            batch = [request]
+
+            # 最初の要求から max_wait までに届いた要求を max_batch_size 件まで集める
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    request = self._queue.get_nowait()
+                if request is _STOP:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            await self._score(loop, batch)
+
+    async def _score(self, loop, batch: List[Tuple[Dict, asyncio.Future]]):
+        # 待ちきれずにキャンセルされた要求は採点しない
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        items = [item for item, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self._score_items, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.requests += len(batch)
+        self.batches += 1
+        get_metrics().observe('scoring_service_batch_size', len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _score_items(self, items: List[Dict]) -> List[Dict]:
+        return list(self.quiz.score_batch(items, with_steps=self.with_steps, batch_size=len(items)))
+
+
+class BackgroundScoringService:
+    """
+    ScoringService を専用スレッドのイベントループで動かし、同期コードから呼べるようにする
+    （Streamlit はセッションごとに別スレッドでスクリプトを実行するため）
+    """
+
+    def __init__(self, quiz, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="scoring-service", daemon=True)
+        self._thread.start()
+        self.service = ScoringService(quiz, **options)
+        asyncio.run_coroutine_threadsafe(self.service.start(), self._loop).result()
+
+    def score(self, item: Dict, timeout: Optional[float] = None) -> Dict:
+        return asyncio.run_coroutine_threadsafe(self.service.score(item), self._loop).result(timeout)
+
+    def stats(self) -> Dict:
+        return self.service.stats()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.service.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,333 @@
+"""
+追記専用のセグメント形式ストレージ（SimpleVectorStore の永続化）
+
+ディレクトリ構成:
+  - manifest.json        : 有効なセグメントの一覧と、埋め込みを作ったモデル（これを置き換えた時点でコミット）
+  - seg-000001.bin       : セグメントの埋め込み行列（float32 / float16、np.memmap で読み込み）
+  - seg-000001.jsonl     : セグメントのドキュメント（1行1件の id / text / metadata）
+  - seg-000001.ref.bin   : 対訳ドキュメントの和訳（JP行）の埋め込み（対訳の行の分だけ）
+  - seg-000001.ref.rows  : ref.bin の各行がセグメント内の何行目か（int32、昇順）
+
+追加時は新しいセグメントだけを書き込むため、書き込み量は追加分に比例する。
+読み込んだ埋め込みはセグメントごとの memmap のまま SegmentedMatrix でつなぐ（全体を連結したコピーは作らない）。
+和訳の埋め込みも同様に SegmentReferences でつなぎ、行番号から ref.rows を二分探索して引く。
+ファイルはすべて一時ファイルに書いてから rename するので、途中でクラッシュしても
+manifest に載っていない書きかけのセグメントが残るだけで既存データは壊れない。
+セグメントが増えすぎないよう、サイズの近い末尾のセグメント同士を段階的にまとめる。
+"""
+import os
+import re
+import json
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Iterator
+
+MANIFEST_FILE = "manifest.json"
+# 2: 和訳の埋め込みを全行分（対訳でない行は0ベクトル）持つ形式。3: 対訳の行の分だけ持つ形式
+MANIFEST_VERSION = 3
+SEGMENT_PATTERN = re.compile(r"^seg-(\d{6})\.(bin|jsonl|ref\.bin|ref\.rows)$")
+SEGMENT_SUFFIXES = (".bin", ".jsonl", ".ref.bin", ".ref.rows")
+# 書き込み・コンパクション時に一度に読み書きする行数
+WRITE_CHUNK_ROWS = 65536
+
+
+def _write_atomic(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SegmentedMatrix:
+    """セグメントごとの行列（memmap）を行方向につないだ読み取り専用の行列。
+    行・スライス・行番号の配列で参照でき、参照した行だけを読み出す"""
+
+    def __init__(self, parts: List[np.ndarray], dimension: int, dtype):
+        self.parts = parts
+        self.offsets = np.cumsum([0] + [len(part) for part in parts])
+        self.shape = (int(self.offsets[-1]), dimension)
+        self.dtype = np.dtype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = self[0:len(self)]
+        return matrix if dtype is None else matrix.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            row = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= row < len(self):
+                raise IndexError("行番号が範囲外です")
+            part = int(np.searchsorted(self.offsets, row, side='right')) - 1
+            return self.parts[part][row - self.offsets[part]]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self[np.arange(start, stop, step)]
+            pieces = []
+            for part, matrix in enumerate(self.parts):
+                low, high = max(start, self.offsets[part]), min(stop, self.offsets[part + 1])
+                if low < high:
+                    pieces.append(matrix[low - self.offsets[part]:high - self.offsets[part]])
+            if len(pieces) == 1:
+                return pieces[0]
+            return np.concatenate(pieces) if pieces else np.zeros((0, self.shape[1]), dtype=self.dtype)
+
+        rows = np.asarray(key, dtype=np.int64)
+        result = np.empty((len(rows), self.shape[1]), dtype=self.dtype)
+        parts = np.searchsorted(self.offsets, rows, side='right') - 1
+        for part in np.unique(parts):
+            mask = parts == part
+            result[mask] = self.parts[part][rows[mask] - self.offsets[part]]
+        return result
+
+
+class SegmentReferences:
+    """セグメントごとの (セグメント内の行番号, 和訳の埋め込み) をつないだ読み取り専用の疎な行列。
+    対訳の行だけがベクトルを持ち、それ以外の行は None"""
+
+    def __init__(self, parts: List[Tuple[np.ndarray, np.ndarray]], counts: List[int], dimension: int, dtype):
+        self.parts = parts
+        self.offsets = np.cumsum([0] + list(counts))
+        self.shape = (int(self.offsets[-1]), dimension)
+        self.dtype = np.dtype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def get(self, row: int) -> Optional[np.ndarray]:
+        if not 0 <= row < len(self):
+            raise IndexError("行番号が範囲外です")
+        part = int(np.searchsorted(self.offsets, row, side='right')) - 1
+        rows, matrix = self.parts[part]
+        local = row - self.offsets[part]
+        i = int(np.searchsorted(rows, local))
+        if i == len(rows) or rows[i] != local:
+            return None
+        vector = matrix[i]
+        # バージョン2のセグメントでは、対訳でない行も0ベクトルとして入っている
+        return vector if vector.any() else None
+
+    def chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(全体での行番号, 埋め込み) を少しずつ返す（0ベクトルの行は除く）"""
+        for (rows, matrix), offset in zip(self.parts, self.offsets):
+            for start in range(0, len(rows), WRITE_CHUNK_ROWS):
+                chunk = np.asarray(matrix[start:start + WRITE_CHUNK_ROWS])
+                keep = chunk.any(axis=1)
+                yield np.asarray(rows[start:start + WRITE_CHUNK_ROWS])[keep] + offset, chunk[keep]
+
+
+class SegmentStorage:
+    def __init__(self, directory: str, dimension: int, dtype: str = "float32", compaction_ratio: float = 1.0):
+        self.directory = directory
+        self.dimension = dimension
+        self.dtype = dtype
+        # 直前のセグメントが (末尾の合計件数 × ratio) 以下ならまとめる
+        self.compaction_ratio = compaction_ratio
+        self.segments: List[Dict] = []
+        self.next_segment = 1
+        # 埋め込みを作ったモデルの識別情報 {name, revision, dimension}（記録導入前のデータは None）
+        self.model: Optional[Dict] = None
+        # セグメント名 -> 開いた memmap（追加のたびに開き直さない）
+        self._opened: Dict[str, np.ndarray] = {}
+        self._opened_references: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def count(self) -> int:
+        return sum(segment["count"] for segment in self.segments)
+
+    def load(self) -> Tuple[Iterator[Dict], SegmentedMatrix, SegmentReferences]:
+        """(ドキュメント, 埋め込み, 和訳埋め込み)。ドキュメントは1件ずつ読み出すイテレーター"""
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        self.dimension = manifest["dimension"]
+        self.dtype = manifest["dtype"]
+        self.segments = manifest["segments"]
+        self.next_segment = manifest["next_segment"]
+        self.model = manifest.get("model")
+        self._opened = {}
+        self._opened_references = {}
+        self._remove_orphans()
+
+        # 全件の dict を一度に作らないよう、読み込み先（DocumentTable など）へ1件ずつ渡す
+        documents = (doc for segment in self.segments for doc in self._read_documents(segment))
+
+        return documents, self.open_embeddings(), self.open_references()
+
+    def open_embeddings(self, segments: Optional[List[Dict]] = None) -> SegmentedMatrix:
+        """セグメント（既定: 全セグメント）の埋め込みをつないだ行列（ファイルはメモリに読み込まない）"""
+        segments = self.segments if segments is None else segments
+        return SegmentedMatrix([self._open_matrix(segment) for segment in segments], self.dimension, self.dtype)
+
+    def open_references(self, segments: Optional[List[Dict]] = None) -> SegmentReferences:
+        segments = self.segments if segments is None else segments
+        return SegmentReferences([self._open_references(segment) for segment in segments],
+                                 [segment["count"] for segment in segments], self.dimension, self.dtype)
+
+    def append(self, documents: List[Dict], embeddings: np.ndarray, references: Optional[np.ndarray] = None):
+        """新しいセグメントを書き込んでコミットし、必要なら末尾をコンパクションする。
+        references は全行分の和訳の埋め込み（対訳でない行は0ベクトル）で、対訳の行の分だけ書き込む"""
+        if not documents:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        segment = self._write_segment(documents, embeddings, references)
+        self.segments = self.segments + [segment]
+        self._write_manifest()
+        self._maybe_compact()
+
+    def write_all(self, documents: List[Dict], embeddings, references=None):
+        """全データを1セグメントとして書き直す（移行・全体コンパクション用）"""
+        os.makedirs(self.directory, exist_ok=True)
+        old_segments = self.segments
+        self.segments = [self._write_segment(documents, embeddings, references)] if documents else []
+        self._write_manifest()
+        self._remove_segments(old_segments)
+
+    def compact(self):
+        """すべてのセグメントを1つにまとめる"""
+        if len(self.segments) > 1:
+            self._merge(0)
+
+    def delete(self):
+        self._remove_segments(self.segments)
+        self.segments = []
+        self.model = None
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def _maybe_compact(self):
+        # 末尾から、サイズが同程度のセグメントをまとめる（二進カウンタ状にセグメント数が対数で抑えられる）
+        merge_from = len(self.segments) - 1
+        tail_count = self.segments[-1]["count"]
+        while merge_from > 0 and self.segments[merge_from - 1]["count"] <= tail_count * self.compaction_ratio:
+            merge_from -= 1
+            tail_count += self.segments[merge_from]["count"]
+
+        if merge_from < len(self.segments) - 1:
+            self._merge(merge_from)
+
+    def _merge(self, start: int):
+        targets = self.segments[start:]
+        documents = []
+        for segment in targets:
+            documents.extend(self._read_documents(segment))
+        # 埋め込みは連結したコピーを作らず、少しずつ読みながら書き込む
+        merged = self._write_segment(documents, self.open_embeddings(targets), self.open_references(targets))
+        self.segments = self.segments[:start] + [merged]
+        self._write_manifest()
+        self._remove_segments(targets)
+
+    def _write_segment(self, documents: List[Dict], embeddings, references=None) -> Dict:
+        """embeddings は ndarray または SegmentedMatrix、references は ndarray または SegmentReferences"""
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+
+        _write_atomic(os.path.join(self.directory, name + ".bin"), lambda f: self._write_rows(f, embeddings))
+        reference_rows = []
+        if references is not None:
+            def write_references(f):
+                for rows, chunk in self._reference_chunks(references):
+                    reference_rows.append(rows.astype(np.int32))
+                    f.write(np.ascontiguousarray(chunk, dtype=self.dtype).tobytes())
+
+            _write_atomic(os.path.join(self.directory, name + ".ref.bin"), write_references)
+            reference_rows = np.concatenate(reference_rows) if reference_rows else np.zeros(0, dtype=np.int32)
+            _write_atomic(os.path.join(self.directory, name + ".ref.rows"), lambda f: f.write(reference_rows.tobytes()))
+
+        lines = "".join(json.dumps(doc, ensure_ascii=False, separators=(',', ':')) + "\n" for doc in documents)
+        _write_atomic(os.path.join(self.directory, name + ".jsonl"), lambda f: f.write(lines.encode('utf-8')))
+
+        return {"name": name, "count": len(documents), "references": len(reference_rows)}
+
+    def _write_rows(self, f, matrix):
+        for start in range(0, len(matrix), WRITE_CHUNK_ROWS):
+            f.write(np.ascontiguousarray(matrix[start:start + WRITE_CHUNK_ROWS], dtype=self.dtype).tobytes())
+
+    def _reference_chunks(self, references) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(行番号, 和訳の埋め込み)。0ベクトル（対訳でない行）は書き込まない"""
+        if isinstance(references, SegmentReferences):
+            yield from references.chunks()
+            return
+        for start in range(0, len(references), WRITE_CHUNK_ROWS):
+            chunk = np.asarray(references[start:start + WRITE_CHUNK_ROWS])
+            keep = np.flatnonzero(chunk.any(axis=1))
+            yield keep + start, chunk[keep]
+
+    def _write_manifest(self):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "dimension": self.dimension,
+            "dtype": self.dtype,
+            "next_segment": self.next_segment,
+            "model": self.model,
+            "segments": self.segments
+        }
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        _write_atomic(self.manifest_path, lambda f: f.write(data))
+
+    def _read_documents(self, segment: Dict) -> Iterator[Dict]:
+        with open(os.path.join(self.directory, segment["name"] + ".jsonl"), 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _open_matrix(self, segment: Dict) -> np.ndarray:
+        matrix = self._opened.get(segment["name"])
+        if matrix is None:
+            matrix = self._opened[segment["name"]] = np.memmap(
+                os.path.join(self.directory, segment["name"] + ".bin"), dtype=self.dtype,
+                mode='r', shape=(segment["count"], self.dimension))
+        return matrix
+
+    def _open_references(self, segment: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        opened = self._opened_references.get(segment["name"])
+        if opened is not None:
+            return opened
+        path = os.path.join(self.directory, segment["name"] + ".ref.bin")
+        count = segment.get("references", 0)
+        if count:
+            rows = np.memmap(os.path.join(self.directory, segment["name"] + ".ref.rows"), dtype=np.int32,
+                             mode='r', shape=(count,))
+            matrix = np.memmap(path, dtype=self.dtype, mode='r', shape=(count, self.dimension))
+        elif segment.get("reference"):
+            # バージョン2のセグメントは全行分（対訳でない行は0ベクトル）
+            rows = np.arange(segment["count"], dtype=np.int32)
+            matrix = np.memmap(path, dtype=self.dtype, mode='r', shape=(segment["count"], self.dimension))
+        else:
+            # 対訳のないセグメント・和訳埋め込み導入前のセグメント（採点時にエンコードする）
+            rows, matrix = np.zeros(0, dtype=np.int32), np.zeros((0, self.dimension), dtype=self.dtype)
+        self._opened_references[segment["name"]] = (rows, matrix)
+        return rows, matrix
+
+    def _remove_segments(self, segments: List[Dict]):
+        for segment in segments:
+            self._opened.pop(segment["name"], None)
+            self._opened_references.pop(segment["name"], None)
+            for suffix in SEGMENT_SUFFIXES:
+                self._try_remove(os.path.join(self.directory, segment["name"] + suffix))
+
+    def _remove_orphans(self):
+        # manifest に載っていないファイル（クラッシュ時の書きかけ・削除漏れ）を掃除
+        live = {segment["name"] for segment in self.segments}
+        for filename in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(filename)
+            if (match and f"seg-{match.group(1)}" not in live) or filename.endswith(".tmp"):
+                self._try_remove(os.path.join(self.directory, filename))
+
+    def _try_remove(self, path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            # Windows ではメモリマップ中のファイルを消せないため、次回起動時に掃除する
+            pass
@@ -1,72 +1,442 @@
 """
 DistilBERT ベースのAI埋め込みモデル（デバイス対応版）
+
+モデルはローカルのアーティファクト（model_artifacts.py、リビジョンとチェックサムを固定）から
+オフラインで読み込む。ローカルにない場合だけ初回に一度取得する（別モデルへの代替はしない）。
+torch / transformers はモデルを読み込む時に初めて import する。
+モデルは初回のエンコード時、または start_loading() によるバックグラウンドスレッドで読み込まれ、
+読み込み中にエンコードが呼ばれた場合は完了を待つ。
+
+推論バックエンド（backend）:
+  - torch      : float32 の DistilBERT（従来どおり）
+  - torch-int8 : 線形層を動的 int8 量子化した DistilBERT（CPU で高速・省メモリ、精度はわずかに低下）
+  - onnx       : 同じチェックポイントを書き出した ONNX Runtime モデル（onnx_backend.py）
 """
+import os
+import hashlib
+import threading
+from collections import Counter
 import numpy as np
-from typing import List
-import torch
-from transformers import AutoTokenizer, AutoModel
+from typing import List, Dict, Tuple, Optional
 
-class SimpleEmbeddings:
-  def __init__(self):
-      print("📦 AI埋め込みモデルをロード中...")
-      print("⚠️ 初回起動時は3-4分かかります...")
+from metrics import get_metrics
+from lru_cache import LRUCache
+from model_artifacts import (artifact_path, ensure_artifact, read_manifest, verify_artifact, add_artifact_file,
+                             ModelArtifactError)
+
+DEFAULT_MODEL_NAME = 'distilbert-base-multilingual-cased'
+# 固定するリビジョン（コミットID）。未指定ならローカルのアーティファクトに記録されたものを使う
+DEFAULT_MODEL_REVISION = os.environ.get('QUIZ_MODEL_REVISION') or None
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CACHE_SIZE = 4096
+# モデルに一度に入れるトークン数の上限（これを超えるテキストは分割してプーリング）
+DEFAULT_MAX_LENGTH = 512
+# 1回の順伝播で処理する（パディング込みの）トークン数の上限
+DEFAULT_MAX_BATCH_TOKENS = 8192
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+# アプリ・採点ワーカー（別プロセス）で共通のバックエンドを環境変数で選べるようにする
+DEFAULT_BACKEND = os.environ.get('QUIZ_EMBEDDING_BACKEND', 'torch')
+
+# プロセス全体で共有するモデルレジストリ（(モデル名, リビジョン, バックエンド) -> (tokenizer, model, artifact.json)）
+_model_registry: Dict[Tuple[str, Optional[str], str], Tuple[object, object, Dict]] = {}
+_registry_lock = threading.Lock()
+
+
+def _load_model(model_name: str, device, backend: str = 'torch', revision: Optional[str] = None):
+    """(tokenizer, model, artifact.json の内容) を返す。ローカルのアーティファクトからオフラインで読み込む"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未対応のバックエンドです: {backend} (選択肢: {', '.join(BACKENDS)})")
+
+    # 読み込みに時間がかかるため、import もモデルが必要になるまで遅らせる
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    path = ensure_artifact(model_name, revision)
+    # 壊れた・差し替えられた重みで黙って採点しないよう、読み込む前にチェックサムを確認
+    # （前回確認した後に変わっていないファイルは読み直さない）
+    manifest = verify_artifact(path, use_cache=True)
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+
+    if backend == 'onnx':
+        from onnx_backend import ONNX_FILE, OnnxModel, export_onnx, onnx_model_path
+        onnx_path = onnx_model_path(path)
+        # 書き出し済み（チェックサムを記録・確認済み）なら torch モデル本体は読み込まない。
+        # 記録のないファイルは確認できないので書き出し直す
+        if ONNX_FILE in manifest["files"]:
+            return tokenizer, OnnxModel(onnx_path), manifest
+
+    print("📦 AI埋め込みモデルをロード中...")
+    # safetensors の重みはメモリマップで読み込まれる
+    model = AutoModel.from_pretrained(
+        path,
+        local_files_only=True,
+        use_safetensors=True,
+        torch_dtype=torch.float32,  # データ型を明示
+        device_map=None  # デバイスマップを無効化
+    )
+
+    # モデルをCPUに移動
+    model = model.to(device)
+    model.eval()
+
+    print(f"✅ {model_name}@{manifest['revision'][:12]} ({manifest['dimension']}次元) をロードしました")
+
+    if backend == 'torch-int8':
+        # 線形層の重みを int8 にし、活性は実行時に量子化する（CPU 推論向け）
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print("✅ int8 動的量子化を適用しました")
+    elif backend == 'onnx':
+        export_onnx(model, onnx_path)
+        manifest = add_artifact_file(path, ONNX_FILE)
+        model = OnnxModel(onnx_path)
+        print("✅ ONNX Runtime モデルを読み込みました")
+
+    return tokenizer, model, manifest
+
+
+def get_shared_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = DEFAULT_BACKEND,
+                     revision: Optional[str] = DEFAULT_MODEL_REVISION):
+    """プロセス内で一度だけモデルをロードし、以降は同じインスタンスを返す"""
+    key = (model_name, revision, backend)
+    with _registry_lock:
+        if key not in _model_registry:
+            _model_registry[key] = _load_model(model_name, 'cpu', backend, revision)
+        return _model_registry[key]
 
-      model_name = 'distilbert-base-multilingual-cased'
+
+def clear_shared_models():
+    with _registry_lock:
+        _model_registry.clear()
+
+
+class EmbeddingCache(LRUCache):
+    """テキストのハッシュをキーにした埋め込みの上限付きLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        super().__init__(max_size)
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class TokenStats:
+    """エンコードしたテキストのトークン数の分布と、パディング・分割の状況（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lengths: Counter = Counter()
+        self.split_texts = 0
+        self.windows = 0
+        self.window_tokens = 0
+        self.padded_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, lengths: List[int], split_texts: int, windows: int, window_tokens: int, padded_tokens: int):
+        with self._lock:
+            self._lengths.update(lengths)
+            self.split_texts += split_texts
+            self.windows += windows
+            self.window_tokens += window_tokens
+            self.padded_tokens += padded_tokens
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            texts = sum(self._lengths.values())
+            tokens = sum(length * count for length, count in self._lengths.items())
+            summary = {
+                'texts': texts,
+                'tokens': tokens,
+                'mean': tokens / texts if texts else 0.0,
+                'split_texts': self.split_texts,
+                'windows': self.windows,
+                # 順伝播したトークンのうちパディングでないものの割合（1に近いほど無駄がない）
+                'padding_efficiency': self.window_tokens / self.padded_tokens if self.padded_tokens else 1.0
+            }
+            for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)):
+                summary[name] = self._percentile(q, texts)
+            return summary
+
+    def _percentile(self, q: float, total: int) -> int:
+        seen = 0
+        for length in sorted(self._lengths):
+            seen += self._lengths[length]
+            if seen >= q * total:
+                return length
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._lengths.clear()
+            self.split_texts = self.windows = self.window_tokens = self.padded_tokens = 0
+
+
+class SimpleEmbeddings:
+  def __init__(self, model_name: str = DEFAULT_MODEL_NAME, shared: bool = True,
+               batch_size: int = DEFAULT_BATCH_SIZE, cache_size: int = DEFAULT_CACHE_SIZE,
+               backend: str = DEFAULT_BACKEND, max_length: int = DEFAULT_MAX_LENGTH,
+               max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+               revision: Optional[str] = DEFAULT_MODEL_REVISION):
+      if backend not in BACKENDS:
+          raise ValueError(f"未対応のバックエンドです: {backend} (選択肢: {', '.join(BACKENDS)})")
 
       # デバイス設定を明示的に指定
-      self.device = torch.device('cpu')  # CPUを強制使用
+      self.device = 'cpu'  # CPUを強制使用
+      self.model_name = model_name
+      # 指定されたリビジョン（None なら任意）と、実際に読み込んだリビジョン
+      self.revision = revision
+      self.resolved_revision: Optional[str] = None
+      self.backend = backend
+      self.shared = shared
+      self.batch_size = batch_size
+      # モデルごとのトークン数の上限（読み込み時にモデル自体の上限でさらに制限する）
+      self.max_length = max_length
+      self.max_batch_tokens = max_batch_tokens
+      self.token_stats = TokenStats()
+
+      # モデルはここでは読み込まない（load() / start_loading() / 初回のエンコード時）
+      self.tokenizer = None
+      self.model = None
+      self.load_error: Optional[Exception] = None
+      self._load_lock = threading.Lock()
+      self._thread_lock = threading.Lock()
+      self._loading_thread: Optional[threading.Thread] = None
 
+      self.dimension = 768
+      # 採点時に繰り返しエンコードされるテキスト用（0で無効）
+      self.cache = EmbeddingCache(cache_size) if cache_size > 0 else None
+
+  @property
+  def is_ready(self) -> bool:
+      return self.model is not None
+
+  @property
+  def status(self) -> str:
+      """'ready'（読み込み済み） / 'loading'（読み込み中） / 'error'（失敗） / 'not_loaded'"""
+      if self.model is not None:
+          return 'ready'
+      if self._loading_thread is not None and self._loading_thread.is_alive():
+          return 'loading'
+      if self.load_error is not None:
+          return 'error'
+      return 'not_loaded'
+
+  def load(self):
+      """モデルを読み込む（読み込み済みなら何もしない、別スレッドで読み込み中なら完了を待つ）"""
+      if self.model is not None:
+          return
+
+      with self._load_lock:
+          if self.model is not None:
+              return
+          try:
+              if self.shared:
+                  # 全インスタンス・全セッションで同じ tokenizer / model を共有
+                  tokenizer, model, manifest = get_shared_model(self.model_name, self.backend, self.revision)
+              else:
+                  tokenizer, model, manifest = _load_model(self.model_name, self.device, self.backend,
+                                                           self.revision)
+              if manifest["dimension"] != self.dimension:
+                  raise ModelArtifactError(f"モデルの次元数が異なります: {manifest['dimension']} (想定: {self.dimension})")
+          except Exception as e:
+              self.load_error = e
+              raise
+
+          self.load_error = None
+          self.resolved_revision = manifest["revision"]
+          self.max_length = min(self.max_length, getattr(tokenizer, 'model_max_length', self.max_length))
+          self.tokenizer = tokenizer
+          # is_ready は model を見るので最後に設定する
+          self.model = model
+
+  def start_loading(self):
+      """バックグラウンドスレッドでモデルの読み込みを始め、すぐに戻る"""
+      if self.model is not None:
+          return
+      # 読み込み中の load() が持つ _load_lock とは別のロックで、スレッドの二重起動だけを防ぐ
+      with self._thread_lock:
+          if self._loading_thread is not None and self._loading_thread.is_alive():
+              return
+          self._loading_thread = threading.Thread(target=self._load_in_background,
+                                                  name="embedding-warm-up", daemon=True)
+          self._loading_thread.start()
+
+  def _load_in_background(self):
       try:
-          self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-          self.model = AutoModel.from_pretrained(
-              model_name,
-              torch_dtype=torch.float32,  # データ型を明示
-              device_map=None  # デバイスマップを無効化
-          )
+          self.load()
+      except Exception as e:
+          print(f"モデルの事前読み込みに失敗しました: {e}")
+
+  def model_identity(self, load: bool = True) -> Optional[Dict]:
+      """
+      埋め込みを作るモデルの識別情報 {name, revision, dimension}（ストアに記録して別モデルとの混在を防ぐ）
+      ローカルのアーティファクトがあればモデルを読み込まずに返す。load=False で不明なら None
+      """
+      revision = self.resolved_revision
+      if revision is None:
+          manifest = read_manifest(artifact_path(self.model_name))
+          if manifest is not None and self.revision in (None, manifest["revision"]):
+              revision = manifest["revision"]
+          elif load:
+              self.load()
+              revision = self.resolved_revision
+          else:
+              return None
+      return {'name': self.model_name, 'revision': revision, 'dimension': self.dimension}
+
+  def encode(self, texts: List[str], batch_size: Optional[int] = None, use_cache: bool = True,
+             max_batch_tokens: Optional[int] = None) -> np.ndarray:
+      if not texts:
+          return np.zeros((0, self.dimension), dtype=np.float32)
+
+      if not use_cache or self.cache is None:
+          return self._encode_batches(texts, batch_size, max_batch_tokens)[0]
+
+      embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+      # キャッシュにないテキストだけをまとめてエンコード（同じテキストは1回だけ）
+      missing: Dict[bytes, List[int]] = {}
+      for i, text in enumerate(texts):
+          key = self.cache.key(text)
+          cached = self.cache.get(key) if key not in missing else None
+          if cached is not None:
+              embeddings[i] = cached
+          else:
+              missing.setdefault(key, []).append(i)
+
+      # 同じ呼び出しで繰り返された未キャッシュのテキストも、それぞれミスとして数える
+      misses = sum(len(positions) for positions in missing.values())
+      metrics = get_metrics()
+      metrics.increment('embedding_cache_requests_total', len(texts) - misses, result='hit')
+      metrics.increment('embedding_cache_requests_total', misses, result='miss')
+      if missing:
+          keys = list(missing)
+          encoded, failed = self._encode_batches([texts[missing[key][0]] for key in keys], batch_size,
+                                                 max_batch_tokens)
+          for j, key in enumerate(keys):
+              embeddings[missing[key]] = encoded[j]
+              if j not in failed:
+                  self.cache.put(key, encoded[j].copy())
+
+      return embeddings
+
+  def cache_info(self) -> Dict[str, int]:
+      if self.cache is None:
+          return {'hits': 0, 'misses': 0, 'size': 0, 'max_size': 0}
+      return self.cache.info()
 
-          # モデルをCPUに移動
-          self.model = self.model.to(self.device)
-          self.model.eval()
+  def _encode_batches(self, texts: List[str], batch_size: Optional[int] = None,
+                      max_batch_tokens: Optional[int] = None):
+      # キャッシュにないテキストがある時だけ、モデルの読み込み完了を待つ
+      self.load()
+      batch_size = batch_size or self.batch_size
+      max_batch_tokens = max_batch_tokens or self.max_batch_tokens
+      embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
 
+      try:
+          windows, owners, text_lengths = self._split_windows(texts)
       except Exception as e:
-          print(f"モデルロードエラー: {e}")
-          # より軽量なモデルでリトライ
-          model_name = 'distilbert-base-uncased'
-          self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-          self.model = AutoModel.from_pretrained(model_name)
-          self.model = self.model.to(self.device)
-          self.model.eval()
+          print(f"エンコードエラー: {e}")
+          embeddings[:] = np.random.rand(len(texts), self.dimension)
+          return embeddings, set(range(len(texts)))
 
-      self.dimension = 768
-      print("✅ DistilBERT多言語モデル (768次元) をロードしました")
+      # トークン数の近いウィンドウ同士でバッチを組み、パディングの無駄を減らす
+      order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+      window_vectors = np.zeros((len(windows), self.dimension), dtype=np.float32)
+      failed = set()
+      padded_tokens = 0
+      metrics = get_metrics()
+
+      for indices in self._plan_batches(order, windows, batch_size, max_batch_tokens):
+          padded_tokens += len(indices) * len(windows[indices[-1]])
+          metrics.observe('embedding_encode_batch_size', len(indices))
+          try:
+              with metrics.timer('embedding_forward_seconds'):
+                  window_vectors[indices] = self._forward([windows[i] for i in indices])
+
+          except Exception as e:
+              print(f"エンコードエラー: {e}")
+              # エラー時はダミーベクトル（キャッシュには入れない）
+              window_vectors[indices] = np.random.rand(len(indices), self.dimension)
+              failed.update(int(owners[i]) for i in indices)
+
+      weights = np.array([len(window) for window in windows], dtype=np.float32)
+      if len(windows) == len(texts):
+          # 分割なし（ウィンドウとテキストが1対1）
+          embeddings = window_vectors
+      else:
+          # 分割したテキストはウィンドウのベクトルをトークン数で重み付けして平均する
+          np.add.at(embeddings, owners, window_vectors * weights[:, None])
+          totals = np.bincount(owners, weights=weights, minlength=len(texts))
+          embeddings /= totals[:, None].astype(np.float32)
+
+      self.token_stats.record(
+          text_lengths,
+          split_texts=int((np.bincount(owners, minlength=len(texts)) > 1).sum()),
+          windows=len(windows),
+          window_tokens=int(weights.sum()),
+          padded_tokens=padded_tokens
+      )
+      return embeddings, failed
+
+  def _split_windows(self, texts: List[str]):
+      """テキストを特殊トークン込みで max_length 以下のウィンドウ（トークンID列）に分ける"""
+      special = self.tokenizer.num_special_tokens_to_add(pair=False)
+      size = max(1, self.max_length - special)
+      token_ids = self.tokenizer(list(texts), add_special_tokens=False, truncation=False,
+                                 verbose=False)['input_ids']
+
+      windows, owners = [], []
+      text_lengths = [len(ids) + special for ids in token_ids]
+      for owner, ids in enumerate(token_ids):
+          # 長いテキストは切り捨てずに分割する（空のテキストも特殊トークンだけの1ウィンドウ）
+          for start in range(0, max(len(ids), 1), size):
+              windows.append(self.tokenizer.build_inputs_with_special_tokens(ids[start:start + size]))
+              owners.append(owner)
+      return windows, np.array(owners, dtype=np.int64), text_lengths
 
-  def encode(self, texts: List[str]) -> np.ndarray:
-      embeddings = []
+  def _plan_batches(self, order: List[int], windows: List[List[int]], batch_size: int, max_batch_tokens: int):
+      # 短い順に詰め、(件数 × バッチ内の最長) がトークン予算を超える手前で区切る
+      batch = []
+      for i in order:
+          if batch and (len(batch) >= batch_size or (len(batch) + 1) * len(windows[i]) > max_batch_tokens):
+              yield batch
+              batch = []
+          batch.append(i)
+      if batch:
+          yield batch
+
+  def _forward(self, windows: List[List[int]]) -> np.ndarray:
+      """1バッチ分の [CLS] ベクトルを返す（バッチ内の最長ウィンドウに合わせて動的にパディング）"""
+      longest = max(len(window) for window in windows)
+      input_ids = np.full((len(windows), longest), self.tokenizer.pad_token_id or 0, dtype=np.int64)
+      attention_mask = np.zeros((len(windows), longest), dtype=np.int64)
+      for row, window in enumerate(windows):
+          input_ids[row, :len(window)] = window
+          attention_mask[row, :len(window)] = 1
+      inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+      if self.backend == 'onnx':
+          return self.model.run(inputs)[:, 0, :]
+
+      import torch
+
+      # 入力もCPUに移動
+      inputs = {k: torch.from_numpy(v).to(self.device) for k, v in inputs.items()}
 
       with torch.no_grad():
-          for text in texts:
-              try:
-                  inputs = self.tokenizer(
-                      text,
-                      return_tensors='pt',
-                      truncation=True,
-                      max_length=512,
-                      padding=True
-                  )
-
-                  # 入力もCPUに移動
-                  inputs = {k: v.to(self.device) for k, v in inputs.items()}
-
-                  outputs = self.model(**inputs)
-                  embedding = outputs.last_hidden_state[:, 0, :].squeeze().cpu().numpy()
-                  embeddings.append(embedding)
-
-              except Exception as e:
-                  print(f"エンコードエラー: {e}")
-                  # エラー時はダミーベクトル
-                  embeddings.append(np.random.rand(self.dimension))
-
-      return np.array(embeddings)
+          outputs = self.model(**inputs)
+      return outputs.last_hidden_state[:, 0, :].cpu().numpy()
 
   def encode_single(self, text: str) -> List[float]:
       return self.encode([text])[0].tolist()
+
+
+_shared_embeddings = None
+
+
+def get_shared_embeddings() -> SimpleEmbeddings:
+    """ストア・クイズ・Streamlit セッション間で共有する埋め込みインスタンス"""
+    global _shared_embeddings
+    if _shared_embeddings is None:
+        # 競合しても中身のモデルはレジストリで共有されるため軽量
+        _shared_embeddings = SimpleEmbeddings()
+    return _shared_embeddings
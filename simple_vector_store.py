@@ -1,60 +1,559 @@
 """
 シンプルなベクトルストア（English Quiz System専用）
+
+保存形式（storage_path ディレクトリ内）:
+  - manifest.json / seg-*.bin / seg-*.jsonl : 追記専用のセグメント（segment_storage.py 参照）
+  - ivf_index.npz / ivf_assignments.bin     : 近似最近傍インデックス（ann_index=True の場合のみ）
+  - pq_codebooks.npz / pq_codes.bin         : 直積量子化した検索用の埋め込み（compression="pq" の場合のみ）
+  - dedup_hashes.bin                        : 重複検出用の本文のハッシュ・SimHash（dedup=True の場合のみ）
+旧形式の quiz_vector_store.json、および embeddings.bin + documents.json は
+初回読み込み時に自動で移行する（移行後の JSON は quiz_vector_store.json.migrated に名前を変えて残す）
 """
 import os
 import json
+import threading
 import numpy as np
-from typing import List, Dict
-from simple_embeddings import SimpleEmbeddings
+from collections import Counter
+from typing import List, Dict, Optional, Tuple, Union
+from simple_embeddings import SimpleEmbeddings, get_shared_embeddings
+from array_buffer import append_rows
+from ivf_index import IVFIndex
+from pq import ProductQuantizer, TRAIN_SAMPLES_PER_CENTROID
+from segment_storage import SegmentStorage, SegmentedMatrix, SegmentReferences
+from translation_pairs import parse_translation_pair
+from question_index import QuestionIndex
+from ingest import extract_english_sentences
+from document_table import DocumentTable, DocumentView, SearchResult, MISSING
+from metrics import get_metrics
+from dedup import DedupIndex, DEFAULT_MAX_DISTANCE, Fingerprint
+
+# 移行元の旧バイナリ形式（単一ファイル）
+LEGACY_EMBEDDINGS_FILE = "embeddings.bin"
+LEGACY_DOCUMENTS_FILE = "documents.json"
+# 移行済みの旧 JSON に付ける拡張子（保存先を消しても再び取り込まないように）
+MIGRATED_SUFFIX = ".migrated"
+ANN_INDEX_FILE = "ivf_index.npz"
+ANN_ASSIGNMENTS_FILE = "ivf_assignments.bin"
+# これより少ない件数では全件検索の方が速いので ANN インデックスを作らない
+ANN_MIN_DOCUMENTS = 10000
+SUPPORTED_DTYPES = ("float32", "float16")
+PQ_CODEBOOK_FILE = "pq_codebooks.npz"
+PQ_CODES_FILE = "pq_codes.bin"
+DEDUP_FILE = "dedup_hashes.bin"
+# 検索用にメモリへ置く行列の形式（None: float32 の正規化済み行列）
+COMPRESSION_MODES = (None, "float16", "pq")
+# これより少ない件数では PQ を学習せず、全件を厳密に比較する
+PQ_MIN_DOCUMENTS = 10000
+# float32 の一時コピーを行列全体分作らないよう、この行数ずつ処理する
+CHUNK_SIZE = 65536
+
+
+class ModelMismatchError(ValueError):
+    """保存済みの埋め込みと現在のエンコーダーのモデルが異なる"""
+
+
+def _normalize_rows(matrix: np.ndarray, dtype=np.float32) -> np.ndarray:
+    normalized = np.empty(matrix.shape, dtype=dtype)
+    for start in range(0, len(matrix), CHUNK_SIZE):
+        chunk = np.asarray(matrix[start:start + CHUNK_SIZE], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        # ノルム0のベクトルは類似度0として扱う
+        norms[norms == 0] = 1.0
+        normalized[start:start + len(chunk)] = chunk / norms
+    return normalized
+
+
+def _chunked_similarities(queries: np.ndarray, matrix: np.ndarray, normalize: bool = False) -> np.ndarray:
+    # float16 の行列や memmap を、チャンクごとに float32 にしてから積を取る
+    similarities = np.empty((len(queries), len(matrix)), dtype=np.float32)
+    for start in range(0, len(matrix), CHUNK_SIZE):
+        chunk = np.asarray(matrix[start:start + CHUNK_SIZE], dtype=np.float32)
+        if normalize:
+            chunk = _normalize_rows(chunk)
+        similarities[:, start:start + len(chunk)] = queries @ chunk.T
+    return similarities
+
+
+def _dedup_scope(source):
+    # 重複判定の範囲は出典ごと（dict などハッシュできない値は JSON 文字列で比較する）
+    if source is None or isinstance(source, (str, int, float, bool)):
+        return source
+    return json.dumps(source, sort_keys=True, ensure_ascii=False)
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    # 全件ソートせず argpartition で上位k件だけを取り出してから並べる
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
 
 class SimpleVectorStore:
-    def __init__(self, storage_path="quiz_vector_store.json"):
+    def __init__(self, storage_path="quiz_vector_store", encoder: Optional[SimpleEmbeddings] = None,
+                 embedding_dtype: str = "float32", ann_index: bool = False, ann_n_probe: int = 8,
+                 ann_min_documents: int = ANN_MIN_DOCUMENTS, compression: Optional[str] = None,
+                 pq_subvectors: Optional[int] = None, pq_min_documents: int = PQ_MIN_DOCUMENTS,
+                 rerank_factor: int = 10, dedup: bool = True,
+                 near_duplicate_distance: Optional[int] = DEFAULT_MAX_DISTANCE):
+        if embedding_dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"未対応の埋め込み型です: {embedding_dtype}")
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f"未対応の圧縮形式です: {compression}")
+        if compression == "pq" and ann_index:
+            raise ValueError("ann_index と compression='pq' は同時に使えません")
+
+        # 旧形式（.json）のパスが渡された場合は同名ディレクトリを保存先にする
+        if storage_path.endswith(".json"):
+            storage_path = storage_path[:-len(".json")]
         self.storage_path = storage_path
-        self.encoder = SimpleEmbeddings()
-        self.documents = []
+        self.legacy_json_path = storage_path + ".json"
+        self.embedding_dtype = embedding_dtype
+        self.use_ann_index = ann_index
+        self.ann_n_probe = ann_n_probe
+        self.ann_min_documents = ann_min_documents
+        self.ann_index: Optional[IVFIndex] = None
+        # 検索用の行列: float16 は正規化済み行列を半精度で、pq は番号だけを保持し、
+        # どちらも上位 n_results * rerank_factor 件を元の埋め込みで再計算して並べ替える
+        self.compression = compression
+        self.pq_subvectors = pq_subvectors
+        self.pq_min_documents = pq_min_documents
+        self.rerank_factor = rerank_factor
+        self.pq: Optional[ProductQuantizer] = None
+        # 取り込み時に、同じ出典の登録済みの本文は除き、別の出典の同じ本文・ほぼ重複は埋め込みを使い回す。
+        # 索引は最初の追加時に作る（起動時には読み込まない）
+        self.dedup = dedup
+        self.near_duplicate_distance = near_duplicate_distance
+        self._dedup_index: Optional[DedupIndex] = None
+
+        # エンコーダーはプロセス内で共有（複数ストア・複数セッションでもモデルは1つ）
+        self.encoder = encoder if encoder is not None else get_shared_embeddings()
+        self.storage = SegmentStorage(storage_path, self.encoder.dimension, embedding_dtype)
+        # id・本文・メタデータは列ごとにまとめて保持（1件ごとの dict は持たない）
+        self.documents = DocumentTable()
+        # 埋め込みはセグメントごとの memmap のまま参照する（メモリに読み込むのは参照した行だけ）。
+        # 検索用の正規化済み行列は余裕を持たせたバッファの先頭を使う
+        self.embeddings = self._empty_embeddings()
+        # 対訳ドキュメントの和訳（JP行）の埋め込み。採点時に再エンコードしないよう取り込み時に計算
+        self.reference_embeddings = self._empty_references()
+        self._row_by_id: Dict[str, int] = {}
+        # 出題・正解検索用の解析済みインデックス（読み込み時に構築し、追加時に更新）
+        self.question_index = QuestionIndex()
+        self._normalized = self._normalized_buffer = None
+        self._model_checked = False
+        # Streamlit の複数セッションから同時に追加されても壊れないように
+        self._lock = threading.RLock()
         self.load_documents()
         print(f"ベクトルストアを初期化しました (保存先: {self.storage_path})")
 
-    def add_documents(self, documents: List[Dict[str, str]]):
-        for doc in documents:
-            embedding = self.encoder.encode_single(doc["text"])
+    @property
+    def ann_index_path(self):
+        return os.path.join(self.storage_path, ANN_INDEX_FILE)
 
-            doc_with_embedding = {
-                "id": doc["id"],
-                "text": doc["text"],
-                "metadata": doc.get("metadata", {}),
-                "embedding": embedding
-            }
+    @property
+    def ann_assignments_path(self):
+        return os.path.join(self.storage_path, ANN_ASSIGNMENTS_FILE)
+
+    @property
+    def pq_codebook_path(self):
+        return os.path.join(self.storage_path, PQ_CODEBOOK_FILE)
+
+    @property
+    def pq_codes_path(self):
+        return os.path.join(self.storage_path, PQ_CODES_FILE)
+
+    @property
+    def dedup_path(self):
+        return os.path.join(self.storage_path, DEDUP_FILE)
+
+    @property
+    def _search_dtype(self):
+        return np.float16 if self.compression == "float16" else np.float32
 
-            self.documents.append(doc_with_embedding)
+    def _empty_embeddings(self) -> SegmentedMatrix:
+        return SegmentedMatrix([], self.encoder.dimension, self.embedding_dtype)
 
-        self.save_documents()
-        print(f"{len(documents)}件のドキュメントを追加しました")
+    def _empty_references(self) -> SegmentReferences:
+        return SegmentReferences([], [], self.encoder.dimension, self.embedding_dtype)
 
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        if not self.documents:
-            return []
+    def _open_embeddings(self):
+        # 追加・コンパクション後のセグメントを開き直す（ファイルの内容はコピーしない）
+        self.embeddings = self.storage.open_embeddings()
+        self.reference_embeddings = self.storage.open_references()
 
-        query_embedding = self.encoder.encode_single(query)
+    def add_documents(self, documents: List[Dict[str, str]], batch_size: Optional[int] = None) -> int:
+        """ドキュメントを追加し、追加した件数を返す（同じ出典の重複として除いた分は含まない）"""
+        if not documents:
+            return 0
+
+        with self._lock:
+            fingerprints = None
+            reuse: List[Optional[Tuple[str, str, int]]] = [None] * len(documents)
+            if self.dedup:
+                documents, fingerprints, reuse = self._plan_duplicates(documents)
+                if not documents:
+                    return 0
+
+            texts = [doc["text"] for doc in documents]
+            pairs = [parse_translation_pair(text) for text in texts]
+            encode_rows = [i for i, match in enumerate(reuse) if match is None]
+            reference_rows = self._references_to_encode(pairs, reuse)
 
-        results = []
-        for doc in self.documents:
-            similarity = self.cosine_similarity(query_embedding, doc["embedding"])
+            # 本文と和訳をまとめて1回のバッチエンコードにする（1件ずつではなく）
+            embeddings = np.zeros((len(texts), self.encoder.dimension), dtype=np.float32)
+            references = np.zeros_like(embeddings)
+            if encode_rows or reference_rows:
+                encoded = self.encoder.encode([texts[i] for i in encode_rows] + [pairs[i][1] for i in reference_rows],
+                                              batch_size=batch_size, use_cache=False)
+                self._check_model()
+                embeddings[encode_rows] = encoded[:len(encode_rows)]
+                references[reference_rows] = encoded[len(encode_rows):]
+            self._reuse_embeddings(reuse, embeddings, references, set(reference_rows))
 
-            results.append({
+            new_documents = [{
                 "id": doc["id"],
                 "text": doc["text"],
-                "metadata": doc["metadata"],
-                "distance": 1 - similarity
-            })
+                "metadata": doc.get("metadata", {})
+            } for doc in documents]
+
+            # 追加分だけを新しいセグメントとして書き込む（コミット後にメモリへ反映）
+            try:
+                self.storage.append(new_documents, embeddings, references)
+            except Exception as e:
+                print(f"保存エラー: {e}")
+                raise
+
+            used = len(self.documents)
+            self.documents.extend(new_documents)
+            for row, doc in enumerate(new_documents, start=used):
+                self._row_by_id[doc["id"]] = row
+            # 対訳形式でないドキュメントの英文は、出題時ではなく取り込み時に抽出しておく
+            self.question_index.add(new_documents, used, pairs, extract_sentences=extract_english_sentences)
+            self._open_embeddings()
+
+            normalized = _normalize_rows(embeddings)
+            if self._normalized is not None:
+                self._normalized_buffer = append_rows(self._normalized_buffer, used, normalized)
+                self._normalized = self._normalized_buffer[:len(self.documents)]
+
+            self._update_ann_index(normalized)
+            self._update_pq(normalized)
+            if fingerprints is not None:
+                for row, (fingerprint, doc) in enumerate(zip(fingerprints, new_documents), start=used):
+                    self._dedup_index.add(row, fingerprint, _dedup_scope(doc["metadata"].get("source")))
+                DedupIndex.append(self.dedup_path, fingerprints)
+        reused = len(documents) - len(encode_rows)
+        print(f"{len(documents)}件のドキュメントを追加しました" +
+              (f"（うち{reused}件は登録済みの埋め込みを再利用）" if reused else ""))
+        return len(documents)
+
+    def _get_dedup_index(self) -> DedupIndex:
+        if self._dedup_index is None:
+            self._dedup_index = DedupIndex.load(self.dedup_path, self.documents.texts, self._dedup_scopes(),
+                                                max_distance=self.near_duplicate_distance)
+        return self._dedup_index
+
+    def _dedup_scopes(self) -> List:
+        """行ごとの重複判定の範囲（メタデータの source。ない行は None）"""
+        metadata = self.documents.metadata
+        if "source" not in metadata.codes:
+            return [None] * len(self.documents)
+        scopes = [_dedup_scope(value) for value in metadata.values["source"]]
+        return [scopes[code] if code != MISSING else None for code in metadata.codes["source"]]
+
+    def _plan_duplicates(self, documents: List[Dict]) -> Tuple[List[Dict], List[Fingerprint],
+                                                                List[Optional[Tuple[str, str, int]]]]:
+        """同じ出典の重複（完全一致）を除いたドキュメント、その指紋（ハッシュ）、
+        埋め込みを使い回す元（(種類, 'store' または 'batch', 行番号・位置)、エンコードするなら None）を返す。
+        別の出典の同じ本文・ほぼ重複の本文は、ドキュメントとしては登録する（出典での絞り込みや本文の違いを失わない）"""
+        index = self._get_dedup_index()
+        # 同じ呼び出しの中の重複は、この呼び出しだけの索引で調べる（登録が失敗しても本体の索引は変わらない）
+        pending = DedupIndex(index.max_distance, index.min_chars)
+        kept, fingerprints, reuse = [], [], []
+        skipped, reused = Counter(), Counter()
+        for doc in documents:
+            scope = _dedup_scope((doc.get("metadata") or {}).get("source"))
+            fingerprint = index.fingerprint(doc["text"])
+            stored, batch = index.find(fingerprint, scope), pending.find(fingerprint, scope)
+            if (stored and stored[0] == 'exact') or (batch and batch[0] == 'exact'):
+                skipped['exact'] += 1
+                continue
+            if stored:
+                reuse.append((stored[0], 'store', stored[1]))
+            elif batch:
+                reuse.append((batch[0], 'batch', batch[1]))
+            else:
+                reuse.append(None)
+            if reuse[-1]:
+                reused[reuse[-1][0]] += 1
+            pending.add(len(kept), fingerprint, scope)
+            kept.append(doc)
+            fingerprints.append(fingerprint)
+
+        metrics = get_metrics()
+        for kind, count in reused.items():
+            metrics.increment('vector_store_embeddings_reused_total', count, kind=kind)
+        if skipped:
+            metrics.increment('vector_store_duplicates_skipped_total', skipped['exact'], kind='exact')
+            print(f"同じ出典の重複のため{skipped['exact']}件をスキップしました")
+        return kept, fingerprints, reuse
+
+    def _references_to_encode(self, pairs: List, reuse: List[Optional[Tuple[str, str, int]]]) -> List[int]:
+        """和訳をエンコードする対訳の位置（本文が同じ 'shared' で、写す元に和訳の埋め込みがあるものは除く）"""
+        rows = []
+        available = [False] * len(pairs)
+        for i, pair in enumerate(pairs):
+            if not pair:
+                continue
+            match = reuse[i]
+            if match is not None and match[0] == 'shared':
+                _, origin, position = match
+                available[i] = (self._reference_vector(position) is not None if origin == 'store'
+                                else available[position])
+            if not available[i]:
+                rows.append(i)
+                available[i] = True
+        return rows
+
+    def _reuse_embeddings(self, reuse: List[Optional[Tuple[str, str, int]]], embeddings: np.ndarray,
+                          references: np.ndarray, encoded_references: set):
+        """重複の埋め込み（本文が同じなら和訳の埋め込みも）を、登録済みの行・同じ呼び出しの前の位置から写す"""
+        for i, match in enumerate(reuse):
+            if match is None:
+                continue
+            kind, origin, position = match
+            copy_reference = kind == 'shared' and i not in encoded_references
+            if origin == 'store':
+                embeddings[i] = self.embeddings[position]
+                if copy_reference:
+                    references[i] = self._reference_vector(position)
+            else:
+                # 同じ呼び出しの前の位置（エンコード済み・写し済み）
+                embeddings[i] = embeddings[position]
+                if copy_reference:
+                    references[i] = references[position]
+
+    def search(self, query: Union[str, List[str]], n_results: int = 5,
+               n_probe: Optional[int] = None, where: Optional[Dict] = None) -> Union[List[Dict], List[List[Dict]]]:
+        # 文字列1件なら結果リスト、リストで渡した場合はクエリごとの結果リストを返す
+        # where でメタデータの条件を指定すると該当ドキュメントだけを検索する（document_table.py 参照）
+        single = isinstance(query, str)
+        queries = [query] if single else list(query)
+
+        if not self.documents or not queries:
+            return [] if single else [[] for _ in queries]
+
+        query_embeddings = self.encoder.encode(queries)
+        self._check_model()
+        results = self.search_by_vectors(query_embeddings, n_results, n_probe=n_probe, where=where)
+
+        return results[0] if single else results
+
+    def search_by_vectors(self, query_embeddings: np.ndarray, n_results: int = 5,
+                          n_probe: Optional[int] = None, exact: bool = False,
+                          where: Optional[Dict] = None) -> List[List[Dict]]:
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if not self.documents or n_results <= 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        queries = _normalize_rows(query_embeddings)
 
-        results.sort(key=lambda x: x["distance"])
+        if where:
+            # 事前フィルタ: 転置インデックスで行を絞ってから、その行だけを厳密に比較する
+            rows = self.documents.rows_where(where)
+            get_metrics().observe('vector_store_rows_scanned', len(rows), mode='filtered')
+            return self._search_rows(queries, rows, n_results)
 
-        return results[:n_results]
+        if self.compression == "pq":
+            if self.pq is not None and not exact:
+                # 番号の表引き（ADC）で候補を絞り、元の埋め込みで再ランクする
+                candidates = self.pq.search(queries, n_results * self.rerank_factor)
+                return [self._rerank(query, rows, n_results) for query, rows in zip(queries, candidates)]
+            # 学習前（少数）または厳密検索: 正規化済み行列を持たず、埋め込みを少しずつ正規化して比較
+            get_metrics().observe('vector_store_rows_scanned', len(self.documents), mode='exact')
+            similarities = _chunked_similarities(queries, self.embeddings, normalize=True)
+            top_indices = _top_k_indices(similarities, n_results)
+            return [[self._make_result(i, row[i]) for i in indices]
+                    for row, indices in zip(similarities, top_indices)]
+
+        matrix = self._get_normalized_embeddings()
+
+        if self.ann_index is not None and not exact:
+            # 近似検索: n_probe 個のクラスタ内だけを比較（n_probe で再現率と速度を調整）
+            indices, scores = self.ann_index.search(queries, matrix, n_results,
+                                                    n_probe=n_probe or self.ann_n_probe)
+            return [[self._make_result(i, score) for i, score in zip(row_indices, row_scores)]
+                    for row_indices, row_scores in zip(indices, scores)]
+
+        get_metrics().observe('vector_store_rows_scanned', len(self.documents), mode=self.compression or 'exact')
+        if self.compression == "float16":
+            similarities = _chunked_similarities(queries, matrix)
+            candidates = _top_k_indices(similarities, n_results * self.rerank_factor)
+            return [self._rerank(query, rows, n_results) for query, rows in zip(queries, candidates)]
+
+        # 正規化済み行列との積1回で全ドキュメントのコサイン類似度を計算
+        similarities = queries @ matrix.T
+        top_indices = _top_k_indices(similarities, n_results)
+
+        return [[self._make_result(i, row[i]) for i in indices]
+                for row, indices in zip(similarities, top_indices)]
+
+    def _search_rows(self, queries: np.ndarray, rows: np.ndarray, n_results: int) -> List[List[Dict]]:
+        """指定した行だけを比較する（計算量は全件数ではなく行数に比例）"""
+        if len(rows) == 0:
+            return [[] for _ in range(len(queries))]
+        if self.compression == "pq":
+            vectors = _normalize_rows(self.embeddings[rows])
+        else:
+            vectors = np.asarray(self._get_normalized_embeddings()[rows], dtype=np.float32)
+
+        similarities = queries @ vectors.T
+        top_indices = _top_k_indices(similarities, n_results)
+        return [[self._make_result(rows[i], row[i]) for i in indices]
+                for row, indices in zip(similarities, top_indices)]
+
+    def _rerank(self, query: np.ndarray, rows: np.ndarray, n_results: int) -> List[Dict]:
+        """候補の行だけ元の埋め込みでコサイン類似度を計算し直し、上位 n_results 件を返す"""
+        # memmap は行番号順に読む方が速い
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        scores = _normalize_rows(self.embeddings[rows]) @ query
+        order = np.argsort(-scores, kind='stable')[:n_results]
+        return [self._make_result(rows[i], scores[i]) for i in order]
+
+    def _make_result(self, index: int, similarity: float) -> SearchResult:
+        # 本文などはコピーせず、参照された時に表から取り出すビューを返す
+        return SearchResult(self.documents, int(index), float(1 - similarity))
+
+    def get_row(self, doc_id: str) -> Optional[int]:
+        return self._row_by_id.get(doc_id)
+
+    def get_reference_embedding(self, doc_id: str, japanese: str) -> Optional[np.ndarray]:
+        """対訳ドキュメントの和訳 japanese の埋め込み（取り込み時に計算済み）。
+        なければ、または保存されている和訳と違う（正解を差し替えた問題など）場合は None"""
+        self._check_model()
+        row = self._row_by_id.get(doc_id)
+        if row is None or not self.question_index.is_reference(row, japanese):
+            return None
+        return self._reference_vector(row)
+
+    def _reference_vector(self, row: int) -> Optional[np.ndarray]:
+        vector = self.reference_embeddings.get(row)
+        # 対訳でない、または和訳埋め込み導入前のデータ
+        if vector is None:
+            return None
+        return np.asarray(vector, dtype=np.float32)
+
+    def _check_model(self, load: bool = True):
+        """保存済みの埋め込みと現在のエンコーダーが同じモデルか確認する（違えば ModelMismatchError）"""
+        if self._model_checked:
+            return
+        identity = self.encoder.model_identity(load=load)
+        if identity is None:
+            return
+
+        stored = self.storage.model
+        if stored is None:
+            # 新規ストア・モデル記録の導入前のストアは現在のモデルを記録する（次の書き込みで保存）
+            self.storage.model = identity
+        elif stored != identity:
+            raise ModelMismatchError(
+                f"このベクトルストアは別のモデルの埋め込みです: {stored['name']}@{stored['revision']} "
+                f"(現在: {identity['name']}@{identity['revision']})。"
+                f"同じモデルを使うか、ストアを作り直してください"
+            )
+        self._model_checked = True
+
+    def build_ann_index(self, n_lists: Optional[int] = None):
+        """現在の全ドキュメントで ANN インデックスを（再）学習して保存する"""
+        with self._lock:
+            if not self.documents:
+                return
+            index = IVFIndex(n_lists=n_lists, n_probe=self.ann_n_probe)
+            index.train(self._get_normalized_embeddings())
+            self.ann_index = index
+            self.ann_index.save(self.ann_index_path, self.ann_assignments_path)
+        print(f"ANNインデックスを構築しました ({index.n_lists}クラスタ)")
+
+    def _update_ann_index(self, normalized: np.ndarray):
+        if not self.use_ann_index:
+            return
+        if self.ann_index is None:
+            if len(self.documents) >= self.ann_min_documents:
+                self.build_ann_index()
+            return
+        # 学習済みなら新しい行を最寄りのクラスタに追加し、割り当てだけ追記する
+        labels = self.ann_index.add(normalized)
+        self.ann_index.append_assignments(self.ann_assignments_path, labels)
+
+    def _load_ann_index(self):
+        if not self.use_ann_index:
+            return
+        if os.path.exists(self.ann_index_path):
+            index = IVFIndex.load(self.ann_index_path, self.ann_assignments_path, len(self.documents))
+            if len(index) < len(self.documents):
+                # 割り当ての追記前に終了していた分を補う
+                labels = index.add(self._get_normalized_embeddings()[len(index):])
+                index.append_assignments(self.ann_assignments_path, labels)
+            self.ann_index = index
+            return
+        if len(self.documents) >= self.ann_min_documents:
+            self.build_ann_index()
+
+    def build_pq(self, n_subvectors: Optional[int] = None):
+        """現在の全ドキュメントで直積量子化を（再）学習し、全件を符号化して保存する"""
+        with self._lock:
+            if not self.documents:
+                return
+            pq = ProductQuantizer(n_subvectors=n_subvectors or self.pq_subvectors)
+            n = len(self.embeddings)
+            rng = np.random.default_rng(0)
+            sample_size = min(n, pq.n_centroids * TRAIN_SAMPLES_PER_CENTROID)
+            sample_rows = np.sort(rng.choice(n, sample_size, replace=False))
+
+            pq.train(_normalize_rows(self.embeddings[sample_rows]))
+            for start in range(0, n, CHUNK_SIZE):
+                pq.add(_normalize_rows(self.embeddings[start:start + CHUNK_SIZE]))
+            self.pq = pq
+            self.pq.save(self.pq_codebook_path, self.pq_codes_path)
+        print(f"直積量子化を学習しました ({pq.n_subvectors}バイト/件)")
+
+    def _update_pq(self, normalized: np.ndarray):
+        if self.compression != "pq":
+            return
+        if self.pq is None:
+            if len(self.documents) >= self.pq_min_documents:
+                self.build_pq()
+            return
+        codes = self.pq.add(normalized)
+        self.pq.append_codes(self.pq_codes_path, codes)
+
+    def _load_pq(self):
+        if self.compression != "pq":
+            return
+        if os.path.exists(self.pq_codebook_path):
+            pq = ProductQuantizer.load(self.pq_codebook_path, self.pq_codes_path, len(self.documents))
+            if len(pq) < len(self.documents):
+                # 番号の追記前に終了していた分を補う
+                codes = pq.add(_normalize_rows(self.embeddings[len(pq):]))
+                pq.append_codes(self.pq_codes_path, codes)
+            self.pq = pq
+            return
+        if len(self.documents) >= self.pq_min_documents:
+            self.build_pq()
+
+    def _get_normalized_embeddings(self) -> np.ndarray:
+        with self._lock:
+            if self._normalized is None or len(self._normalized) != len(self.embeddings):
+                self._normalized = self._normalized_buffer = _normalize_rows(self.embeddings, self._search_dtype)
+            return self._normalized
 
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
+        vec1 = np.array(vec1, dtype=np.float32)
+        vec2 = np.array(vec2, dtype=np.float32)
 
         dot_product = np.dot(vec1, vec2)
         norm1 = np.linalg.norm(vec1)
@@ -65,34 +564,129 @@ class SimpleVectorStore:
 
         return dot_product / (norm1 * norm2)
 
-    def get_all_documents(self) -> List[Dict]:
-        return [{
-            "id": doc["id"],
-            "text": doc["text"],
-            "metadata": doc["metadata"]
-        } for doc in self.documents]
+    def get_metadata_values(self, key: str) -> List:
+        """メタデータのキーが取る値の一覧（出典の選択肢など）"""
+        return list(self.documents.metadata.values.get(key, []))
+
+    def count_documents(self, where: Optional[Dict] = None) -> int:
+        if not where:
+            return len(self.documents)
+        return len(self.documents.rows_where(where))
+
+    def get_all_documents(self) -> List[DocumentView]:
+        """全ドキュメントの読み取り専用ビュー（dict が必要なら view.to_dict()）"""
+        return list(self.documents)
 
     def save_documents(self):
-        try:
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.documents, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存エラー: {e}")
+        """全データを1セグメントに書き直す（通常の追加では不要）"""
+        with self._lock:
+            try:
+                self.storage.write_all(self.documents.to_records(), self.embeddings, self.reference_embeddings)
+                self._open_embeddings()
+            except Exception as e:
+                print(f"保存エラー: {e}")
+
+    def compact(self):
+        with self._lock:
+            self.storage.compact()
+            self._open_embeddings()
 
     def load_documents(self):
+        self._normalized = self._normalized_buffer = None
+        self.ann_index = None
+        self.pq = None
+        self._dedup_index = None
+        self._model_checked = False
         try:
-            if os.path.exists(self.storage_path):
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    self.documents = json.load(f)
+            if self.storage.exists():
+                documents, self.embeddings, self.reference_embeddings = self.storage.load()
+                self.documents = DocumentTable.from_records(documents)
+                self.embedding_dtype = self.storage.dtype
+                self._rebuild_lookups()
                 print(f"{len(self.documents)}件のドキュメントを読み込みました")
+                self._load_ann_index()
+                self._load_pq()
+            elif os.path.exists(os.path.join(self.storage_path, LEGACY_DOCUMENTS_FILE)):
+                self.migrate_legacy_binary()
+            elif os.path.exists(self.legacy_json_path):
+                self.migrate_legacy_json()
             else:
                 print("新規ベクトルストアを作成します")
         except Exception as e:
             print(f"読み込みエラー: {e}")
-            self.documents = []
+            self.documents = DocumentTable()
+            self.embeddings = self._empty_embeddings()
+            self.reference_embeddings = self._empty_references()
+            self._rebuild_lookups()
+
+        # モデルを読み込まずに分かる場合だけ起動時に確認する（分からなければ初回のエンコード時）
+        self._check_model(load=False)
+
+    def _rebuild_lookups(self):
+        self._row_by_id = {doc_id: row for row, doc_id in enumerate(self.documents.ids)}
+        self.question_index = QuestionIndex()
+        self.question_index.add(self.documents)
+
+    def migrate_legacy_json(self):
+        print(f"旧形式のデータを移行します: {self.legacy_json_path}")
+
+        with open(self.legacy_json_path, 'r', encoding='utf-8') as f:
+            legacy_documents = json.load(f)
+
+        documents = [{
+            "id": doc["id"],
+            "text": doc["text"],
+            "metadata": doc.get("metadata", {})
+        } for doc in legacy_documents]
+
+        embeddings = self._empty_embeddings()
+        if legacy_documents:
+            embeddings = np.array([doc["embedding"] for doc in legacy_documents], dtype=self.embedding_dtype)
+
+        self._finish_migration(documents, embeddings)
+        # 保存先が消えたりマニフェストが失われたりしても再び取り込まないよう、名前を変えてバックアップとして残す
+        os.replace(self.legacy_json_path, self.legacy_json_path + MIGRATED_SUFFIX)
+
+    def migrate_legacy_binary(self):
+        documents_path = os.path.join(self.storage_path, LEGACY_DOCUMENTS_FILE)
+        embeddings_path = os.path.join(self.storage_path, LEGACY_EMBEDDINGS_FILE)
+        print(f"旧バイナリ形式のデータを移行します: {documents_path}")
+
+        with open(documents_path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+
+        self.embedding_dtype = self.storage.dtype = header["dtype"]
+        embeddings = np.fromfile(embeddings_path, dtype=header["dtype"]).reshape(header["count"], header["dimension"])
+        self._finish_migration(header["documents"], embeddings)
+
+        os.remove(documents_path)
+        os.remove(embeddings_path)
+
+    def _finish_migration(self, documents: List[Dict], embeddings: np.ndarray):
+        self.documents = DocumentTable.from_records(documents)
+        self._rebuild_lookups()
+        # 旧形式には和訳の埋め込みがないため、採点時にエンコード（キャッシュ）する。
+        # 書き込みに失敗した場合は移行元を残したまま例外にする（save_documents はエラーを表示するだけ）
+        self.storage.write_all(self.documents.to_records(), embeddings)
+        self._open_embeddings()
+        self._load_ann_index()
+        self._load_pq()
+        print(f"{len(self.documents)}件のドキュメントを移行しました")
 
     def delete_collection(self):
-        self.documents = []
-        if os.path.exists(self.storage_path):
-            os.remove(self.storage_path)
-        print("コレクションを削除しました")
\ No newline at end of file
+        with self._lock:
+            self.documents = DocumentTable()
+            self.embeddings = self._empty_embeddings()
+            self.reference_embeddings = self._empty_references()
+            self._rebuild_lookups()
+            self._normalized = self._normalized_buffer = None
+            self.ann_index = None
+            self.pq = None
+            self._dedup_index = None
+            self.storage.delete()
+            self._model_checked = False
+            for path in (self.ann_index_path, self.ann_assignments_path, self.pq_codebook_path,
+                         self.pq_codes_path, self.dedup_path, self.legacy_json_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        print("コレクションを削除しました")
@@ -9,6 +9,9 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from english_quiz_system import EnglishQuizSystem
+from simple_vector_store import SimpleVectorStore
+from scoring_service import BackgroundScoringService
+from metrics import get_metrics
 
 st.set_page_config(
     page_title="English Quiz System",
@@ -16,8 +19,22 @@ st.set_page_config(
     layout="wide"
 )
 
+
+@st.cache_resource
+def get_shared_vector_store():
+    # ベクトルストアとモデルはプロセス内の全セッションで共有する
+    # （モデルは EnglishQuizSystem がバックグラウンドで読み込むので、ここではすぐに戻る）
+    return SimpleVectorStore()
+
+
+@st.cache_resource
+def get_scoring_service():
+    # 全セッションの採点要求を数ミリ秒ごとにまとめ、1回のバッチエンコードで採点する
+    return BackgroundScoringService(EnglishQuizSystem(vector_store=get_shared_vector_store()))
+
+
 if 'quiz_system' not in st.session_state:
-    st.session_state.quiz_system = EnglishQuizSystem()
+    st.session_state.quiz_system = EnglishQuizSystem(vector_store=get_shared_vector_store())
     st.session_state.current_question = None
     st.session_state.user_answer = ""
     st.session_state.result = None
@@ -30,7 +47,7 @@ if not st.session_state.setup_complete and len(quiz.vector_store.documents) == 0
     with st.spinner('初回セットアップ中...サンプルデータを作成しています...'):
         try:
             from create_sample_data import create_sample_data
-            create_sample_data()
+            create_sample_data(quiz.vector_store)
             st.session_state.setup_complete = True
             st.rerun()
         except Exception as e:
@@ -44,6 +61,25 @@ st.sidebar.header("📊 システム情報")
 doc_count = len(quiz.vector_store.documents)
 st.sidebar.metric("📚 利用可能なドキュメント数", doc_count)
 
+# 出題範囲（教材ごと）。メタデータの転置インデックスで絞り込む
+sources = sorted(quiz.vector_store.get_metadata_values('source'), key=str)
+selected_source = st.sidebar.selectbox(
+    "📂 出題範囲",
+    ["すべて"] + sources,
+    format_func=lambda source: source if source == "すべて" else os.path.basename(source)
+)
+question_filter = None if selected_source == "すべて" else {"source": selected_source}
+if question_filter:
+    st.sidebar.caption(f"{quiz.vector_store.count_documents(question_filter)}件のドキュメントから出題")
+
+model_status = quiz.embeddings.status
+if model_status == 'ready':
+    st.sidebar.success("🧠 AIモデル: 準備完了")
+elif model_status == 'error':
+    st.sidebar.error(f"🧠 AIモデル: 読み込みエラー ({quiz.embeddings.load_error})")
+else:
+    st.sidebar.info("🧠 AIモデル: 読み込み中...（問題にはすぐに回答できます）")
+
 if doc_count == 0:
     st.error("⚠️ データの読み込みに失敗しました。ページをリロードしてください。")
     st.stop()
@@ -68,13 +104,23 @@ if st.sidebar.button("🔄 統計をリセット"):
     st.session_state.quiz_system.score_history = []
     st.rerun()
 
+# QUIZ_METRICS=1 で起動した時だけ、採点の段階ごとの所要時間（全セッションの合計）を表示する
+metrics = get_metrics()
+if metrics.enabled:
+    with st.sidebar.expander("⏱️ 採点の計測"):
+        stages = metrics.snapshot()['histograms'].get('quiz_stage_seconds', [])
+        for stage in stages:
+            st.write(f"**{stage['labels'].get('stage')}**: {stage['count']}回, "
+                     f"平均 {stage['mean'] * 1000:.1f}ms, p99 ≦ {stage['p99'] * 1000:.1f}ms")
+        st.download_button("Prometheus 形式で保存", metrics.to_prometheus(), file_name="quiz_metrics.prom")
+
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.header("📖 問題")
 
     if st.session_state.current_question is None or st.button("🎲 新しい問題を出題", type="primary"):
-        st.session_state.current_question = quiz.get_random_english_question()
+        st.session_state.current_question = quiz.get_random_english_question(where=question_filter)
         st.session_state.user_answer = ""
         st.session_state.result = None
         st.session_state.show_result = False
@@ -106,16 +152,17 @@ with col1:
 
         with col_btn1:
             if st.button("📝 採点する", type="primary", disabled=not user_answer.strip()):
-                st.session_state.result = quiz.score_translation(
-                    user_answer,
-                    current_question=question
-                )
+                spinner_text = '採点中...' if quiz.is_ready else 'AIモデルを読み込み中です（初回は数分かかります）...'
+                with st.spinner(spinner_text):
+                    result = get_scoring_service().score(dict(question, answer=user_answer))
+                quiz.score_history.append(result)
+                st.session_state.result = result
                 st.session_state.show_result = True
                 st.rerun()
 
         with col_btn2:
             if st.button("⏭️ スキップ"):
-                st.session_state.current_question = quiz.get_random_english_question()
+                st.session_state.current_question = quiz.get_random_english_question(where=question_filter)
                 st.session_state.user_answer = ""
                 st.session_state.result = None
                 st.session_state.show_result = False
@@ -296,7 +343,7 @@ if st.session_state.show_result and st.session_state.result:
                         st.code(details['normalized_reference'], language="text")
 
                 st.divider()
-                st.info("💡 **採点方法:** 句読点とスペースを除去した後、文字列の類似度を計算しています。SequenceMatcher（Python標準ライブラリ）を使用して、一致する部分と異なる部分を検出し、全体の類似度を0-1のスコアで算出します。")
+                st.info("💡 **採点方法:** 句読点とスペースを除去した後、文字列の類似度を計算しています。最長共通部分列（一致する文字を順番どおりに最も多く取った並び）で一致する部分と異なる部分を検出し、全体の類似度を0-1のスコアで算出します。類似度は SequenceMatcher（Python標準ライブラリ）と同じ値です。")
 
 st.divider()
 
@@ -0,0 +1,207 @@
+"""
+文字列類似度
+
+採点に使う類似度（ratio / batch_ratios / compare の ratio）は difflib.SequenceMatcher.ratio と同じ値。
+差分表示の区間と類似度の上限は、ビット並列アルゴリズム（Hyyrö）で求めた最長共通部分列（LCS）を使う。
+  - ratio        : SequenceMatcher(None, a, b).ratio()
+  - batch_ratios : ratio をまとめて計算する（同じ正解の組では正解側の解析を使い回す）
+  - compare      : ratio と、SequenceMatcher.get_opcodes と同じ形式 (tag, i1, i2, j1, j2) の LCS の差分区間
+  - lcs_ratio / batch_lcs_ratios : 2 * LCS / (len(a) + len(b))。LCS は SequenceMatcher の一致数以上なので
+    ratio の上限になる（一括計算は NumPy でベクトル化）
+LCS は a の各文字位置を1ビットに対応させ、b の1文字ごとに整数演算数回で DP の1列を更新するので
+計算量は O(len(b) * len(a) / 64)。autojunk のような経験則もないため、長い文でも差分が安定する。
+"""
+from difflib import SequenceMatcher
+import numpy as np
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+# batch_ratios で一度に処理する組の数（比較用の一時配列の大きさを抑える）
+BATCH_CHUNK_SIZE = 256
+
+
+class Comparison(NamedTuple):
+    # ratio は SequenceMatcher と同じ値、matched・opcodes は LCS の一致数と差分区間
+    ratio: float
+    matched: int
+    opcodes: List[Tuple[str, int, int, int, int]]
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count('1')
+
+
+def _char_masks(a: str) -> Dict[str, int]:
+    # 文字 -> a でその文字が現れる位置のビット列
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def _columns(a: str, b: str, keep: bool):
+    """b を1文字ずつ処理したビット列 V を返す（keep=True なら各列の V をすべて返す）
+
+    V の下位 i ビットのうち 0 の数が、a[:i] と処理済みの b の LCS の長さ
+    """
+    full = (1 << len(a)) - 1
+    masks = _char_masks(a)
+    v = full
+    columns = [v] if keep else None
+    for char in b:
+        m = masks.get(char, 0)
+        v = ((v + (v & m)) | (v & ~m)) & full
+        if keep:
+            columns.append(v)
+    return columns if keep else v
+
+
+def lcs_length(a: str, b: str) -> int:
+    if not a or not b:
+        return 0
+    return len(a) - _popcount(_columns(a, b, keep=False))
+
+
+def _ratio(matched: int, total: int) -> float:
+    # SequenceMatcher と同じく、両方空なら 1.0
+    return 2.0 * matched / total if total else 1.0
+
+
+def ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def lcs_ratio(a: str, b: str) -> float:
+    return _ratio(lcs_length(a, b), len(a) + len(b))
+
+
+def compare(a: str, b: str) -> Comparison:
+    """類似度と差分表示用の区間を求める"""
+    similarity = ratio(a, b)
+    if not a or not b:
+        opcodes = []
+        if a:
+            opcodes.append(('delete', 0, len(a), 0, 0))
+        elif b:
+            opcodes.append(('insert', 0, 0, 0, len(b)))
+        return Comparison(similarity, 0, opcodes)
+
+    columns = _columns(a, b, keep=True)
+
+    # 末尾から一致をたどる（同じ文字なら必ず対角に進んでよい）。
+    # 列 j の V のビット i-1 が 1 なら LCS(a[:i-1], b[:j]) == LCS(a[:i], b[:j]) なので上へ、0 なら左へ進む
+    matches = []
+    i, j = len(a), len(b)
+    while i > 0 and j > 0:
+        if a[i - 1] == b[j - 1]:
+            i -= 1
+            j -= 1
+            matches.append((i, j))
+        elif (columns[j] >> (i - 1)) & 1:
+            i -= 1
+        else:
+            j -= 1
+    matches.reverse()
+
+    return Comparison(similarity, len(matches), _opcodes(matches, len(a), len(b)))
+
+
+def _opcodes(matches: List[Tuple[int, int]], len_a: int, len_b: int) -> List[Tuple[str, int, int, int, int]]:
+    opcodes = []
+
+    def add_gap(i1, i2, j1, j2):
+        # 一致と一致の間の区間
+        if i2 > i1 and j2 > j1:
+            opcodes.append(('replace', i1, i2, j1, j2))
+        elif i2 > i1:
+            opcodes.append(('delete', i1, i2, j1, j1))
+        elif j2 > j1:
+            opcodes.append(('insert', i1, i1, j1, j2))
+
+    i = j = k = 0
+    while k < len(matches):
+        match_i, match_j = matches[k]
+        add_gap(i, match_i, j, match_j)
+        # 連続する一致は1つの equal にまとめる
+        run = 1
+        while k + run < len(matches) and matches[k + run] == (match_i + run, match_j + run):
+            run += 1
+        opcodes.append(('equal', match_i, match_i + run, match_j, match_j + run))
+        i, j = match_i + run, match_j + run
+        k += run
+    add_gap(i, len_a, j, len_b)
+    return opcodes
+
+
+def batch_ratios(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    """組ごとの ratio をまとめて計算する。
+    SequenceMatcher は b の文字の位置表を set_seq2 で作るので、同じ b（正解）の組では1つを使い回す"""
+    ratios = np.empty(len(texts_a), dtype=np.float64)
+    matchers: Dict[str, SequenceMatcher] = {}
+    for k, (a, b) in enumerate(zip(texts_a, texts_b)):
+        if a == b:
+            ratios[k] = 1.0
+            continue
+        matcher = matchers.get(b)
+        if matcher is None:
+            matcher = matchers[b] = SequenceMatcher(None, '', b)
+        matcher.set_seq1(a)
+        ratios[k] = matcher.ratio()
+    return ratios
+
+
+def batch_lcs_ratios(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    """組ごとの lcs_ratio をまとめて計算する（ビット並列の更新を組の方向に NumPy でベクトル化）"""
+    ratios = np.empty(len(texts_a), dtype=np.float64)
+    for start in range(0, len(texts_a), BATCH_CHUNK_SIZE):
+        chunk_a = texts_a[start:start + BATCH_CHUNK_SIZE]
+        chunk_b = texts_b[start:start + BATCH_CHUNK_SIZE]
+        matched = _batch_lcs_lengths(chunk_a, chunk_b)
+        totals = np.array([len(a) + len(b) for a, b in zip(chunk_a, chunk_b)], dtype=np.float64)
+        ratios[start:start + len(chunk_a)] = np.where(totals > 0, 2.0 * matched / np.maximum(totals, 1), 1.0)
+    return ratios
+
+
+def _encode(texts: Sequence[str], width: int, pad: int) -> np.ndarray:
+    codes = np.full((len(texts), width), pad, dtype=np.int32)
+    for k, text in enumerate(texts):
+        if text:
+            codes[k, :len(text)] = np.frombuffer(text.encode('utf-32-le'), dtype=np.int32)
+    return codes
+
+
+def _batch_lcs_lengths(texts_a: Sequence[str], texts_b: Sequence[str]) -> np.ndarray:
+    lengths_a = np.array([len(a) for a in texts_a], dtype=np.int64)
+    max_a = int(lengths_a.max(initial=0))
+    max_b = max((len(b) for b in texts_b), default=0)
+    if max_a == 0 or max_b == 0:
+        return np.zeros(len(texts_a), dtype=np.int64)
+
+    # a は 64 ビットの語 n_words 個に分けて持つ（組ごとに (n_words,) の多倍長整数）
+    n_words = (max_a + 63) // 64
+    codes_a = _encode(texts_a, n_words * 64, -1)
+    codes_b = _encode(texts_b, max_b, -2)
+
+    # b の j 文字目と一致する a の位置のビット列: (組, j, 語)。詰め物同士は一致しない
+    equal = codes_a[:, None, :] == codes_b[:, :, None]
+    masks = np.packbits(equal, axis=2, bitorder='little').view('<u8')
+
+    v = np.full((len(texts_a), n_words), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for j in range(max_b):
+        m = masks[:, j, :]
+        u = v & m
+        keep = v & ~m
+        # v + u を下位の語から桁上がりを伝えながら足す
+        carry = np.zeros(len(texts_a), dtype=np.uint64)
+        for w in range(n_words):
+            total = v[:, w] + u[:, w]
+            overflow = total < v[:, w]
+            total += carry
+            overflow |= total < carry
+            v[:, w] = total | keep[:, w]
+            carry = overflow.astype(np.uint64)
+
+    # 各組の a の長さまでのビットのうち 0 の数が LCS の長さ
+    low_bits = np.arange(n_words * 64)[None, :] < lengths_a[:, None]
+    low_mask = np.packbits(low_bits, axis=1, bitorder='little').view('<u8')
+    zeros = ~v & low_mask
+    return np.unpackbits(zeros.view(np.uint8), axis=1).sum(axis=1).astype(np.int64)
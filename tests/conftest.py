@@ -0,0 +1,19 @@
+"""
+テスト共通の設定（リポジトリ直下のモジュールと benchmarks/_stubs.py を import できるようにする）
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from _stubs import StubEncoder  # noqa: E402
+
+
+@pytest.fixture
+def stub_encoder():
+    """テキストのハッシュで決まる疑似埋め込み（同じテキストは常に同じベクトル。モデルは使わない）"""
+    return StubEncoder()
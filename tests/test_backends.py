@@ -0,0 +1,50 @@
+"""
+埋め込みバックエンドの精度（benchmarks/bench_backends.py と同じ許容誤差）
+回答と正解のコサイン類似度が float32（torch）基準から torch-int8 は 0.03、onnx は 1e-3 以内に収まるか
+
+torch・onnxruntime がない環境、ローカルにモデル（python model_artifacts.py download）がない環境ではスキップする
+
+実行:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from bench_backends import DEFAULT_TOLERANCES, cosine_rows, synthetic_pairs  # noqa: E402
+
+N_PAIRS = 64
+
+
+@pytest.fixture(scope="module")
+def pairs():
+    from model_artifacts import artifact_path, read_manifest
+    from simple_embeddings import DEFAULT_MODEL_NAME
+
+    if read_manifest(artifact_path(DEFAULT_MODEL_NAME)) is None:
+        pytest.skip("ローカルにモデルがありません（python model_artifacts.py download で取得）")
+    return synthetic_pairs(N_PAIRS)
+
+
+def scores(backend, pairs):
+    from simple_embeddings import SimpleEmbeddings
+
+    encoder = SimpleEmbeddings(shared=False, cache_size=0, backend=backend)
+    encoder.load()
+    answers = encoder.encode([answer for answer, _ in pairs])
+    references = encoder.encode([reference for _, reference in pairs])
+    return cosine_rows(answers, references)
+
+
+@pytest.fixture(scope="module")
+def baseline(pairs):
+    return scores('torch', pairs)
+
+
+@pytest.mark.parametrize("backend", ['torch-int8', 'onnx'])
+def test_backend_within_tolerance(backend, pairs, baseline):
+    if backend == 'onnx':
+        pytest.importorskip("onnxruntime")
+    diff = np.abs(scores(backend, pairs) - baseline)
+    assert diff.max() <= DEFAULT_TOLERANCES[backend]
@@ -0,0 +1,77 @@
+"""
+取り込み時の重複の扱い（dedup.py・SimpleVectorStore.add_documents）
+  - 同じ出典に登録済みの本文はスキップする
+  - 別の出典の同じ本文・ほぼ重複の本文はドキュメントとして登録し、埋め込みだけを使い回す
+
+実行:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+from _stubs import StubEncoder
+
+LONG_TEXT = "The quick brown fox jumps over the lazy dog near the river bank every morning. " * 4
+
+
+class CountingEncoder(StubEncoder):
+    def __init__(self):
+        super().__init__()
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=None, use_cache=True, **kwargs):
+        self.encoded += len(texts)
+        return super().encode(texts, batch_size=batch_size, use_cache=use_cache, **kwargs)
+
+
+def pair(i, source, suffix=""):
+    return {"id": f"{source}_{i}{suffix}", "text": f"EN: Sentence number {i}.\nJP: {i}番目の文です。",
+            "metadata": {"source": source}}
+
+
+@pytest.fixture
+def store(tmp_path, capsys):
+    from simple_vector_store import SimpleVectorStore
+
+    store = SimpleVectorStore(storage_path=str(tmp_path / "store"), encoder=CountingEncoder())
+    store.add_documents([pair(i, "a.pdf") for i in range(5)])
+    capsys.readouterr()
+    return store
+
+
+def test_same_source_is_skipped(store):
+    encoded = store.encoder.encoded
+    assert store.add_documents([pair(i, "a.pdf", "_again") for i in range(5)]) == 0
+    assert len(store.documents) == 5
+    assert store.encoder.encoded == encoded
+
+
+def test_other_source_is_recorded_without_encoding(store):
+    encoded = store.encoder.encoded
+    # 同じ呼び出しの中の、同じ出典の重複（最後の1件）だけが除かれる
+    assert store.add_documents([pair(i, "b.pdf") for i in range(5)] + [pair(0, "b.pdf", "_dup")]) == 5
+    assert store.encoder.encoded == encoded
+    assert store.count_documents({"source": "b.pdf"}) == 5
+
+    a, b = store.get_row("a.pdf_0"), store.get_row("b.pdf_0")
+    np.testing.assert_array_equal(store.embeddings[a], store.embeddings[b])
+    reference = store.get_reference_embedding("b.pdf_0", "0番目の文です。")
+    np.testing.assert_array_equal(reference, store.get_reference_embedding("a.pdf_0", "0番目の文です。"))
+
+
+def test_other_source_after_reload(store, capsys):
+    from simple_vector_store import SimpleVectorStore
+
+    reloaded = SimpleVectorStore(storage_path=store.storage_path, encoder=CountingEncoder())
+    assert reloaded.add_documents([pair(i, "a.pdf", "_again") for i in range(5)]) == 0
+    assert reloaded.add_documents([pair(i, "b.pdf") for i in range(5)]) == 5
+    assert reloaded.encoder.encoded == 0
+
+
+def test_near_duplicate_keeps_its_text(store):
+    store.add_documents([{"id": "long_a", "text": LONG_TEXT, "metadata": {"source": "a.pdf"}}])
+    encoded = store.encoder.encoded
+    edited = LONG_TEXT.replace("lazy", "sleepy", 1)
+    assert store.add_documents([{"id": "long_a2", "text": edited, "metadata": {"source": "a.pdf"}}]) == 1
+    assert store.encoder.encoded == encoded
+    assert store.documents[store.get_row("long_a2")]["text"] == edited
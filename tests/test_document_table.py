@@ -0,0 +1,110 @@
+"""
+メタデータの絞り込み（DocumentTable.rows_where）
+  - $in / $gte・$lt / $ne などの条件と、そのキーを持たない行（どの条件も満たさない）
+  - 転置インデックスを作った後の追加や、ストアのコンパクション・読み込み直し後も正しい行を返す
+
+実行:
+    python -m pytest tests
+"""
+import operator
+
+import numpy as np
+import pytest
+
+from document_table import DocumentTable
+
+COMPARISONS = {'$eq': operator.eq, '$ne': operator.ne, '$gt': operator.gt,
+               '$gte': operator.ge, '$lt': operator.lt, '$lte': operator.le}
+
+WHERES = [
+    {"source": "a.pdf"},
+    {"source": {"$in": ["a.pdf", "c.pdf", "none.pdf"]}},
+    {"source": {"$ne": "a.pdf"}},
+    {"chunk_index": {"$gte": 3, "$lt": 7}},
+    {"chunk_index": {"$ne": 2}},
+    {"chunk_index": {"$in": [1, 4, 8]}, "source": "b.pdf"},
+    {"level": {"$gte": 2}},
+    {"level": {"$lte": "b"}},
+    {"missing_key": "a.pdf"},
+]
+
+
+def document(i):
+    metadata = {"source": "abc"[i % 3] + ".pdf", "chunk_index": i % 10}
+    # level は一部の行にだけあり、数値と文字列が混ざる
+    if i % 4 == 0:
+        metadata["level"] = i % 5
+    elif i % 4 == 1:
+        metadata["level"] = "abc"[i % 3]
+    return {"id": f"doc_{i}", "text": f"本文 {i}", "metadata": metadata}
+
+
+def expected_rows(documents, where):
+    """1件ずつ条件を確かめる素朴な実装（キーのない行・比較できない値の行は満たさない）"""
+    def satisfies(metadata, key, condition):
+        if key not in metadata:
+            return False
+        value = metadata[key]
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        try:
+            return all(value in operand if op == '$in' else COMPARISONS[op](value, operand)
+                       for op, operand in condition.items())
+        except TypeError:
+            return False
+
+    return [row for row, doc in enumerate(documents)
+            if all(satisfies(doc["metadata"], key, condition) for key, condition in where.items())]
+
+
+@pytest.mark.parametrize("where", WHERES)
+def test_rows_where_matches_brute_force(where):
+    documents = [document(i) for i in range(60)]
+    table = DocumentTable.from_records(documents)
+    assert table.rows_where(where).tolist() == expected_rows(documents, where)
+
+
+def test_unknown_operator_is_rejected():
+    table = DocumentTable.from_records([document(i) for i in range(5)])
+    with pytest.raises(ValueError):
+        table.rows_where({"chunk_index": {"$regex": "1"}})
+
+
+def test_postings_are_updated_on_append():
+    documents = [document(i) for i in range(30)]
+    table = DocumentTable.from_records(documents)
+    # 転置インデックスを作ってから追加する（新しいキー・新しい値も含む）
+    for where in WHERES:
+        table.rows_where(where)
+    added = [document(i) for i in range(30, 50)]
+    added.append({"id": "new", "text": "新しい出典", "metadata": {"source": "d.pdf", "missing_key": "a.pdf"}})
+    table.extend(added)
+    documents += added
+
+    for where in WHERES + [{"source": "d.pdf"}, {"source": {"$ne": "b.pdf"}}]:
+        assert table.rows_where(where).tolist() == expected_rows(documents, where)
+
+
+def test_rows_where_after_compaction_and_reload(tmp_path, stub_encoder, capsys):
+    from simple_vector_store import SimpleVectorStore
+
+    documents = [document(i) for i in range(40)]
+    store = SimpleVectorStore(storage_path=str(tmp_path / "store"), encoder=stub_encoder)
+    for start in range(0, len(documents), 8):
+        store.add_documents(documents[start:start + 8])
+        store.count_documents({"source": "a.pdf"})
+    store.compact()
+    assert len(store.storage.segments) == 1
+
+    reloaded = SimpleVectorStore(storage_path=store.storage_path, encoder=stub_encoder)
+    for current in (store, reloaded):
+        assert list(current.documents.ids) == [doc["id"] for doc in documents]
+        for where in WHERES:
+            rows = expected_rows(documents, where)
+            assert current.documents.rows_where(where).tolist() == rows
+            assert current.count_documents(where) == len(rows)
+
+    # 絞り込み付きの検索は条件を満たす行だけを返す
+    results = reloaded.search("本文 3", n_results=10, where={"chunk_index": {"$gte": 3, "$lt": 7}})
+    assert results and all(3 <= result["metadata"]["chunk_index"] < 7 for result in results)
+    np.testing.assert_array_equal(reloaded.embeddings[0], store.embeddings[0])
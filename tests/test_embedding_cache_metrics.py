@@ -0,0 +1,39 @@
+"""
+エンコードキャッシュのヒット・ミスのメトリクス（embedding_cache_requests_total）
+同じ呼び出しで繰り返された未キャッシュのテキストは、キャッシュから返していないのでミスとして数える
+
+実行:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def metrics():
+    from metrics import InMemoryMetrics, set_metrics
+
+    sink = InMemoryMetrics()
+    previous = set_metrics(sink)
+    yield sink
+    set_metrics(previous)
+
+
+def cache_requests(sink):
+    series = sink.snapshot()['counters'].get('embedding_cache_requests_total', [])
+    return {entry['labels']['result']: entry['value'] for entry in series}
+
+
+def test_repeated_uncached_texts_are_misses(metrics, monkeypatch):
+    from simple_embeddings import SimpleEmbeddings
+
+    encoder = SimpleEmbeddings(shared=False)
+    # モデルは読み込まず、エンコードした件数だけの0ベクトルを返す
+    monkeypatch.setattr(encoder, '_encode_batches',
+                        lambda texts, *args: (np.zeros((len(texts), encoder.dimension), dtype=np.float32), set()))
+
+    encoder.encode(["同じ文", "同じ文", "同じ文", "別の文"])
+    assert cache_requests(metrics) == {'hit': 0, 'miss': 4}
+
+    encoder.encode(["同じ文", "別の文", "新しい文"])
+    assert cache_requests(metrics) == {'hit': 2, 'miss': 5}
@@ -0,0 +1,50 @@
+"""
+取り込み時に計算した和訳の埋め込みは、採点の正解（japanese）が保存されている和訳と同じ時だけ使う
+（doc_id を持つ回答でも、正解を差し替えた場合はエンコードし直す）
+
+実行:
+    python -m pytest tests
+"""
+import pytest
+
+DOC_ID = "sample_1"
+STORED_JAPANESE = "猫がソファーの上で寝ています。"
+CUSTOM_JAPANESE = "犬が公園で元気に走っています。"
+
+
+@pytest.fixture
+def quiz(tmp_path, capsys, stub_encoder):
+    from simple_vector_store import SimpleVectorStore
+    from english_quiz_system import EnglishQuizSystem
+
+    store = SimpleVectorStore(storage_path=str(tmp_path / "store"), encoder=stub_encoder)
+    store.add_documents([{"id": DOC_ID, "text": f"EN: The cat is sleeping on the sofa.\nJP: {STORED_JAPANESE}",
+                          "metadata": {}}])
+    capsys.readouterr()
+    return EnglishQuizSystem(vector_store=store, warm_up=False)
+
+
+def test_stored_embedding_only_for_same_japanese(quiz):
+    store = quiz.vector_store
+    assert store.get_reference_embedding(DOC_ID, STORED_JAPANESE) is not None
+    assert store.get_reference_embedding(DOC_ID, CUSTOM_JAPANESE) is None
+    assert store.get_reference_embedding("unknown", STORED_JAPANESE) is None
+
+
+def test_batch_uses_item_japanese_when_doc_id_disagrees(quiz):
+    items = [
+        # doc_id の和訳と違う正解を持つ回答（正解と同じ回答なので、ベクトル類似度は 1 になるはず）
+        {"answer": CUSTOM_JAPANESE, "english": "A dog is running.", "japanese": CUSTOM_JAPANESE, "doc_id": DOC_ID},
+        # doc_id の和訳と同じ正解（保存済みの埋め込みを使う）
+        {"answer": STORED_JAPANESE, "english": "The cat is sleeping on the sofa.", "japanese": STORED_JAPANESE,
+         "doc_id": DOC_ID},
+    ]
+    results = list(quiz.score_batch(items))
+    for result in results:
+        assert result['scoring_details']['vector_similarity'] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_single_uses_question_japanese_when_doc_id_disagrees(quiz):
+    question = {"english": "A dog is running.", "japanese": CUSTOM_JAPANESE, "doc_id": DOC_ID}
+    result = quiz.score_translation(CUSTOM_JAPANESE, question)
+    assert result['scoring_details']['vector_similarity'] == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,139 @@
+"""
+セグメント形式のストレージ（segment_storage.py）
+  - クラッシュ後: manifest に載っていない書きかけのセグメント・一時ファイルは消え、コミット済みの行だけが残る
+  - 追記ファイル（array_buffer.read_records）の書きかけ・未コミットの末尾は切り詰める
+  - コンパクション（追加時の段階的なまとめと compact）で行の順序・id・和訳の埋め込みが変わらない
+
+実行:
+    python -m pytest tests
+"""
+import os
+
+import numpy as np
+import pytest
+
+from array_buffer import append_records, read_records
+from segment_storage import SegmentStorage
+
+DIMENSION = 8
+
+
+def batch(start, count, seed=0):
+    """(ドキュメント, 埋め込み, 和訳の埋め込み)。和訳の埋め込みは偶数行だけ（奇数行は対訳でない0ベクトル）"""
+    rng = np.random.default_rng(seed + start)
+    documents = [{"id": f"doc_{i}", "text": f"本文 {i}", "metadata": {"row": i}} for i in range(start, start + count)]
+    embeddings = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    references = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    references[[i - start for i in range(start, start + count) if i % 2]] = 0
+    return documents, embeddings, references
+
+
+def load_all(directory):
+    storage = SegmentStorage(directory, DIMENSION)
+    documents, embeddings, references = storage.load()
+    return storage, list(documents), embeddings, references
+
+
+def assert_rows(loaded, expected):
+    _, documents, embeddings, references = loaded
+    expected_documents, expected_embeddings, expected_references = expected
+    assert [doc["id"] for doc in documents] == [doc["id"] for doc in expected_documents]
+    assert documents == expected_documents
+    np.testing.assert_array_equal(np.asarray(embeddings), expected_embeddings)
+    for row, vector in enumerate(expected_references):
+        stored = references.get(row)
+        if vector.any():
+            np.testing.assert_array_equal(stored, vector)
+        else:
+            assert stored is None
+
+
+def concat(*batches):
+    return (sum((b[0] for b in batches), []), np.concatenate([b[1] for b in batches]),
+            np.concatenate([b[2] for b in batches]))
+
+
+def test_uncommitted_segment_is_discarded(tmp_path):
+    directory = str(tmp_path)
+    storage = SegmentStorage(directory, DIMENSION)
+    first, second = batch(0, 5), batch(5, 3)
+    storage.append(*first)
+    storage.append(*second)
+
+    # manifest を書き換える前に終了した追加: セグメントのファイルと一時ファイルだけが残る
+    orphan = f"seg-{storage.next_segment:06d}"
+    documents, embeddings, _ = batch(8, 4)
+    embeddings.tofile(os.path.join(directory, orphan + ".bin"))
+    with open(os.path.join(directory, orphan + ".jsonl.tmp"), 'w', encoding='utf-8') as f:
+        f.write('{"id": "doc_8", "te')
+    with open(os.path.join(directory, "manifest.json.tmp"), 'w', encoding='utf-8') as f:
+        f.write('{"version"')
+
+    loaded = load_all(directory)
+    assert_rows(loaded, concat(first, second))
+    leftovers = [name for name in os.listdir(directory) if name.startswith(orphan) or name.endswith(".tmp")]
+    assert leftovers == []
+
+    # 次の追加は消えたセグメントと同じ名前を使っても壊れない
+    third = batch(8, 4, seed=1)
+    loaded[0].append(*third)
+    assert_rows(load_all(directory), concat(first, second, third))
+
+
+def test_truncated_tail_of_appended_records(tmp_path):
+    path = str(tmp_path / "records.bin")
+    dtype = np.dtype([('code', '<u8'), ('flag', 'u1')])
+    records = np.zeros(6, dtype=dtype)
+    records['code'] = np.arange(6)
+    append_records(path, records[:4])
+    # コミットされなかった追記（2件）と、書きかけのレコード（途中まで）
+    append_records(path, records[4:])
+    with open(path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+
+    recovered = read_records(path, dtype, n_rows=4)
+    np.testing.assert_array_equal(recovered, records[:4])
+    assert os.path.getsize(path) == 4 * dtype.itemsize
+
+    # 切り詰めた位置から追記し直せる
+    append_records(path, records[4:])
+    np.testing.assert_array_equal(read_records(path, dtype, n_rows=6), records)
+    assert len(read_records(str(tmp_path / "none.bin"), dtype, n_rows=3)) == 0
+
+
+@pytest.mark.parametrize("compaction_ratio", [1.0, 0.0])
+def test_compaction_preserves_rows(tmp_path, compaction_ratio):
+    directory = str(tmp_path)
+    storage = SegmentStorage(directory, DIMENSION, compaction_ratio=compaction_ratio)
+    batches = [batch(start, count) for start, count in zip((0, 4, 8, 12, 13, 20), (4, 4, 4, 1, 7, 4))]
+    for documents, embeddings, references in batches:
+        storage.append(documents, embeddings, references)
+    if compaction_ratio:
+        # 同じ大きさの追加が続くと末尾のセグメントがまとめられる
+        assert len(storage.segments) < len(batches)
+    else:
+        assert len(storage.segments) == len(batches)
+
+    expected = concat(*batches)
+    assert_rows(load_all(directory), expected)
+
+    storage.compact()
+    assert len(storage.segments) == 1
+    assert storage.segments[0]["references"] == sum(1 for vector in expected[2] if vector.any())
+    assert_rows(load_all(directory), expected)
+    assert sorted(os.listdir(directory)) == sorted(
+        ["manifest.json"] + [storage.segments[0]["name"] + suffix for suffix in (".bin", ".jsonl", ".ref.bin", ".ref.rows")])
+
+
+def test_segment_without_references(tmp_path):
+    directory = str(tmp_path)
+    storage = SegmentStorage(directory, DIMENSION)
+    documents, embeddings, references = batch(0, 3)
+    storage.append(documents, embeddings)
+    storage.append(*batch(3, 3))
+    storage.compact()
+
+    _, loaded_documents, loaded_embeddings, loaded_references = load_all(directory)
+    assert len(loaded_documents) == 6
+    np.testing.assert_array_equal(loaded_embeddings[0:3], embeddings)
+    assert [loaded_references.get(row) is None for row in range(6)] == [True, True, True, True, False, True]
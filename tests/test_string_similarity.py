@@ -0,0 +1,62 @@
+"""
+文字列類似度（string_similarity.py）
+  - 採点に使う ratio / compare / batch_ratios は difflib.SequenceMatcher.ratio と同じ値
+  - LCS の類似度は SequenceMatcher 以上（上限）で、差分区間から両方の文字列を復元できる
+
+実行:
+    python -m pytest tests
+"""
+import random
+from difflib import SequenceMatcher
+
+import numpy as np
+import pytest
+
+import string_similarity
+
+CHARS = "あいうえおかきくけこ日本語の文を訳すabc"
+
+
+def random_pairs(n, max_a=60, max_b=260, seed=0):
+    # 正解側は autojunk が効く200文字以上も含める
+    rng = random.Random(seed)
+    pairs = [(''.join(rng.choice(CHARS) for _ in range(rng.randint(0, max_a))),
+              ''.join(rng.choice(CHARS) for _ in range(rng.randint(0, max_b)))) for _ in range(n)]
+    return pairs + [("", ""), ("", "正解"), ("回答", ""), ("同じ文です", "同じ文です")]
+
+
+def rebuild(opcodes, a, b):
+    rebuilt_a, rebuilt_b = [], []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+        rebuilt_a.append(a[i1:i2])
+        rebuilt_b.append(b[j1:j2])
+    return ''.join(rebuilt_a), ''.join(rebuilt_b)
+
+
+@pytest.mark.parametrize("a, b", random_pairs(300))
+def test_ratio_matches_sequence_matcher(a, b):
+    expected = SequenceMatcher(None, a, b).ratio()
+    assert string_similarity.ratio(a, b) == expected
+    assert string_similarity.compare(a, b).ratio == expected
+
+
+def test_batch_ratios_match_sequence_matcher():
+    pairs = random_pairs(200, seed=1)
+    # 同じ正解を共有する組（SequenceMatcher を使い回す経路）
+    pairs += [(a, pairs[0][1]) for a, _ in pairs[1:50]]
+    expected = [SequenceMatcher(None, a, b).ratio() for a, b in pairs]
+    ratios = string_similarity.batch_ratios([a for a, _ in pairs], [b for _, b in pairs])
+    np.testing.assert_array_equal(ratios, expected)
+
+
+def test_lcs_ratio_is_upper_bound():
+    pairs = random_pairs(300, seed=2)
+    lcs = string_similarity.batch_lcs_ratios([a for a, _ in pairs], [b for _, b in pairs])
+    for k, (a, b) in enumerate(pairs):
+        comparison = string_similarity.compare(a, b)
+        assert rebuild(comparison.opcodes, a, b) == (a, b)
+        assert string_similarity.lcs_ratio(a, b) == pytest.approx(lcs[k])
+        assert comparison.matched == string_similarity.lcs_length(a, b)
+        assert lcs[k] >= SequenceMatcher(None, a, b).ratio() - 1e-12
@@ -0,0 +1,23 @@
+"""
+「EN: 英文 / JP: 和訳」形式のドキュメントの解析
+"""
+from typing import Optional, Tuple
+
+
+def parse_translation_pair(text: str) -> Optional[Tuple[str, str]]:
+    """EN:/JP: の行を取り出して (英文, 和訳) を返す。対訳でなければ None"""
+    if 'EN:' not in text or 'JP:' not in text:
+        return None
+
+    english_line = None
+    japanese_line = None
+
+    for line in text.split('\n'):
+        if line.startswith('EN:'):
+            english_line = line.replace('EN:', '').strip()
+        elif line.startswith('JP:'):
+            japanese_line = line.replace('JP:', '').strip()
+
+    if english_line and japanese_line:
+        return english_line, japanese_line
+    return None